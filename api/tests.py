@@ -1,3 +1,21 @@
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+
+@override_settings(REQUEST_METRICS_HEADERS=True)
+class UserQueryBudgetTestCase(TestCase):
+    """
+    Checks that the user endpoint stays within its query budget, see QUERY_BUDGETS in the settings
+    """
+
+    def test_user_stays_within_query_budget(self):
+        user = User.objects.create_user('player', password='password')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+
+        response = client.get('/api/user/')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(int(response['X-Query-Count']), settings.QUERY_BUDGETS['user'])
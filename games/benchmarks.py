@@ -0,0 +1,230 @@
+"""
+Micro-benchmarks of the hot paths of the games and tiles models.
+
+Every benchmark runs on games dealt from fixed seeds, so its inputs are the same on every run, inside a transaction
+which is rolled back at the end. It measures each iteration of its hot path, reporting the median duration
+and the highest number of queries of an iteration, over the fastest of ROUNDS runs, which are compared to the
+baselines stored in BASELINES_PATH. The memoized hand evaluations are cleared before every run, so a run does not
+reuse the evaluations of the same hands by the previous one.
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+from statistics import median
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from games import calls, tenpai
+from games.models import Game, Hand
+from games.serializers import GameSerializer, PlayerSerializer, PreloadedHand
+from games.simulation import get_simulation_users, simulate_game, call_phase_timer_disconnected
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'benchmark_baselines.json')
+BENCHMARK_SEED = 0
+CORPUS_GAMES = 8  # games dealt to build the hand corpus, 4 hands each
+ITERATIONS = 40
+ROUNDS = 3  # runs of each benchmark, the fastest one is kept to smooth out the noise of the machine
+DEFAULT_TIME_THRESHOLD = 0.5  # a benchmark more than 50% slower than its baseline is a regression
+
+
+class Timer:
+    """
+    Collects the duration and the number of queries of the iterations of a benchmark
+    """
+
+    def __init__(self):
+        self.durations = []
+        self.queries = []
+
+    @contextmanager
+    def measure(self):
+        connection.queries_log.clear()  # the log is bounded, a full log would hide the queries of the iteration
+        with CaptureQueriesContext(connection) as context:
+            started_at = time.perf_counter()
+            yield
+            self.durations.append(time.perf_counter() - started_at)
+        self.queries.append(len(context))
+
+
+def create_game(seed: int) -> Game:
+    """
+    Creates and starts a game dealt from a fixed seed
+
+    :param seed: seed of the game
+    :return: created instance of Game
+    """
+
+    users = get_simulation_users()
+    game = Game.create(users[0], users[0].username)
+    for user in users[1:]:
+        game.add_player(user, user.username)
+    game.generate_seed(seed)
+    game.fill_up()
+    game.start()
+    return game
+
+
+def benchmark_is_player_hand_in_tenpai(timer: Timer) -> None:
+    for seed in range(BENCHMARK_SEED, BENCHMARK_SEED + CORPUS_GAMES):
+        game = create_game(seed)
+        hand = game.current_round.current_hand
+        for player in game.player_set.order_by('id'):
+            with timer.measure():
+                hand.is_player_hand_in_tenpai(player)
+
+
+def benchmark_set_up(timer: Timer) -> None:
+    game = create_game(BENCHMARK_SEED)
+    round = game.current_round
+    for position_in_round in range(1, ITERATIONS + 1):
+        hand = Hand.create(round, position_in_round)
+        with timer.measure():
+            hand.set_up()
+
+
+def benchmark_transfer_to(timer: Timer) -> None:
+    game = create_game(BENCHMARK_SEED)
+    hand = game.current_round.current_hand
+    player = game.player_set.get(is_dealer=True)
+    player_hand = player.playerhand_set.get(game_hand=hand).tile_stack
+    player_discard = player.playerdiscard_set.get(game_hand=hand).tile_stack
+
+    # tiles go back and forth between the hand and the discard of the dealer
+    for i in range(ITERATIONS):
+        source, target = (player_hand, player_discard) if i % 2 == 0 else (player_discard, player_hand)
+        tile = source.tile_set.order_by('position_in_tile_stack').first()
+        with timer.measure():
+            source.transfer_to(target, tile)
+
+
+def benchmark_pick_in(timer: Timer) -> None:
+    game = create_game(BENCHMARK_SEED)
+    hand = game.current_round.current_hand
+    player = game.player_set.get(is_dealer=True)
+    player_hand = player.playerhand_set.get(game_hand=hand).tile_stack
+    wall = hand.tilestackholder_set.get(name='wall').tile_stack
+    for _ in range(ITERATIONS):
+        with timer.measure():
+            player_hand.pick_in(wall, 1)
+
+
+def benchmark_order_by_default(timer: Timer) -> None:
+    game = create_game(BENCHMARK_SEED)
+    hand = game.current_round.current_hand
+    player = game.player_set.get(is_dealer=True)
+    player_hand = player.playerhand_set.get(game_hand=hand).tile_stack
+    for _ in range(ITERATIONS):
+        with timer.measure():
+            player_hand.order_by_default()
+
+
+def benchmark_call_enumeration(timer: Timer) -> None:
+    for seed in range(BENCHMARK_SEED, BENCHMARK_SEED + CORPUS_GAMES):
+        game = create_game(seed)
+        hand = game.current_round.current_hand
+        dealer = game.player_set.get(is_dealer=True)
+        hand.player_discard(dealer, dealer.playerhand_set.get(game_hand=hand).tile_stack.tile_set.first())
+        for player in game.player_set.exclude(id=dealer.id).order_by('id'):
+            with timer.measure():
+                player.calculate_available_calls_in_call_phase(hand)
+
+
+def benchmark_game_serializer(timer: Timer) -> None:
+    # a hand played to its end, with full discards and some melds
+    with call_phase_timer_disconnected():
+        simulate_game(get_simulation_users(), BENCHMARK_SEED, 'random')
+    game = Game.objects.latest('id')
+    user_id = game.player_set.get(is_dealer=True).user_id
+
+    # same as the ViewGame view
+    for _ in range(ITERATIONS):
+        with timer.measure():
+            hand_state = PreloadedHand(game)
+            context = {'hand_state': hand_state}
+            serialized_game = GameSerializer(game, context=context).data
+            player = next(player for player in hand_state.players if player.user_id == user_id)
+            serialized_player = PlayerSerializer(player, context=context).data
+            JSONRenderer().render({'player': serialized_player, 'game': serialized_game})
+
+
+BENCHMARKS = {
+    'is_player_hand_in_tenpai': benchmark_is_player_hand_in_tenpai,
+    'set_up': benchmark_set_up,
+    'transfer_to': benchmark_transfer_to,
+    'pick_in': benchmark_pick_in,
+    'order_by_default': benchmark_order_by_default,
+    'call_enumeration': benchmark_call_enumeration,
+    'game_serializer': benchmark_game_serializer,
+}
+
+
+def clear_caches() -> None:
+    """
+    Clears the memoized evaluations of the hands, as in a process which has not evaluated any hand yet
+
+    :return: None
+    """
+
+    for cached_function in (tenpai.get_suit_decomposition, tenpai.merge_decompositions,
+                            tenpai.get_shanten_from_decomposition, calls.get_turn_phase_calls,
+                            calls.get_call_phase_calls, calls.get_call_interests):
+        cached_function.cache_clear()
+
+
+def run_benchmark(name: str) -> dict:
+    """
+    Runs a benchmark ROUNDS times, each time from cleared caches and in a transaction which is rolled back,
+    so it leaves no data behind
+
+    :param name: name of the benchmark, see BENCHMARKS
+    :return: dict with the median duration of an iteration in milliseconds, for the fastest run,
+    and the highest number of queries of an iteration, example : {"time": 1.25, "queries": 4}
+    """
+
+    durations = []
+    queries = []
+    for _ in range(ROUNDS):
+        timer = Timer()
+        clear_caches()
+        with transaction.atomic():
+            BENCHMARKS[name](timer)
+            transaction.set_rollback(True)
+        durations.append(median(timer.durations))
+        queries.extend(timer.queries)
+
+    return {"time": round(min(durations) * 1000, 3), "queries": max(queries)}
+
+
+def load_baselines() -> dict:
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+    with open(BASELINES_PATH) as baselines_file:
+        return json.load(baselines_file)
+
+
+def save_baselines(results: dict) -> None:
+    with open(BASELINES_PATH, 'w') as baselines_file:
+        json.dump(results, baselines_file, indent=4, sort_keys=True)
+        baselines_file.write('\n')
+
+
+def get_regressions(result: dict, baseline: dict, time_threshold: float = DEFAULT_TIME_THRESHOLD) -> list[str]:
+    """
+    Compares the result of a benchmark to its baseline
+
+    :param result: result of the benchmark, see run_benchmark
+    :param baseline: stored result of the benchmark, empty if there is none
+    :param time_threshold: relative increase of the duration above which it is a regression
+    :return: list of the regressions, empty if there is none, example : ['time +40%']
+    """
+
+    regressions = []
+    if not baseline:
+        return regressions
+    # the number of queries does not depend on the machine, any increase is a regression
+    if result["queries"] > baseline["queries"]:
+        regressions.append(f'queries +{result["queries"] - baseline["queries"]}')
+    if result["time"] > baseline["time"] * (1 + time_threshold):
+        regressions.append(f'time +{(result["time"] / baseline["time"] - 1) * 100:.0f}%')
+    return regressions
@@ -0,0 +1,159 @@
+"""
+In memory call enumeration.
+
+Calls are found from the 34-count vector of the player hand (see games.tenpai) and the kinds of his pon melds,
+so enumerating every legal call of a hand state does not need any query. Results are memoized by hand state.
+A call is described by its type and the kinds of the tiles of the meld it forms.
+"""
+from functools import lru_cache
+from tiles.utils import VALID_TILES, NEXT_KINDS, PREVIOUS_KINDS
+
+CACHE_SIZE = 2 ** 16  # hand states are almost never repeated between games so the memoization is bounded
+
+
+def format_call(call_type: str, kinds: tuple) -> dict:
+    """
+    Formats a call the way it is stored in Player.possible_calls and sent by the clients
+
+    :param call_type: type of the call, see CALL_NAMES
+    :param kinds: kinds of the tiles of the meld formed by the call
+    :return: dict, example : {"type": "chi", "suit": "dot", "name": "3-4-5"}
+    """
+
+    return {
+        "type": call_type,
+        "suit": VALID_TILES[kinds[0]][0],
+        "name": "-".join(VALID_TILES[kind][1] for kind in kinds),
+    }
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def get_turn_phase_calls(hand_signature: tuple) -> tuple:
+    """
+    Gets all the calls a player can make on his turn
+
+    :param hand_signature: tuple of 34 integers counting each tile of the player hand
+    :return: tuple of (call type, kinds of the meld tiles)
+    """
+
+    calls = []
+
+    # a player can only do 3 calls on its turn : closed kan, riichi and tsumo
+
+    # for a closed kan what is needed is 4 tiles of any kind
+    for kind, count in enumerate(hand_signature):
+        if count == 4:
+            calls.append(('closed kan', (kind, kind, kind, kind)))
+
+    # add tsumo TODO
+    # add riichi TODO
+
+    return tuple(calls)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def get_call_phase_calls(hand_signature: tuple,
+                         locked_melds: int,
+                         pon_kinds: tuple,
+                         discarded_kind: int,
+                         can_chi: bool) -> tuple:
+    """
+    Gets all the calls a player can make on the discarded tile of another player
+
+    :param hand_signature: tuple of 34 integers counting each tile of the player hand
+    :param locked_melds: number of melds the player has already called
+    :param pon_kinds: kinds of the pon melds of the player
+    :param discarded_kind: kind of the discarded tile
+    :param can_chi: True if the player is the next one to play, the only one who can chi
+    :return: tuple of (call type, kinds of the meld tiles)
+    """
+
+    calls = []
+    count = hand_signature[discarded_kind]
+
+    # ron is not offered until a winning call can end the hand, see Hand.player_call
+
+    # for an opened kan the player hand must contain 3 tiles same as the last discarded tile
+    if count >= 3:
+        calls.append(('opened kan', (discarded_kind,) * 4))
+
+    # for a late kan the player must have a pon meld with same tile as the last discarded tile
+    if discarded_kind in pon_kinds:
+        calls.append(('late kan', (discarded_kind,) * 4))
+
+    # for a pon the player hand must contain 2 tiles same as the last discarded tile
+    if count >= 2:
+        calls.append(('pon', (discarded_kind,) * 3))
+
+    # for a chi the player hand must contain 2 tiles forming a sequence with the last discarded tile,
+    # and it only works with number suits, where NEXT_KINDS and PREVIOUS_KINDS are defined
+    if can_chi:
+        next_kind = NEXT_KINDS[discarded_kind]
+        previous_kind = PREVIOUS_KINDS[discarded_kind]
+        # either the two previous tiles, the previous tile and the next tile or the two next tiles
+        sequences = (
+            (PREVIOUS_KINDS[previous_kind] if previous_kind != -1 else -1, previous_kind, discarded_kind),
+            (previous_kind, discarded_kind, next_kind),
+            (discarded_kind, next_kind, NEXT_KINDS[next_kind] if next_kind != -1 else -1),
+        )
+
+        for sequence in sequences:
+            if -1 in sequence:
+                continue
+            if all(hand_signature[kind] >= 1 for kind in sequence if kind != discarded_kind):
+                calls.append(('chi', sequence))
+
+    return tuple(calls)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def get_call_interests(hand_signature: tuple,
+                       locked_melds: int,
+                       pon_kinds: tuple) -> dict:
+    """
+    Gets the types of the calls a player could make on a discarded tile, for each tile kind.
+    Chi is listed as if the player was the next one to play, which has to be checked when a tile is discarded.
+
+    :param hand_signature: tuple of 34 integers counting each tile of the player hand
+    :param locked_melds: number of melds the player has already called
+    :param pon_kinds: kinds of the pon melds of the player
+    :return: dict mapping the kinds that interest the player, as strings like JSON keys, to the list of call types,
+    it is shared by the memoization and must not be modified
+    """
+
+    call_interests = {}
+
+    for kind in range(len(VALID_TILES)):
+        calls = get_call_phase_calls(hand_signature, locked_melds, pon_kinds, kind, True)
+        if calls:
+            call_interests[str(kind)] = [call_type for call_type, _ in calls]
+
+    return call_interests
+
+
+def get_interested_winds(call_interests: dict,
+                         kind: int,
+                         last_wind: str,
+                         next_wind: str) -> list[str]:
+    """
+    Looks up in the call interests of a hand which players can call on a discarded tile
+
+    :param call_interests: dict mapping each player wind to his call interests, see get_call_interests
+    :param kind: kind of the discarded tile
+    :param last_wind: wind of the player who discarded the tile, he cannot call on it
+    :param next_wind: wind of the next player to play, the only one who can chi
+    :return: list of the winds of the players who can call
+    """
+
+    interested_winds = []
+
+    for wind, wind_call_interests in call_interests.items():
+        call_types = wind_call_interests.get(str(kind), [])
+        if wind == last_wind or not call_types:
+            continue
+        # only the next player to play can chi
+        if set(call_types) == {'chi'} and wind != next_wind:
+            continue
+        interested_winds.append(wind)
+
+    return interested_winds
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from games.benchmarks import BENCHMARKS, DEFAULT_TIME_THRESHOLD, run_benchmark, load_baselines, save_baselines, \
+    get_regressions
+
+
+class Command(BaseCommand):
+    help = 'Runs the benchmarks of the game and tile hot paths and compares them to the stored baselines, ' \
+           'failing if any of them regressed. Nothing is left in the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('benchmarks', nargs='*', help='benchmarks to run, all of them if none is given, '
+                                                          'among ' + ', '.join(BENCHMARKS))
+        parser.add_argument('--threshold', type=float, default=DEFAULT_TIME_THRESHOLD,
+                            help='relative increase of the duration above which it is a regression')
+        parser.add_argument('--save', action='store_true',
+                            help='stores the results as the new baselines instead of comparing them')
+
+    def handle(self, *args, **options):
+        names = options['benchmarks'] or list(BENCHMARKS)
+        unknown_names = [name for name in names if name not in BENCHMARKS]
+        if unknown_names:
+            raise CommandError('unknown benchmarks ' + ', '.join(unknown_names))
+        baselines = load_baselines()
+        results = {}
+        regressed = []
+
+        for name in names:
+            results[name] = run_benchmark(name)
+            baseline = baselines.get(name, {})
+            regressions = [] if options['save'] else get_regressions(results[name], baseline, options['threshold'])
+            if regressions:
+                regressed.append(name)
+
+            line = f'{name:<26} {results[name]["time"]:>9.3f} ms {results[name]["queries"]:>4} queries'
+            if baseline:
+                line += f'   baseline {baseline["time"]:>9.3f} ms {baseline["queries"]:>4} queries'
+            if regressions:
+                line += '   REGRESSION ' + ', '.join(regressions)
+            self.stdout.write(line)
+
+        if options['save']:
+            save_baselines({**baselines, **results})
+            self.stdout.write('baselines saved')
+        elif regressed:
+            raise CommandError('regressions in ' + ', '.join(regressed))
@@ -0,0 +1,34 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+from games.simulation import POLICIES, simulate_games
+
+PERCENTILES = (50, 90, 99)
+
+
+class Command(BaseCommand):
+    help = 'Plays complete seeded games without HTTP and reports the throughput and the latency of each action. ' \
+           'A game ends with the exhaustive draw of its first hand, as ron, tsumo and the next hands are not ' \
+           'played yet. The games are written to the database like real ones, run it on a development database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('games', type=int, nargs='?', default=10, help='number of games to play')
+        parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+        parser.add_argument('--policy', choices=sorted(POLICIES), default='random', help='policy of every seat')
+
+    def handle(self, *args, **options):
+        results = simulate_games(options['games'], options['seed'], options['policy'])
+        duration = results["duration"]
+        number_of_actions = sum(len(durations) for durations in results["actions"].values())
+
+        self.stdout.write(f'{results["games"]} games, {results["hands"]} hands and {number_of_actions} actions '
+                          f'in {duration:.2f} s')
+        self.stdout.write(f'games/sec {results["games"] / duration:.3f}   hands/sec {results["hands"] / duration:.3f}'
+                          f'   actions/sec {number_of_actions / duration:.1f}')
+
+        for action_type, durations in results["actions"].items():
+            if not durations:
+                continue
+            milliseconds = np.array(durations) * 1000
+            percentiles = '   '.join(f'p{percentile} {np.percentile(milliseconds, percentile):.2f}'
+                                     for percentile in PERCENTILES)
+            self.stdout.write(f'{action_type:<8} n={len(durations):<6} {percentiles}   max {milliseconds.max():.2f} ms')
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-17 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='shanten',
+            field=models.IntegerField(default=8),
+        ),
+    ]
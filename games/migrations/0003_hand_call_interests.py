@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-17 15:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0002_player_shanten'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hand',
+            name='call_interests',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-17 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0003_hand_call_interests'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hand',
+            name='call_phase_deadline',
+            field=models.DateTimeField(default=None, null=True),
+        ),
+    ]
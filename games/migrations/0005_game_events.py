@@ -0,0 +1,36 @@
+# Generated by Django 4.1.2 on 2026-10-17 16:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0004_hand_call_phase_deadline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='GameEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.IntegerField()),
+                ('type', models.CharField(max_length=255)),
+                ('data', models.JSONField(default=dict)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='games.game')),
+            ],
+            options={
+                'ordering': ['sequence'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='gameevent',
+            constraint=models.UniqueConstraint(fields=('game', 'sequence'), name='unique_game_event_sequence'),
+        ),
+    ]
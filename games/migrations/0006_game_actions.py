@@ -0,0 +1,53 @@
+# Generated by Django 4.1.2 on 2026-10-17 16:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0005_game_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hand',
+            name='action_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='HandSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.IntegerField()),
+                ('state', models.JSONField(default=dict)),
+                ('hand', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='games.hand')),
+            ],
+            options={
+                'ordering': ['sequence'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GameAction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.IntegerField()),
+                ('type', models.CharField(max_length=255)),
+                ('wind', models.CharField(blank=True, choices=[('east', 'east'), ('south', 'south'), ('west', 'west'), ('north', 'north')], max_length=255)),
+                ('data', models.JSONField(default=dict)),
+                ('hand', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='games.hand')),
+            ],
+            options={
+                'ordering': ['sequence'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='handsnapshot',
+            constraint=models.UniqueConstraint(fields=('hand', 'sequence'), name='unique_hand_snapshot_sequence'),
+        ),
+        migrations.AddConstraint(
+            model_name='gameaction',
+            constraint=models.UniqueConstraint(fields=('hand', 'sequence'), name='unique_game_action_sequence'),
+        ),
+    ]
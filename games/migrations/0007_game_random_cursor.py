@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-17 16:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0006_game_actions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='random_cursor',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-17 16:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0007_game_random_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hand',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -1,12 +1,25 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from tiles.models import TileStack, Tile, Meld
 from tiles.utils import *
 from games.utils import *
+from games.tenpai import get_shanten, is_hand_in_tenpai, get_ukeire, get_discard_advice
+from games.calls import format_call, get_turn_phase_calls, get_call_phase_calls, get_call_interests, \
+    get_interested_winds
+from games.websockets import push_game_event
+from games.prng import CounterRandom
 import numpy as np
 from uuid import uuid4
-from django.db.models import QuerySet
+from django.db.models import QuerySet, Q, F
 import random
+from datetime import datetime, timedelta
+from django.utils import timezone
+
+
+class ActionConflict(Exception):
+    """
+    Raised when the hand changed between the moment an action was checked and the moment it is played
+    """
 
 
 class Player(models.Model):
@@ -23,6 +36,7 @@ class Player(models.Model):
     possible_calls = models.JSONField(default=list)  # contains all the calls the player can send at any point
     call_sent = models.JSONField(default=dict)  # contains the possible_call the player sent
     in_tenpai = models.BooleanField(default=False)  # indicates whether a player is in tenpai
+    shanten = models.IntegerField(default=8)  # number of tiles the player needs to change to be in tenpai
 
     @property
     def current_player_hand(self) -> 'PlayerHand':
@@ -36,6 +50,10 @@ class Player(models.Model):
     def current_player_melds(self) -> QuerySet['PlayerMeld']:
         return self.playermeld_set.filter(game_hand=self.game.current_round.current_hand)
 
+    @property
+    def current_waits(self) -> list[dict]:
+        return self.game.current_round.current_hand.get_player_waits(self)
+
     def start_playing(self) -> None:
         self.can_play = True
         self.save()
@@ -49,134 +67,67 @@ class Player(models.Model):
         self.call_sent = dict()
         self.save()
 
-    def send_call(self, call: dict) -> None:
+    def send_call(self, call: dict, hand: 'Hand' = None) -> None:
+        """
+        Stores the call sent by the player and records it in the action log of the hand
+
+        :param call: one of the possible calls of the player
+        :param hand: current hand of the game, fetched if not given
+        :return: None
+        """
+
+        if hand is None:
+            hand = Hand.objects.filter(round__game_id=self.game_id).latest('id')
         self.call_sent = call
         self.save()
+        action_type = 'turn_call' if call.get("type") in IN_TURN_CALLS else 'call'
+        GameAction.create(hand.id, action_type, self.wind, {"call": call})
+        GameEvent.create(self.game_id, 'call_sent', {"wind": self.wind})
 
-    def calculate_available_calls_in_turn_phase(self) -> None:
+    def calculate_available_calls_in_turn_phase(self, hand: 'Hand' = None) -> None:
         """
         Calculates all the possible calls a player can make on its turn and stores it in its possible_calls attribute
 
+        :param hand: current hand of the game, fetched if not given
         :return: None
         """
 
-        hand = self.game.current_round.current_hand
-        player_hand = self.playerhand_set.get(game_hand=hand).tile_stack
-        available_calls = []
-
-        # a player can only do 3 calls on its turn : closed kan, riichi and tsumo
-
-        # for a closed kan what is needed is 4 tiles of any kind
-        for suit, name in VALID_TILES:
-            if player_hand.contain(suit, name, 4):
-                call = {
-                    "type": "closed kan",
-                    "suit": suit,
-                    "name": name + "-" + name + "-" + name + "-" + name
-                }
-                available_calls.append(call)
-
-        # add tsumo TODO
-        # add riichi TODO
+        if hand is None:
+            hand = self.game.current_round.current_hand
+        hand_signature, _, _ = hand.get_player_calls_state(self)
 
-        self.possible_calls = available_calls
+        self.possible_calls = [format_call(*call) for call in get_turn_phase_calls(hand_signature)]
         self.save()
 
-    def calculate_available_calls_in_call_phase(self) -> None:
+    def calculate_available_calls_in_call_phase(self, hand: 'Hand' = None) -> None:
         """
         Calculates all the possible calls a player can make on the call phase
         and stores it in its possible_calls attribute
 
+        :param hand: current hand of the game, fetched if not given
         :return: None
         """
 
-        hand = self.game.current_round.current_hand
-        player_hand = self.playerhand_set.get(game_hand=hand).tile_stack
-        available_calls = []
-
-        # a player can do 5 calls on its turn : opened and late kan, pon, chi and ron
+        if hand is None:
+            hand = self.game.current_round.current_hand
 
         # the last player who played cannot make a call
-        last_player = Player.objects.get(game=self.game, wind=get_previous_wind(hand.next_wind_to_play))
-        if self == last_player:
-            self.possible_calls = available_calls
+        if self.wind == get_previous_wind(hand.next_wind_to_play):
+            self.possible_calls = []
             self.save()
             return
 
-        # let's start be getting the last discarded tile
-        suit = hand.last_discarded_tile.get("suit")
-        name = str(hand.last_discarded_tile.get("name"))
-
-        # add ron TODO
-
-        # for an opened kan the player hand must contain 3 tiles same as the last discarded tile
-        if player_hand.contain(suit, name, 3):
-            call = {
-                "type": "opened kan",
-                "suit": suit,
-                "name": name + "-" + name + "-" + name + "-" + name
-            }
-            available_calls.append(call)
-
-        # for a late kan the player must have a pon meld with same tile as the last discarded tile
-        player_meld_set = self.playermeld_set.filter(game_hand=hand).all()
-        if player_meld_set.exists():
-            for player_meld in player_meld_set:
-                meld = player_meld.tile_stack.meld
-                if meld.type == 'pon' and meld.suit == suit and meld.name == name+"-"+name+"-"+name:
-                    call = {
-                        "type": "late kan",
-                        "suit": suit,
-                        "name": name + "-" + name + "-" + name + "-" + name
-                    }
-                    available_calls.append(call)
-
-        # for a pon the player hand must contain 2 tiles same as the last discarded tile
-        if player_hand.contain(suit, name, 2):
-            call = {
-                "type": "pon",
-                "suit": suit,
-                "name": name + "-" + name + "-" + name
-            }
-            available_calls.append(call)
-
-        # for a chi the player hand must contain 2 tiles forming a sequence with the last discarded tile,
-        # and it only works with number suits
-        if self.wind == hand.next_wind_to_play and suit in [SUIT[0] for SUIT in NUMBER_SUITS]:
-
-            next_name = get_next_number(name)
-            next_next_name = get_next_number(next_name)
-            previous_name = get_next_number(name)
-            previous_previous_name = get_next_number(previous_name)
-
-            if int(name) in [3, 4, 5, 6, 7, 8, 9]:  # either the two previous tiles
-                if player_hand.contain(suit, previous_previous_name) and player_hand.contain(suit, previous_name):
-                    call = {
-                        "type": "chi",
-                        "suit": suit,
-                        "name": previous_previous_name + "-" + previous_name + "-" + name
-                    }
-                    available_calls.append(call)
-
-            if int(name) in [2, 3, 4, 5, 6, 7, 8]:  # either the previous tile and the next tile
-                if player_hand.contain(suit, previous_name) and player_hand.contain(suit, next_name):
-                    call = {
-                        "type": "chi",
-                        "suit": suit,
-                        "name": previous_name + "-" + name + "-" + next_name
-                    }
-                    available_calls.append(call)
-
-            if int(name) in [1, 2, 3, 4, 5, 6, 7]:   # either the two next tiles
-                if player_hand.contain(suit, next_name) and player_hand.contain(suit, next_next_name):
-                    call = {
-                        "type": "chi",
-                        "suit": suit,
-                        "name": name + "-" + next_name + "-" + next_next_name
-                    }
-                    available_calls.append(call)
-
-        self.possible_calls = available_calls
+        hand_signature, locked_melds, pon_kinds = hand.get_player_calls_state(self)
+        discarded_kind = hand.last_discarded_tile.get("kind")
+        if discarded_kind is None:  # hands discarded before kinds existed only store the suit and the name
+            discarded_kind = TILE_INDEXES[(hand.last_discarded_tile.get("suit"),
+                                           str(hand.last_discarded_tile.get("name")))]
+        can_chi = self.wind == hand.next_wind_to_play  # only the next player to play can chi
+
+        calls = get_call_phase_calls(hand_signature, locked_melds, pon_kinds, discarded_kind, can_chi)
+        self.possible_calls = [format_call(*call) for call in calls]
+        if self.possible_calls:  # a player who can call can also pass, so the call phase can end sooner
+            self.possible_calls.append({"type": "pass"})
         self.save()
 
 
@@ -188,7 +139,9 @@ class Game(models.Model):
     seed = models.CharField(default='0', max_length=255)  # seed of all the random events of the game
     is_full = models.BooleanField(default=False)
     is_over = models.BooleanField(default=False)
-    random_state = models.JSONField(default=dict)  # current python random state of the game
+    random_state = models.JSONField(default=dict)  # python random state of the games created before random_cursor
+    random_cursor = models.IntegerField(default=0)  # random numbers of the seed already drawn, see games.prng
+    version = models.IntegerField(default=0)  # sequence number of the last event of the game, see GameEvent
 
     @staticmethod
     def create(user: User,
@@ -205,16 +158,24 @@ class Game(models.Model):
     def current_round(self) -> 'Round':
         return self.round_set.latest('id')
 
+    def save(self, *args, **kwargs):
+        # the version is only changed by GameEvent.create, saving a game must not write back an outdated version
+        if self.pk is not None and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name != 'version']
+        super().save(*args, **kwargs)
+
     def add_player(self, user: User, username: str) -> None:
         self.users.add(user, through_defaults={'username': username})
         self.save()
+        GameEvent.create(self.id, 'join', {"username": username})
 
     def assign_players_wind(self) -> None:
         players_winds = [wind for wind, name in WIND_NAMES]
 
-        random.setstate(self.get_random_state())
-        random.shuffle(players_winds)
-        self.random_state = random.getstate()
+        game_random = self.get_random()
+        game_random.shuffle(players_winds)
+        self.store_random(game_random)
         self.save()
 
         for player in self.player_set.all():
@@ -223,10 +184,17 @@ class Game(models.Model):
                 player.is_dealer = True
             player.save()
 
-    def generate_seed(self) -> None:
-        self.seed = str(int(uuid4()))  # large integer is easier to store as a str
-        random.seed(int(self.seed))
-        self.random_state = random.getstate()
+    def generate_seed(self, seed: int = None) -> None:
+        """
+        Sets the seed of all the random events of the game and resets its random state
+
+        :param seed: seed to use, for reproducible games, a random one is generated if not given
+        :return: None
+        """
+
+        self.seed = str(int(uuid4()) if seed is None else seed)  # large integer is easier to store as a str
+        self.random_state = dict()
+        self.random_cursor = 0
         self.save()
 
     def get_random_state(self) -> tuple:
@@ -234,6 +202,57 @@ class Game(models.Model):
         random_state = (random_state_list[0], tuple(random_state_list[1]), random_state_list[2])
         return random_state
 
+    def is_using_random_state(self) -> bool:
+        # the games created before random_cursor keep drawing from their python random state, to stay reproducible
+        return bool(self.random_state)
+
+    def get_random(self):
+        """
+        Gets the random generator of the game where its last random event left it, without touching the global state
+        of the random module
+
+        :return: instance of games.prng.CounterRandom, or of random.Random for the games using a random state
+        """
+
+        if self.is_using_random_state():
+            game_random = random.Random()
+            game_random.setstate(self.get_random_state())
+            return game_random
+        return CounterRandom(self.seed, self.random_cursor)
+
+    def store_random(self, game_random) -> None:
+        """
+        Stores where the random generator of the game is, the game still has to be saved
+
+        :param game_random: random generator given by get_random, after its random events
+        :return: None
+        """
+
+        if self.is_using_random_state():
+            self.random_state = game_random.getstate()
+        else:
+            self.random_cursor = game_random.cursor
+
+    def get_hand_random(self, hand_index: int):
+        """
+        Replays the random events of the game from its seed to get the random generator a hand was shuffled with
+
+        :param hand_index: number of hands of the game set up before the hand
+        :return: instance of games.prng.CounterRandom, or of random.Random for the games using a random state
+        """
+
+        if self.is_using_random_state():
+            game_random = random.Random(int(self.seed))
+        else:
+            game_random = CounterRandom(self.seed)
+
+        # same random events as start, the winds of the players are shuffled first
+        game_random.shuffle([wind for wind, name in WIND_NAMES])
+        for _ in range(hand_index):
+            Hand.shuffle_tiles(game_random)
+
+        return game_random
+
     def fill_up(self) -> None:
         self.is_full = True
         self.save()
@@ -242,17 +261,80 @@ class Game(models.Model):
         self.assign_players_wind()
         first_round = Round.create(self, 0, WIND_NAMES[0][0])
         first_hand = Hand.create(first_round, 0)
-        first_hand.set_up()
-
-        first_player = self.player_set.get(is_dealer=True)
-        first_hand.player_pick(first_player)
-        first_player.start_playing()
+        first_hand.deal()
 
     def next_round(self) -> None:
         # add after having add ron, tsumo and yakus TODO
         pass
 
 
+class GameEvent(models.Model):
+    """
+    Stores a single change of a Game, numbered by a sequence which increases with each change of the game
+    """
+    game = models.ForeignKey(Game, on_delete=models.PROTECT)  # FK to Game
+    sequence = models.IntegerField()  # version of the game after the change
+    type = models.CharField(max_length=255)  # draw, discard, call, turn...
+    data = models.JSONField(default=dict)  # public information about the change
+
+    class Meta:
+        ordering = ['sequence']
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'sequence'], name='unique_game_event_sequence'),
+        ]
+
+    @staticmethod
+    def create(game_id: int,
+               type: str,
+               data: dict = None) -> 'GameEvent':
+        """
+        Appends an event to a game, bumping its version, and pushes it to the connected sockets once committed
+
+        :param game_id: id of the changed game
+        :param type: type of change, example : 'discard'
+        :param data: public information about the change, it must be JSON serializable
+        :return: created instance of GameEvent
+        """
+
+        with transaction.atomic():  # the game row stays locked until the event is committed
+            Game.objects.filter(id=game_id).update(version=F('version') + 1)
+            sequence = Game.objects.filter(id=game_id).values_list('version', flat=True).get()
+            game_event = GameEvent(game_id=game_id, sequence=sequence, type=type, data=data or {})
+            game_event.save()
+
+        push_game_event(game_id, sequence, type, game_event.data)
+
+        return game_event
+
+    @staticmethod
+    def create_many(game_id: int,
+                    events: list[tuple]) -> list['GameEvent']:
+        """
+        Appends several events to a game in a fixed number of queries, same as calling create for each of them
+
+        :param game_id: id of the changed game
+        :param events: list of (type, data) in the order of the changes
+        :return: list of created instances of GameEvent
+        """
+
+        if not events:
+            return []
+
+        with transaction.atomic():
+            Game.objects.filter(id=game_id).update(version=F('version') + len(events))
+            last_sequence = Game.objects.filter(id=game_id).values_list('version', flat=True).get()
+            first_sequence = last_sequence - len(events) + 1
+            game_events = GameEvent.objects.bulk_create([
+                GameEvent(game_id=game_id, sequence=first_sequence + i, type=type, data=data or {})
+                for i, (type, data) in enumerate(events)
+            ])
+
+        for game_event in game_events:
+            push_game_event(game_id, game_event.sequence, game_event.type, game_event.data)
+
+        return game_events
+
+
 class Round(models.Model):
     """
     Stores a single Round related to a Game
@@ -289,6 +371,10 @@ class Hand(models.Model):
     in_call_phase = models.BooleanField(default=False)  # indicates if it is time for players to send calls
     last_discarded_tile = models.JSONField(default=dict)  # indicates the last discarded tile
     next_wind_to_play = models.CharField(default=get_next_wind('east'), choices=WIND_NAMES, max_length=255)
+    call_interests = models.JSONField(default=dict)  # for each player wind, the tile kinds he could call on
+    call_phase_deadline = models.DateTimeField(null=True, default=None)  # when the current call phase ends
+    action_count = models.IntegerField(default=0)  # sequence number of the last action of the hand, see GameAction
+    version = models.IntegerField(default=0)  # number of changes of the hand by the players and the call phase timer
 
     @staticmethod
     def create(round: Round,
@@ -299,50 +385,162 @@ class Hand(models.Model):
 
         return hand
 
+    def save(self, *args, **kwargs):
+        # the action count and the version are only changed by queryset updates,
+        # saving a hand must not write back outdated ones
+        if self.pk is not None and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in ('action_count', 'version')]
+        super().save(*args, **kwargs)
+
+    def claim(self) -> None:
+        """
+        Bumps the version of the hand if it is still the version read with the hand, as a compare and swap.
+        It must be called in a transaction, before any change made by an action : the updated row stays locked
+        until the action is committed, and a concurrent action claiming the same version fails once it is.
+
+        :return: None
+        """
+
+        if not Hand.objects.filter(id=self.id, version=self.version).update(version=F('version') + 1):
+            raise ActionConflict('the hand changed since it was read')
+        self.version += 1
+
     @property
     def doras(self):
-        dora_indicators_holder = self.tilestackholder_set.get(name='dora_indicators')
-        dora_indicators = dora_indicators_holder.tile_stack.tile_set.order_by('position_in_tile_stack')
         doras = []
-        for i in range(1+self.kan_counter):
-            suit = dora_indicators[i].suit
-            name = dora_indicators[i].name
-            doras.append({"suit": suit, "name": get_next_tile_name(suit, name)})
+        for dora_indicator_kind in self.get_dora_indicator_kinds():
+            suit, name = VALID_TILES[DORA_KINDS[dora_indicator_kind]]
+            doras.append({"suit": suit, "name": name})
         return doras
 
-    def set_up(self) -> None:
+    def get_dora_indicator_kinds(self) -> list[int]:
+        """
+        Gets the kinds of the revealed dora indicators, one plus one per kan
+
+        :return: list of tile kinds ordered by position
         """
-        Sets up a game hand creating all necessary elements
+
+        dora_indicators = TileStack.objects.get(holder__game_hand=self, holder__name='dora_indicators')
+
+        if dora_indicators.is_packed:
+            revealed_physical_ids = dora_indicators.get_packed_tiles()[:1+self.kan_counter]
+            return [get_tile_kind(physical_id) for physical_id in revealed_physical_ids]
+
+        revealed_tiles = dora_indicators.tile_set.filter(position_in_tile_stack__lte=self.kan_counter)
+        return list(revealed_tiles.order_by('position_in_tile_stack').values_list('kind', flat=True))
+
+    def deal(self) -> None:
+        """
+        Sets up the hand and makes the dealer pick his first tile and start playing
 
         :return: None
         """
 
-        # first creates a tile set for the game hand
-        hand_tile_set = TileStackHolder.create_tile_stack('hand_tile_set', self)
+        self.set_up()
+        dealer = self.round.game.player_set.get(is_dealer=True)
+        self.player_pick(dealer)
+        dealer.start_playing()
+
+    def set_up(self) -> None:
+        """
+        Sets up a game hand creating all necessary elements.
+        The tiles are shuffled and dealt in memory, then written once in their final tile stack and position,
+        so setting up a hand costs a fixed number of queries.
+
+        :return: None
+        """
 
-        for i in range(TILES_PER_GAME):
-            suit, name = VALID_TILES[i % UNIQUE_TILES]
-            Tile.create(suit, name, hand_tile_set, i)
+        game = self.round.game
 
-        hand_tile_set.length += TILES_PER_GAME
-        hand_tile_set.save()
+        game_random = game.get_random()
+        shuffled_tiles = Hand.shuffle_tiles(game_random)
+        game.store_random(game_random)
+        game.save()
 
-        hand_tile_set.shuffle()  # shuffle game's set
-        players = self.round.game.player_set.all()  # get all players in a QuerySet
+        dealt_tile_stacks = []  # (tile stack, physical ids of its tiles by position)
+        # the players are always dealt in the same order, so the hand can be dealt again from the seed of the game
+        players = list(game.player_set.order_by('id'))
+        player_hands_tiles, wall_tile_stacks = Hand.deal_tiles(shuffled_tiles, len(players))
 
-        for i, player in enumerate(players):  # create and fill players hand and discard
+        for i, (player, player_hand_tiles) in enumerate(zip(players, player_hands_tiles)):
+            # create and fill players hand and discard
             PlayerDiscard.create_player_discard('discard '+str(i), self, player)
             player_hand = PlayerHand.create_player_hand('hand '+str(i), self, player)
-            player_hand.pick_in(hand_tile_set, 13)
-            player_hand.order_by_default()
-            self.is_player_hand_in_tenpai(player)
+            dealt_tile_stacks.append((player_hand, player_hand_tiles))
+
+            player.shanten = get_shanten(get_tile_counts(player_hand_tiles))
+            player.in_tenpai = is_hand_in_tenpai(get_tile_counts(player_hand_tiles))
+            self.call_interests[player.wind] = get_call_interests(tuple(get_tile_counts(player_hand_tiles)), 0, ())
+
+        for name, physical_ids in wall_tile_stacks:
+            tile_stack = TileStackHolder.create_tile_stack(name, self)
+            if USING_COMPACT_WALL:  # those tiles only become Tile rows when they are picked
+                tile_stack.packed_tiles = bytes(physical_ids)
+            dealt_tile_stacks.append((tile_stack, physical_ids))
+
+        # every tile is written in a single statement, and every tile stack length in another one
+        tiles = []
+        for tile_stack, physical_ids in dealt_tile_stacks:
+            for position_in_tile_stack, physical_id in enumerate([] if tile_stack.is_packed else physical_ids):
+                kind = get_tile_kind(physical_id)
+                suit, name = VALID_TILES[kind]
+                tiles.append(Tile(suit=suit,
+                                  name=name,
+                                  kind=kind,
+                                  physical_id=physical_id,
+                                  tile_stack=tile_stack,
+                                  position_in_tile_stack=position_in_tile_stack))
+            tile_stack.length = len(physical_ids)
+            tile_stack.tile_counts = get_tile_counts(physical_ids)
+        Tile.objects.bulk_create(tiles)
+        TileStack.objects.bulk_update([tile_stack for tile_stack, _ in dealt_tile_stacks],
+                                      ['length', 'tile_counts', 'packed_tiles'])
+        Player.objects.bulk_update(players, ['shanten', 'in_tenpai'])
+        self.save()
+        GameEvent.create(game.id, 'hand_start', {"hand": self.id})
+
+    @staticmethod
+    def shuffle_tiles(game_random) -> list[int]:
+        """
+        Shuffles the tiles positions with the random generator of the game
+
+        :param game_random: random generator of the game, see Game.get_random
+        :return: physical ids of the tiles by position, tiles are dealt from the last position
+        """
+
+        tiles_position = list(range(TILES_PER_GAME))
+        game_random.shuffle(tiles_position)
+
+        shuffled_tiles = [0] * TILES_PER_GAME
+        for physical_id in range(TILES_PER_GAME):
+            shuffled_tiles[tiles_position[TILES_PER_GAME - 1 - physical_id]] = physical_id
+
+        return shuffled_tiles
+
+    @staticmethod
+    def deal_tiles(shuffled_tiles: list[int], number_of_players: int) -> tuple[list[list[int]], list[tuple]]:
+        """
+        Deals the shuffled tiles of a hand, starting from the last position
+
+        :param shuffled_tiles: physical ids of the tiles by position, see shuffle_tiles, the list is emptied
+        :param number_of_players: number of players of the game
+        :return: tuple (physical ids of each player hand ordered by default,
+        list of (name, physical ids by position) for the dora indicators, the dead wall and the wall)
+        """
 
-        dora_indicators = TileStackHolder.create_tile_stack('dora_indicators', self)
-        dora_indicators.pick_in(hand_tile_set, 5)
-        dead_wall = TileStackHolder.create_tile_stack('dead_wall', self)
-        dead_wall.pick_in(hand_tile_set, 9)
-        wall = TileStackHolder.create_tile_stack('wall', self)
-        wall.pick_in(hand_tile_set, 70)
+        player_hands_tiles = []
+        for _ in range(number_of_players):
+            player_hand_tiles = [shuffled_tiles.pop() for _ in range(13)]
+            # the player hand is ordered by default
+            player_hand_tiles.sort(key=lambda tile: (SORT_KEYS[get_tile_kind(tile)], tile))
+            player_hands_tiles.append(player_hand_tiles)
+
+        wall_tile_stacks = []
+        for name, number_of_tiles in (('dora_indicators', 5), ('dead_wall', 9), ('wall', 70)):
+            wall_tile_stacks.append((name, [shuffled_tiles.pop() for _ in range(number_of_tiles)]))
+
+        return player_hands_tiles, wall_tile_stacks
 
     def player_pick(self, player) -> None:
         """
@@ -354,6 +552,8 @@ class Hand(models.Model):
         player_hand = player.playerhand_set.get(game_hand=self).tile_stack
         wall = self.tilestackholder_set.get(name='wall').tile_stack
         player_hand.pick_in(wall, 1)
+        self.update_player_shanten(player)
+        GameEvent.create(player.game_id, 'draw', {"wind": player.wind})
 
     def player_discard(self, player: Player, tile: Tile) -> None:
         """
@@ -367,10 +567,15 @@ class Hand(models.Model):
         player_discard = player.playerdiscard_set.get(game_hand=self).tile_stack
         player_hand = player.playerhand_set.get(game_hand=self).tile_stack
         player_hand.transfer_to(player_discard, tile)
-        self.last_discarded_tile = {"id": tile.id, "suit": tile.suit, "name": tile.name}
+        self.last_discarded_tile = {"id": tile.id, "suit": tile.suit, "name": tile.name, "kind": tile.kind,
+                                    "physical_id": tile.physical_id}
+        # the hand of the player only changes on his turn, which always ends by this discard
+        self.call_interests[player.wind] = get_call_interests(*self.get_player_calls_state(player))
         self.save()
         player.stop_playing()
         self.is_player_hand_in_tenpai(player)
+        GameAction.create(self.id, 'discard', player.wind, {"physical_id": tile.physical_id})
+        GameEvent.create(player.game_id, 'discard', {"wind": player.wind, "tile": self.last_discarded_tile})
 
     def player_call(self, player) -> None:
         """
@@ -394,7 +599,8 @@ class Hand(models.Model):
             player_discard.transfer_to(meld, discarded_tile)
             tile_names.pop()
             for name in tile_names:
-                player_hand.transfer_to(meld, player_hand.tile_set.filter(name=name, suit=call.get("suit")).first())
+                player_hand.transfer_to(meld, player_hand.tile_set.filter(name=name, suit=call.get("suit"))
+                                       .order_by('position_in_tile_stack').first())
             self.next_wind_to_play = player.wind
             self.kan_counter += 1
             self.save()
@@ -420,7 +626,8 @@ class Hand(models.Model):
             player_discard.transfer_to(meld, discarded_tile)
             tile_names.pop()
             for name in tile_names:
-                player_hand.transfer_to(meld, player_hand.tile_set.filter(name=name, suit=call.get("suit")).first())
+                player_hand.transfer_to(meld, player_hand.tile_set.filter(name=name, suit=call.get("suit"))
+                                       .order_by('position_in_tile_stack').first())
             self.next_wind_to_play = player.wind
             self.save()
 
@@ -432,7 +639,8 @@ class Hand(models.Model):
             player_discard.transfer_to(meld, discarded_tile)
             tile_names.remove(discarded_tile.name)
             for name in tile_names:
-                player_hand.transfer_to(meld, player_hand.tile_set.filter(name=name, suit=call.get("suit")).first())
+                player_hand.transfer_to(meld, player_hand.tile_set.filter(name=name, suit=call.get("suit"))
+                                       .order_by('position_in_tile_stack').first())
             self.next_wind_to_play = player.wind
             self.save()
 
@@ -441,15 +649,16 @@ class Hand(models.Model):
             pass
 
         # if the call is an closed kan then the 4 concerned tiles in the player hand
-        # get transfered to a new created meld related to the player
+        # get transfered to a new created meld related to the player, who keeps playing his turn
         elif call.get("type") == 'closed kan':
             meld = PlayerMeld.create_meld(call.get("name"), call.get("type"), call.get("suit"), self, player, False)
             tile_names = call.get("name").split('-')
             for name in tile_names:
-                player_hand.transfer_to(meld, player_hand.tile_set.filter(name=name, suit=call.get("suit")).first())
-            self.next_wind_to_play = player.wind
+                player_hand.transfer_to(meld, player_hand.tile_set.filter(name=name, suit=call.get("suit"))
+                                       .order_by('position_in_tile_stack').first())
             self.kan_counter += 1
             self.save()
+            player.calculate_available_calls_in_turn_phase(self)
 
         # add riichi TODO
         elif call.get("type") == 'riichi':
@@ -462,24 +671,60 @@ class Hand(models.Model):
         else:
             pass
 
+        GameEvent.create(player.game_id, 'call', {"wind": player.wind, "call": call})
+
     def start_call_phase(self) -> None:
+        """
+        Starts the call phase for the players who can call on the last discarded tile,
+        or starts the next turn immediately if no one can
+
+        :return: None
+        """
+
+        discarded_kind = self.last_discarded_tile.get("kind")
+        last_wind = get_previous_wind(self.next_wind_to_play)
+        interested_winds = self.get_interested_winds(discarded_kind, last_wind)
         players = self.round.game.player_set.all()
 
-        for player in players:
-            player.calculate_available_calls_in_call_phase()
+        # the calls the last player could make on his turn are not available anymore
+        players.filter(wind=last_wind).update(possible_calls=list(), call_sent=dict())
 
+        if not interested_winds:
+            self.next_turn(True)
+            return
+
+        for player in players.filter(wind__in=interested_winds):
+            player.calculate_available_calls_in_call_phase(self)
+
+        # the end of the call phase is scheduled by games.signals once the hand is saved
         self.in_call_phase = True
+        self.call_phase_deadline = timezone.now() + timedelta(seconds=CALL_PHASE_DURATION)
         self.save()
+        # the events are public, so who can call stays hidden : each interested player sees his possible calls
+        # in his own PlayerSerializer data
+        GameEvent.create(self.round.game_id, 'call_phase_open', {"deadline": self.call_phase_deadline.isoformat()})
 
-    def end_call_phase(self) -> None:
+    @transaction.atomic  # the players see the next turn start at the same time as the end of the phase
+    def end_call_phase(self, deadline: datetime = None) -> bool:
         """
-        Ends the call phase and chooses which player call is the priority
+        Ends the call phase and chooses which player call is the priority.
+        The phase is closed by a conditional update, so only the first of concurrent calls resolves it.
 
-        :return: None
+        :param deadline: deadline of the call phase to end, if given the phase is only ended if it is still the same
+        :return: True if the call phase was ended by this call, False if it was already over
         """
 
+        call_phase = Hand.objects.filter(id=self.id, in_call_phase=True)
+        if deadline is not None:
+            call_phase = call_phase.filter(call_phase_deadline=deadline)
+        # the version is bumped, so the calls checked before the end of the phase are refused
+        if not call_phase.update(in_call_phase=False, call_phase_deadline=None, version=F('version') + 1):
+            return False
+
         self.in_call_phase = False
-        self.save()
+        self.call_phase_deadline = None
+        GameAction.create(self.id, 'end_call_phase')
+        GameEvent.create(self.round.game_id, 'call_phase_close')
 
         can_pick = True  # turn False if pon or chi is called
 
@@ -487,11 +732,8 @@ class Hand(models.Model):
         calls = list(players.values_list('call_sent', flat=True))
         call_types = [call.get("type") for call in calls]
 
-        if 'ron' in call_types:  # ron is the priority call
-            player = players.get(call_sent__type='ron')
-            self.player_call(player)
-
-        elif 'opened kan' in call_types:  # then there is kan
+        # ron is not offered yet, see games.calls, so kan is the priority call
+        if 'opened kan' in call_types:
             player = players.get(call_sent__type='opened kan')
             self.player_call(player)
 
@@ -512,461 +754,273 @@ class Hand(models.Model):
 
         self.next_turn(can_pick)
 
+        return True
+
+    def end_call_phase_if_all_players_responded(self) -> bool:
+        """
+        Ends the call phase early if every player who can call has sent a call or passed.
+        The players who can call are the ones with possible calls, and they have responded once their call is sent.
+
+        :return: True if the call phase was ended by this call, False otherwise
+        """
+
+        players_to_wait = self.round.game.player_set.exclude(possible_calls=[]).filter(call_sent={})
+        if not self.in_call_phase or players_to_wait.exists():
+            return False
+
+        return self.end_call_phase(self.call_phase_deadline)
+
     def next_turn(self, can_pick: bool):
         player = self.round.game.player_set.get(wind=self.next_wind_to_play)
         if can_pick:
             self.player_pick(player)
         self.next_wind_to_play = get_next_wind(player.wind)
         self.save()
-        player.calculate_available_calls_in_turn_phase()
+        player.calculate_available_calls_in_turn_phase(self)
         player.playerhand_set.get(game_hand=self).tile_stack.order_by_default()
         player.start_playing()
+        GameEvent.create(self.round.game_id, 'turn', {"wind": player.wind})
+
+    def get_player_calls_state(self, player: Player) -> tuple:
+        """
+        Loads in a single query everything the call enumeration needs to know about a player
+
+        :param player: player whose hand and melds are loaded
+        :return: tuple (hand signature, number of locked melds, kinds of the pon melds),
+        see games.calls for the details
+        """
+
+        tile_stacks = TileStack.objects.filter(Q(holder__playerhand__player=player) |
+                                               Q(holder__playermeld__player=player),
+                                               holder__game_hand=self)
+        hand_signature = ()
+        locked_melds = 0
+        pon_kinds = []
+
+        for tile_counts, meld_type, meld_suit, meld_name in tile_stacks.values_list('tile_counts', 'meld__type',
+                                                                                    'meld__suit', 'meld__name'):
+            if meld_type is None:  # the player hand is the only tile stack which is not a meld
+                hand_signature = tuple(tile_counts)
+                continue
+            locked_melds += 1
+            if meld_type == 'pon':
+                pon_kinds.append(TILE_INDEXES[(meld_suit, meld_name.split('-')[0])])
+
+        return hand_signature, locked_melds, tuple(sorted(pon_kinds))
+
+    def get_interested_winds(self, kind: int, last_wind: str) -> list[str]:
+        """
+        Looks up in the call interests of the hand which players can call on a discarded tile
+
+        :param kind: kind of the discarded tile
+        :param last_wind: wind of the player who discarded the tile, he cannot call on it
+        :return: list of the winds of the players who can call
+        """
+
+        # hands set up before the call interests existed have to ask every other player
+        if not self.call_interests:
+            return [wind for wind, _ in WIND_NAMES if wind != last_wind]
+
+        return get_interested_winds(self.call_interests, kind, last_wind, self.next_wind_to_play)
+
+    def get_player_shanten(self, player: Player) -> int:
+        """
+        Calculates the shanten number of the player hand, 0 means tenpai and -1 means the hand is complete
+
+        :param player: instance of Player on which the calculation is performed
+        :return: shanten number of the player hand
+        """
+
+        # to facilitate calculation the player hand is turned into a vector counting each tile
+        player_hand_vector = player.playerhand_set.get(game_hand=self).to_vector()
+        # the player can already have some melds locked
+        number_of_locked_melds = player.playermeld_set.filter(game_hand=self).count()
+
+        return get_shanten(player_hand_vector, number_of_locked_melds)
+
+    def update_player_shanten(self, player: Player) -> None:
+        """
+        Calculates the shanten number of the player hand and stores it in player.shanten
+
+        :param player: instance of Player on which the calculation is performed
+        :return: None
+        """
+
+        player.shanten = self.get_player_shanten(player)
+        player.save()
+
+    def get_visible_tiles_vector(self, player: Player) -> list[int]:
+        """
+        Counts each tile the player can see: his own hand, every discard, every meld and the revealed dora indicators
+
+        :param player: instance of Player whose point of view is taken
+        :return: list of 34 integers counting each tile of VALID_TILES
+        """
+
+        visible_tiles_vector = [0] * UNIQUE_TILES
+
+        visible_tiles = Tile.objects.filter(tile_stack__holder__game_hand=self).filter(
+            Q(tile_stack__holder__playerhand__player=player) |
+            Q(tile_stack__holder__playerdiscard__isnull=False) |
+            Q(tile_stack__holder__playermeld__isnull=False)
+        )
+
+        for kind in visible_tiles.values_list('kind', flat=True):  # a single query for all the visible tiles
+            visible_tiles_vector[kind] += 1
+
+        for kind in self.get_dora_indicator_kinds():
+            visible_tiles_vector[kind] += 1
+
+        return visible_tiles_vector
+
+    def get_player_waits(self, player: Player) -> list[dict]:
+        """
+        Gets the tiles that would complete the player hand, with the number of each of them still live,
+        meaning not visible by the player
+
+        :param player: instance of Player whose waits are calculated
+        :return: list of dict, example : [{"suit": "dot", "name": "3", "live": 2}], empty if not in tenpai
+        or on the turn of the player
+        """
+
+        player_hand_vector = player.playerhand_set.get(game_hand=self).to_vector()
+        number_of_locked_melds = player.playermeld_set.filter(game_hand=self).count()
+
+        # on his turn the player holds one more tile, his hand is not waiting for anything
+        if sum(player_hand_vector) != TILES_PER_HAND - 3 * number_of_locked_melds:
+            return []
+        if get_shanten(player_hand_vector, number_of_locked_melds) != 0:
+            return []
+
+        waits = []
+        visible_tiles_vector = self.get_visible_tiles_vector(player)
+        for index, live in get_ukeire(player_hand_vector, visible_tiles_vector, number_of_locked_melds):
+            suit, name = VALID_TILES[index]
+            waits.append({"suit": suit, "name": name, "live": live})
+
+        return waits
+
+    def get_player_discard_advice(self, player: Player) -> list[dict]:
+        """
+        Evaluates every distinct discard of the player hand with the resulting shanten number and ukeire,
+        meaning the number of live tiles that would lower the shanten number
+
+        :param player: instance of Player whose hand is evaluated, it should be his turn to discard
+        :return: list of dict sorted from the best discard to the worst one, example : [{"suit": "wind",
+                 "name": "north", "shanten": 1, "ukeire": 8, "useful_tiles": [{"suit": "dot", "name": "3", "live": 4},
+                 {"suit": "dot", "name": "6", "live": 4}]}]
+        """
+
+        player_hand_vector = player.playerhand_set.get(game_hand=self).to_vector()
+        number_of_locked_melds = player.playermeld_set.filter(game_hand=self).count()
+        visible_tiles_vector = self.get_visible_tiles_vector(player)
+
+        advice = []
+        for discard in get_discard_advice(player_hand_vector, visible_tiles_vector, number_of_locked_melds):
+            suit, name = VALID_TILES[discard['index']]
+            useful_tiles = []
+            for index, live in discard['useful_tiles']:
+                useful_tile_suit, useful_tile_name = VALID_TILES[index]
+                useful_tiles.append({"suit": useful_tile_suit, "name": useful_tile_name, "live": live})
+            advice.append({
+                "suit": suit,
+                "name": name,
+                "shanten": discard['shanten'],
+                "ukeire": discard['ukeire'],
+                "useful_tiles": useful_tiles,
+            })
+
+        return advice
 
     def is_player_hand_in_tenpai(self, player: Player) -> None:
         """
-        Checks if the player hand is in tenpai and sets player.in_tenpai in accordance
+        Checks if the player hand is in tenpai and sets player.in_tenpai and player.shanten in accordance
 
         :param player: instance of Player on which the check is performed
         :return: None
         """
 
-        # adapt method to return the tiles to complete the tenpai TODO
-
-        #  ------------  functions needed to check tenpai  ------------
-
-        def check_for_13_orphans(player_hand: np.ndarray) -> bool:
-            """
-            Checks if the player hand is in 13 orphans tenpai
-
-            :param player_hand: instance of Player on which the check is performed
-            :return: True if the player hand is in 13 orphans tenpai, False otherwise
-            """
-
-            missing_orphan = 0
-            orphan_pair = 0
-
-            # a complete 13 orphans hand needs a 1 and a 9 of each number suit
-            for suit in ('bamboo', 'character', 'dot'):
-
-                if player_hand[suit][0] == 0:
-                    missing_orphan += 1
-                elif player_hand[suit][0] == 2:
-                    orphan_pair += 1
-                elif player_hand[suit][0] != 1:  # anything more than 2 of a same tile cannot be 13 orphan tenpai
-                    return False
-
-                if player_hand[suit][8] == 0:
-                    missing_orphan += 1
-                elif player_hand[suit][8] == 2:
-                    orphan_pair += 1
-                elif player_hand[suit][8] != 1:  # anything more than 2 of a same tile cannot be 13 orphan tenpai
-                    return False
-
-            # a complete 13 orphans hand needs one of each honor tiles
-            for i in range(7):
-                if player_hand['honor'][i] == 0:
-                    missing_orphan += 1
-                elif player_hand['honor'][i] == 2:
-                    orphan_pair += 1
-                elif player_hand['honor'][i] != 1:  # anything more than 2 of a same tile cannot be 13 orphan tenpai
-                    return False
-
-            if missing_orphan == 0:  # 13 orphans tenpai is achieved with no missing orphans
-                return True
-            elif missing_orphan == 1 and orphan_pair == 1:  # or with one missing orphan and a spare orphan
-                return True
-            else:  # anything else is not 13 orphans tenpai
-                return False
-
-        def check_for_7_pairs(player_hand: np.ndarray) -> bool:
-            """
-            Checks if the player hand is in 7 pairs tenpai
-
-            :param player_hand: instance of Player on which the check is performed
-            :return: True if the player hand is in 7 pairs tenpai, False otherwise
-            """
-
-            pair = 0
-            single = 0
-
-            for suit in ('bamboo', 'character', 'dot', 'honor'):
-                for i in range(player_hand[suit].size):
-                    if player_hand[suit][i] == 2:
-                        pair += 1
-                    elif player_hand[suit][i] == 1:
-                        single += 1
-                    elif player_hand[suit][i] != 0:  # anything more than 2 of a same tile cannot be 7 pairs tenpai
-                        return False
-
-            if pair == 6 and single == 1:  # 7 pairs tenpai is achieved with 6 pairs and a single tile
-                return True
-            else:  # anything else is not 7 pairs tenpai
-                return False
-
-        def get_possible_melds(suit_vector: np.ndarray) -> list[np.ndarray]:
-            """
-            Gets all melds that could be formed in the suit_vector
-
-            :param suit_vector: numpy array containing an integer representing all tiles of a suit,
-                   example : [0 3 1 1 1 0 0 0 0] means the suit contains 3 tile 2, 1 tile 3, 4 and 5
-            :return: list of numpy array representing all melds that can be formed in suit_vector
-                     example : [0 3 1 1 1 0 0 0 0] -> [[0 3 0 0 0 0 0 0 0], [0 1 1 1 0 0 0 0 0], [0 0 1 1 1 0 0 0 0]]
-            """
-
-            possible_melds = []
-            vector_size = suit_vector.size  # number suits and honor suit have different size and properties
-
-            for i in range(vector_size):
-                if suit_vector[i] >= 3:
-                    new_possible_meld = np.zeros(vector_size, dtype=int)
-                    new_possible_meld[i] = 3
-                    possible_melds.append(new_possible_meld)
-
-            if vector_size == 9:  # meaning it is not the honor vector
-                for i in range(7):
-                    if suit_vector[i] >= 1 and suit_vector[i + 1] >= 1 and suit_vector[i + 2] >= 1:
-                        new_possible_meld = np.zeros(vector_size, dtype=int)
-                        new_possible_meld[i] = 1
-                        new_possible_meld[i + 1] = 1
-                        new_possible_meld[i + 2] = 1
-                        possible_melds.append(new_possible_meld)
-
-            return possible_melds
-
-        def get_meld_combinations(suit_vector: np.ndarray) -> list[dict]:
-            """
-            Tries all meld combinations that could be formed in the suit_vector and calculate all possible ones
-
-            :param suit_vector: numpy array containing an integer representing all tiles of a suit,
-                   example : [0 3 1 1 1 0 0 0 0] means the suit contains 3 tile 2, 1 tile 3, 4 and 5
-            :return: list of numpy array representing all melds combinations that can be formed in suit_vector
-                     example : [0 3 1 1 1 0 0 0 0] -> [{'meld_combination': [[0 3 0 0 0 0 0 0 0], [0 0 1 1 1 0 0 0 0]],
-                      'leftover': [0 0 0 0 0 0 0 0 0]}, {'meld_combination': [[0 0 1 1 1 0 0 0 0], [0 3 0 0 0 0 0 0 0]],
-                      'leftover': [0 0 0 0 0 0 0 0 0]}, {'meld_combination': [[0 1 1 1 0 0 0 0 0]],
-                      'leftover': [0 2 0 0 1 0 0 0 0]}]
-            """
-
-            combinations = []
-
-            possible_1_melds = get_possible_melds(suit_vector)  # gets a list of all possible melds in original vector
-            if not possible_1_melds:  # if the list is empty
-                combinations.append({'meld_combination': [], 'leftover': suit_vector})  # then everything is leftover
-
-            else:
-                for possible_1_meld in possible_1_melds:  # tries all meld possibilities
-                    vector_1 = suit_vector.copy()  # makes a new vector for each possibility
-                    vector_1 -= possible_1_meld  # removes the meld from the new vector
-
-                    possible_2_melds = get_possible_melds(vector_1)  # gets a list of all possible melds in new vector
-                    if not possible_2_melds:  # if the list is empty then this is the end of this combination
-                        combinations.append({'meld_combination': [possible_1_meld], 'leftover': vector_1})
-
-                    else:  # if the vector still contains melds then continue the same process
-                        for possible_2_meld in possible_2_melds:
-                            vector_2 = vector_1.copy()
-                            vector_2 -= possible_2_meld
-
-                            possible_3_melds = get_possible_melds(vector_2)
-                            if not possible_3_melds:
-                                combinations.append(
-                                    {'meld_combination': [possible_1_meld, possible_2_meld], 'leftover': vector_2})
-
-                            else:  # if the vector still contains melds then continue the process
-                                for possible_3_meld in possible_3_melds:
-                                    vector_3 = vector_2.copy()
-                                    vector_3 -= possible_3_meld
-
-                                    possible_4_melds = get_possible_melds(vector_3)
-                                    if not possible_4_melds:
-                                        combinations.append(
-                                            {'meld_combination': [possible_1_meld, possible_2_meld, possible_3_meld],
-                                             'leftover': vector_3})
-
-                                    else:  # ... one last time since there cannot be more than 4 melds
-                                        for possible_4_meld in possible_4_melds:
-                                            vector_4 = vector_3.copy()
-                                            vector_4 -= possible_4_meld
-
-                                            combinations.append({'meld_combination': [possible_1_meld, possible_2_meld,
-                                                                                      possible_3_meld, possible_4_meld],
-                                                                 'leftover': vector_4})
-
-            return combinations
-
-        def delete_duplicate_leftovers(combinations: list[dict]) -> list[dict]:
-            """
-            Since combinations ordered by leftover contain duplicate (meld1 -> meld2 is the same as meld2 -> meld1),
-            this function filters out duplicate combinations
-
-            :param combinations: list of numpy array representing all melds combinations that can be formed
-                     example : [{'meld_combination': [[0 3 0 0 0 0 0 0 0], [0 0 1 1 1 0 0 0 0]],
-                      'leftover': [0 0 0 0 0 0 0 0 0]}, {'meld_combination': [[0 0 1 1 1 0 0 0 0], [0 3 0 0 0 0 0 0 0]],
-                      'leftover': [0 0 0 0 0 0 0 0 0]}, {'meld_combination': [[0 1 1 1 0 0 0 0 0]],
-                      'leftover': [0 2 0 0 1 0 0 0 0]}]
-            :return: list of numpy array representing all melds unique combinations filtered by leftover
-                     example : [{'meld_combination': [[0 3 0 0 0 0 0 0 0], [0 0 1 1 1 0 0 0 0]],
-                      'leftover': [0 0 0 0 0 0 0 0 0]}, {'meld_combination': [[0 1 1 1 0 0 0 0 0]],
-                      'leftover': [0 2 0 0 1 0 0 0 0]}]
-            """
-
-            leftovers = []
-            leftovers_index = []
-
-            for index, combination in enumerate(combinations):
-                leftover = combination.get('leftover')
-                leftover_is_duplicate = False
-                for already_leftover in leftovers:
-                    if np.array_equiv(leftover, already_leftover):
-                        leftover_is_duplicate = True
-                if not leftover_is_duplicate:
-                    leftovers.append(leftover)
-                    leftovers_index.append(index)
-
-            combinations_without_duplicate = []
-            for index in leftovers_index:
-                combinations_without_duplicate.append(combinations[index])
-
-            return combinations_without_duplicate
-
-        def get_smallest_leftovers(combinations: list[dict]) -> list[dict]:
-            """
-            Gets the combinations with the smallest leftovers
-
-            :param combinations: list of numpy array representing melds with big and small leftovers
-                     example : [0 3 1 1 1 0 0 0 0] -> [{'meld_combination': [[0 3 0 0 0 0 0 0 0], [0 0 1 1 1 0 0 0 0]],
-                      'leftover': [0 0 0 0 0 0 0 0 0]}, {'meld_combination': [[0 1 1 1 0 0 0 0 0]],
-                      'leftover': [0 2 0 0 1 0 0 0 0]}]
-            :return: list of numpy array representing all melds with the smallest leftovers
-                     example : [0 3 1 1 1 0 0 0 0] -> [{'meld_combination': [[0 3 0 0 0 0 0 0 0], [0 0 1 1 1 0 0 0 0]],
-                      'leftover': [0 0 0 0 0 0 0 0 0]}]
-            """
-
-            smallest_leftovers_size = 14
-            smallest_leftovers_index = []
-
-            for index, combination in enumerate(combinations):
-                leftovers_size = sum(combination.get('leftover'))
-                if leftovers_size == smallest_leftovers_size:
-                    smallest_leftovers_index.append(index)
-                elif leftovers_size < smallest_leftovers_size:
-                    smallest_leftovers_size = leftovers_size
-                    smallest_leftovers_index = [index]
-
-            combinations_with_smallest_leftovers = []
-            for index in smallest_leftovers_index:
-                combinations_with_smallest_leftovers.append(combinations[index])
-
-            return combinations_with_smallest_leftovers
-
-        def get_possible_meld_parts(suit_vector: np.ndarray) -> list[np.ndarray]:
-            """
-            Gets all meld_parts that could be formed in the suit_vector
-
-            :param suit_vector: numpy array containing an integer representing all tiles of a suit,
-                   example : [0 2 0 1 1 0 0 0 0] means the suit contains 2 tile 2, 1 tile 4 and 5
-            :return: list of numpy array representing all melds that can be formed in suit_vector
-                     example : [0 2 0 1 1 0 0 0 0] -> [[0 2 0 0 0 0 0 0 0], [0 1 0 1 0 0 0 0 0], [0 0 0 1 1 0 0 0 0]]
-            """
-
-            possible_meld_parts = []
-            vector_size = suit_vector.size
-
-            for i in range(vector_size):  # number suits and honor suit have different size and properties
-                if suit_vector[i] >= 2:
-                    new_possible_meld_part = np.zeros(vector_size, dtype=int)
-                    new_possible_meld_part[i] = 2
-                    possible_meld_parts.append(new_possible_meld_part)
-
-            if vector_size == 9:  # meaning it is not the honor vector
-                for i in range(7):
-                    if suit_vector[i] >= 1 and suit_vector[i + 1] >= 1:
-                        new_possible_meld_part = np.zeros(vector_size, dtype=int)
-                        new_possible_meld_part[i] = 1
-                        new_possible_meld_part[i + 1] = 1
-                        possible_meld_parts.append(new_possible_meld_part)
-                    if suit_vector[i] >= 1 and suit_vector[i + 2] >= 1:
-                        new_possible_meld_part = np.zeros(vector_size, dtype=int)
-                        new_possible_meld_part[i] = 1
-                        new_possible_meld_part[i + 2] = 1
-                        possible_meld_parts.append(new_possible_meld_part)
-
-            return possible_meld_parts
-
-        def get_meld_part_combinations(suit_vector: np.ndarray) -> list[dict]:
-            """
-            Tries all meld part combinations that could be formed in the suit_vector and calculate all possible ones
-
-            :param suit_vector: numpy array containing an integer representing all tiles of a suit,
-                   example : [0 2 0 1 1 0 0 0 0] means the suit contains 2 tile 2, 1 tile 4 and 5
-            :return: list of numpy array representing all meld parts combinations that can be formed in suit_vector
-                     example : [0 2 0 1 1 0 0 0 0] -> [{'meld_part_combination': [[0 2 0 0 0 0 0 0 0],
-                     [0 0 0 1 1 0 0 0 0]], 'leftover': [0 0 0 0 0 0 0 0 0]}, {'meld_part_combination':
-                     [[0 0 0 1 1 0 0 0 0], [0 2 0 0 0 0 0 0 0]], 'leftover': [0 0 0 0 0 0 0 0 0]},
-                     {'meld_part_combination': [[0 1 0 1 0 0 0 0 0]], 'leftover': [0 1 0 0 1 0 0 0 0]}]
-            """
-
-            combinations = []
-
-            # gets a list of all possible meld parts in original vector
-            possible_1_meld_parts = get_possible_meld_parts(suit_vector)
-            # if the list is empty
-            if not possible_1_meld_parts:
-                # then everything is leftover
-                combinations.append({'meld_part_combination': [], 'leftover': suit_vector})
-
-            else:
-                for possible_1_meld_part in possible_1_meld_parts:  # tries all meld part possibilities
-                    vector_1 = suit_vector.copy()  # makes a new vector for each possibility
-                    vector_1 -= possible_1_meld_part  # removes the meld part from the new vector
-
-                    # gets a list of all possible meld parts in new vector
-                    possible_2_meld_parts = get_possible_meld_parts(vector_1)
-                    # if the list is empty then this is the end of this combination
-                    if not possible_2_meld_parts:
-                        combinations.append({'meld_part_combination': [possible_1_meld_part], 'leftover': vector_1})
-
-                    else:  # if the vector still contains melds then continue the same process
-                        for possible_2_meld_part in possible_2_meld_parts:
-                            vector_2 = vector_1.copy()
-                            vector_2 -= possible_2_meld_part
-
-                            possible_3_meld_parts = get_possible_meld_parts(vector_2)
-                            if not possible_3_meld_parts:
-                                combinations.append(
-                                    {'meld_part_combination': [possible_1_meld_part, possible_2_meld_part],
-                                     'leftover': vector_2})
-
-                            else:  # if the vector still contains melds then continue the process
-                                for possible_3_meld_part in possible_3_meld_parts:
-                                    vector_3 = vector_2.copy()
-                                    vector_3 -= possible_3_meld_part
-
-                                    possible_4_meld_parts = get_possible_meld_parts(vector_3)
-                                    if not possible_4_meld_parts:
-                                        combinations.append({'meld_part_combination': [possible_1_meld_part,
-                                                                                       possible_2_meld_part,
-                                                                                       possible_3_meld_part],
-                                                             'leftover': vector_3})
-
-                                    else:  # if the vector still contains melds then continue the process
-                                        for possible_4_meld_part in possible_4_meld_parts:
-                                            vector_4 = vector_3.copy()
-                                            vector_4 -= possible_4_meld_part
-
-                                            combinations.append({'meld_part_combination': [possible_1_meld_part,
-                                                                                           possible_2_meld_part,
-                                                                                           possible_3_meld_part,
-                                                                                           possible_4_meld_part],
-                                                                 'leftover': vector_4})
-
-            return combinations
-
-        def get_pair_number(meld_parts: list[np.ndarray]) -> int:
-            """
-            Meld parts are either pairs or part of a sequence, this function gets the number of pair meld parts
-
-            :param meld_parts: list of numpy array representing meld parts
-                   example: [[0 2 0 0 0 0 0 0 0], [0 1 0 1 0 0 0 0 0], [0 0 0 1 1 0 0 0 0]]
-            :return: count of pair meld parts,
-                     example: [[0 2 0 0 0 0 0 0 0], [0 1 0 1 0 0 0 0 0], [0 0 0 1 1 0 0 0 0]] -> 1
-            """
-
-            pair_counter = 0
-            for meld_part in meld_parts:
-                if 2 in meld_part:
-                    pair_counter += 1
-            return pair_counter
-
-        #  ------------  start of tenpai algorithm  ------------
-
-        # to facilitate calculation the player hand is turned into a numpy array
-        player_hand_dict = player.playerhand_set.get(game_hand=self).to_dict()
-        # the player can already have some melds locked
+        player_hand_vector = player.playerhand_set.get(game_hand=self).to_vector()
         number_of_locked_melds = player.playermeld_set.filter(game_hand=self).count()
-        # therefore he only needs a required number of meld to win
-        required_melds_to_win = 4 - number_of_locked_melds
-        # and be in tenpai he needs one less than the maximum or the maximum with a pair and a meld part
-        minimum_melds_to_tenpai = required_melds_to_win - 1
-
-        # there is only two special cases with different tenpai conditions: 13 orphans and 7 pairs
-        if check_for_13_orphans(player_hand_dict) or check_for_7_pairs(player_hand_dict):
-            player.in_tenpai = True
-            player.save()
-            return
 
-        # to know if the player hand is in tenpai or not let's find out all the combinations of melds and meld parts
-        # that could lead to a tenpai
-        viable_combinations = {'bamboo': [], 'character': [], 'dot': [], 'honor': [], }
-        # since combinations cannot cross suits, let's find out those combinations suit by suit
-        for suit in ('bamboo', 'character', 'dot', 'honor'):
-            # first let's get all unique melds combinations
-            possible_melds = get_meld_combinations(player_hand_dict[suit])
-            possible_melds = delete_duplicate_leftovers(possible_melds)
-            # then for each one of them
-            for possible_meld in possible_melds:
-                # if the leftover contains more than 4 tiles it cannot be a tenpai since 3 melds in hand is the minimum
-                if sum(possible_meld.get('leftover')) <= 4:
-                    # for the remaining meld combinations let's get all unique meld parts combinations
-                    possible_meld_parts = get_meld_part_combinations(possible_meld.get('leftover'))
-                    possible_meld_parts = delete_duplicate_leftovers(possible_meld_parts)
-                    # then for each one of those meld parts combinations
-                    for possible_meld_part in possible_meld_parts:
-                        # if the leftover contains more than 1 isolated tile it cannot be a tenpai
-                        # since in the case of 4 melds in hand there is 1 isolated tile and in the case of
-                        # 3 melds, a pair and a meld_part in hand there is none
-                        if sum(possible_meld_part.get('leftover')) <= 1:
-                            # at this point any combinations has at least 3 melds and at maximum 1 isolated tile
-                            # meaning that this is a viable combination of melds and meld parts for this suit
-                            # so let's calculate how many pairs there are in the meld parts
-                            pair_number = get_pair_number(possible_meld_part.get('meld_part_combination'))
-                            #  and add it to the viable combinations of said suit
-                            viable_combinations[suit].append({
-                                'meld_number': len(possible_meld.get('meld_combination')),
-                                'pair_number': pair_number,
-                                'meld_part_number': len(possible_meld_part.get('meld_part_combination')) - pair_number,
-                                # 'meld_combination': possible_meld.get('meld_combination'),
-                                'meld_part_combination': possible_meld_part.get('meld_part_combination'),
-                                'leftover': possible_meld_part.get('leftover')
-                            })
-
-            # if any of the suit does not have any viable combinations, meaning it has more than one isolated tile
-            # or more than 4 tiles out of a meld then it cannot be a tenpai
-            if not viable_combinations[suit]:
-                player.in_tenpai = False
-                player.save()
-                return
-
-        # waits = []  # should be added to return the number of tiles the player is waiting for
-
-        # finally let's try all possible combinations of viable combinations of each suit
-        for viable_bamboo in viable_combinations['bamboo']:
-            for viable_character in viable_combinations['character']:
-                for viable_dot in viable_combinations['dot']:
-                    for viable_honor in viable_combinations['honor']:
-                        # let's calculate how many melds, pairs and meld parts the combination has
-                        total_meld_number = viable_bamboo['meld_number'] + viable_character['meld_number'] + \
-                            viable_dot['meld_number'] + viable_honor['meld_number']
-                        total_pair_number = viable_bamboo['pair_number'] + viable_character['pair_number'] + \
-                            viable_dot['pair_number'] + viable_honor['pair_number']
-                        total_meld_part_number = viable_bamboo['meld_part_number'] + viable_character[
-                            'meld_part_number'] + viable_dot['meld_part_number'] + viable_honor['meld_part_number']
-                        # if the combination has enough melds to win regardless of the last tile then it is a tenpai
-                        if total_meld_number == required_melds_to_win:
-                            player.in_tenpai = True
-                            player.save()
-                            return
-                        # if the combination the minimum melds to tenpai, a pair and a meld part then it is a tenpai
-                        elif total_meld_number == minimum_melds_to_tenpai \
-                                and total_pair_number == 1 and total_meld_part_number == 1:
-                            player.in_tenpai = True
-                            player.save()
-                            return
-
-        # if this point is reached it means no tenpai has been found therefore the player hand is not in tenpai
-        player.in_tenpai = False
+        player.shanten = get_shanten(player_hand_vector, number_of_locked_melds)
+        player.in_tenpai = is_hand_in_tenpai(player_hand_vector, number_of_locked_melds)
         player.save()
 
 
+class GameAction(models.Model):
+    """
+    Stores a single action of a Hand, the hand can be rebuilt from the seed of its game by replaying its actions
+    in the order of their sequence, see games.replay
+    """
+    hand = models.ForeignKey(Hand, on_delete=models.PROTECT)  # FK to Hand
+    sequence = models.IntegerField()  # action count of the hand after the action
+    type = models.CharField(max_length=255)  # discard, call, turn_call or end_call_phase
+    wind = models.CharField(max_length=255, choices=WIND_NAMES, blank=True)  # wind of the player who acted
+    data = models.JSONField(default=dict)  # arguments of the action, example : {"physical_id": 42}
+
+    class Meta:
+        ordering = ['sequence']
+        constraints = [
+            models.UniqueConstraint(fields=['hand', 'sequence'], name='unique_game_action_sequence'),
+        ]
+
+    @staticmethod
+    def create(hand_id: int,
+               type: str,
+               wind: str = '',
+               data: dict = None) -> 'GameAction':
+        """
+        Appends an action to the log of a hand, bumping its action count
+
+        :param hand_id: id of the hand the action was played in
+        :param type: type of action, example : 'discard'
+        :param wind: wind of the player who acted, empty for the actions of the table
+        :param data: arguments of the action, it must be JSON serializable
+        :return: created instance of GameAction
+        """
+
+        return GameAction.create_many(hand_id, [(type, wind, data)])[0]
+
+    @staticmethod
+    def create_many(hand_id: int,
+                    actions: list[tuple]) -> list['GameAction']:
+        """
+        Appends several actions to the log of a hand in a fixed number of queries
+
+        :param hand_id: id of the hand the actions were played in
+        :param actions: list of (type, wind, data) in the order of the actions
+        :return: list of created instances of GameAction
+        """
+
+        if not actions:
+            return []
+
+        with transaction.atomic():  # the hand row stays locked until the actions are committed
+            Hand.objects.filter(id=hand_id).update(action_count=F('action_count') + len(actions))
+            last_sequence = Hand.objects.filter(id=hand_id).values_list('action_count', flat=True).get()
+            first_sequence = last_sequence - len(actions) + 1
+            return GameAction.objects.bulk_create([
+                GameAction(hand_id=hand_id, sequence=first_sequence + i, type=type, wind=wind, data=data or {})
+                for i, (type, wind, data) in enumerate(actions)
+            ])
+
+
+class HandSnapshot(models.Model):
+    """
+    Stores the state of a Hand after one of its actions, so rebuilding the hand does not replay every action
+    """
+    hand = models.ForeignKey(Hand, on_delete=models.PROTECT)  # FK to Hand
+    sequence = models.IntegerField()  # sequence of the last action replayed in the state
+    state = models.JSONField(default=dict)  # state of the table, see games.state.Table.to_dict
+
+    class Meta:
+        ordering = ['sequence']
+        constraints = [
+            models.UniqueConstraint(fields=['hand', 'sequence'], name='unique_hand_snapshot_sequence'),
+        ]
+
+
 class TileStackHolder(models.Model):
     """
     Stores a single holder of a tile stack related to a game hand
@@ -1019,34 +1073,26 @@ class PlayerHand(TileStackHolder):
 
     def to_dict(self) -> dict:
 
+        player_hand_vector = self.to_vector()
+
         player_hand_dict = {
-            'bamboo': np.zeros(9, dtype=int),
-            'character': np.zeros(9, dtype=int),
-            'dot': np.zeros(9, dtype=int),
-            'honor': np.zeros(7, dtype=int),
+            'bamboo': np.array(player_hand_vector[9:18], dtype=int),
+            'character': np.array(player_hand_vector[18:27], dtype=int),
+            'dot': np.array(player_hand_vector[0:9], dtype=int),
+            'honor': np.array(player_hand_vector[27:34], dtype=int),
         }
 
-        for tile in self.tile_stack.tile_set.all():
-            if tile.suit in ('bamboo', 'character', 'dot'):
-                player_hand_dict[tile.suit][int(tile.name)-1] += 1
-            else:
-                if tile.name == 'east':
-                    player_hand_dict['honor'][0] += 1
-                elif tile.name == 'south':
-                    player_hand_dict['honor'][1] += 1
-                elif tile.name == 'west':
-                    player_hand_dict['honor'][2] += 1
-                elif tile.name == 'north':
-                    player_hand_dict['honor'][3] += 1
-                elif tile.name == 'green':
-                    player_hand_dict['honor'][4] += 1
-                elif tile.name == 'red':
-                    player_hand_dict['honor'][5] += 1
-                elif tile.name == 'white':
-                    player_hand_dict['honor'][6] += 1
-
         return player_hand_dict
 
+    def to_vector(self) -> list[int]:
+        """
+        Counts each tile of the player hand in the order of VALID_TILES, read from the counts kept by the tile stack
+
+        :return: list of 34 integers, example : [0 2 0 ... 1] means the hand contains 2 dot 3 and 1 white dragon
+        """
+
+        return list(self.tile_stack.tile_counts)
+
 
 class PlayerMeld(TileStackHolder):
     """
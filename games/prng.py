@@ -0,0 +1,78 @@
+"""
+Counter based pseudo random generator of the games.
+
+The n-th random number of a game is a pure function of the seed of the game and of n, computed by mixing
+them with the SplitMix64 finalizer, so a generator is only a key derived from the seed and a cursor counting
+the numbers already drawn. A game stores its cursor instead of a whole random state, and any event of the game
+can be drawn again from the seed, without sharing any state with the other games or the global random module.
+"""
+import hashlib
+
+MASK_64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15  # increment of the SplitMix64 counter
+
+
+def mix64(value: int) -> int:
+    """
+    Scrambles a 64 bits integer with the SplitMix64 finalizer
+
+    :param value: integer between 0 and 2**64 - 1
+    :return: scrambled integer between 0 and 2**64 - 1
+    """
+
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return value ^ (value >> 31)
+
+
+def get_seed_key(seed: str) -> int:
+    """
+    Derives the 64 bits key of a generator from the seed of a game, seeds can be integers of any size
+
+    :param seed: seed of the game, example : '252069731582286493658813394925573626419'
+    :return: integer between 0 and 2**64 - 1
+    """
+
+    return int.from_bytes(hashlib.blake2b(seed.encode(), digest_size=8).digest(), 'little')
+
+
+class CounterRandom:
+    """
+    Random generator of a game, drawing the numbers of its seed from its cursor.
+    It has the shuffle method of random.Random, so both can be used by the games.
+    """
+    __slots__ = ('key', 'cursor')
+
+    def __init__(self, seed: str, cursor: int = 0):
+        self.key = get_seed_key(str(seed))
+        self.cursor = cursor  # number of 64 bits integers already drawn
+
+    def next_uint64(self) -> int:
+        self.cursor += 1
+        return mix64((self.key + self.cursor * GOLDEN_GAMMA) & MASK_64)
+
+    def randbelow(self, n: int) -> int:
+        """
+        Draws an integer between 0 and n - 1, without modulo bias
+
+        :param n: number of possible values, at least 1
+        :return: drawn integer
+        """
+
+        limit = (1 << 64) - (1 << 64) % n  # the draws above the last multiple of n are rejected
+        value = self.next_uint64()
+        while value >= limit:
+            value = self.next_uint64()
+        return value % n
+
+    def shuffle(self, items: list) -> None:
+        """
+        Shuffles a list in place with the Fisher-Yates algorithm
+
+        :param items: list to shuffle
+        :return: None
+        """
+
+        for i in range(len(items) - 1, 0, -1):
+            j = self.randbelow(i + 1)
+            items[i], items[j] = items[j], items[i]
@@ -0,0 +1,177 @@
+"""
+Rebuild of the hands from their action log.
+
+A hand is fully determined by the seed of its game and the ordered actions of its players (see games.models.GameAction):
+the tiles are dealt again from the seed in a scratch hand, then the actions are played again on it by the same
+methods of games.models.Hand as the views, so a replay follows the rules of the games by construction.
+The scratch hand only lives in a transaction which is always rolled back, and its state is read with
+games.state.Table. As the replay holds the locks of the rows of the game until it is done, it is meant for audits
+and tools, not for the requests of the players.
+Snapshots of the replayed state are stored every SNAPSHOT_INTERVAL actions, so seeking in a long hand
+only replays the actions following the closest snapshot.
+"""
+from django.db import transaction
+from games.state import Table
+from games.models import Player, Hand, GameAction, HandSnapshot, PlayerMeld, TileStackHolder
+from games.utils import *
+from tiles.models import Tile, TileStack
+from tiles.utils import *
+
+
+def deal_hand(hand: Hand) -> Hand:
+    """
+    Deals a hand again from the seed of its game in a scratch hand of the same round, in the state it had before
+    its first action. It must be called in a transaction that is rolled back.
+
+    :param hand: instance of Hand to deal again
+    :return: created instance of Hand
+    """
+
+    game = hand.round.game
+    hand_index = Hand.objects.filter(round__game=game, id__lt=hand.id).count()
+    # the game draws the shuffle of the hand again, from where it was when the hand was set up
+    game.store_random(game.get_hand_random(hand_index))
+    game.save()
+    game.player_set.update(can_play=False, possible_calls=list(), call_sent=dict())
+
+    scratch_hand = Hand.create(hand.round, hand.position_in_round)
+    scratch_hand.deal()
+    return scratch_hand
+
+
+def restore_hand(hand: Hand, state: dict) -> None:
+    """
+    Lays out a state given by Table.to_dict on a hand freshly dealt by deal_hand,
+    the dora indicators and the dead wall never change during a hand so they are kept from the deal
+
+    :param hand: instance of Hand given by deal_hand
+    :param state: state of the hand, see Table.to_dict
+    :return: None
+    """
+
+    players = {player.wind: player for player in hand.round.game.player_set.all()}
+    holders = {holder.id: holder for holder in TileStackHolder.objects.filter(game_hand=hand).select_related(
+        'tile_stack', 'playerhand', 'playerdiscard')}
+    tile_stacks = {}  # (holder type, wind) -> tile stack
+    for holder in holders.values():
+        if hasattr(holder, 'playerhand'):
+            tile_stacks[('hand', holder.playerhand.player.wind)] = holder.tile_stack
+        elif hasattr(holder, 'playerdiscard'):
+            tile_stacks[('discard', holder.playerdiscard.player.wind)] = holder.tile_stack
+        elif holder.name == 'wall':
+            tile_stacks[('wall', '')] = holder.tile_stack
+
+    laid_out_tiles = [(tile_stacks[('wall', '')], state["wall"])]
+    for wind, seat_state in state["seats"].items():
+        laid_out_tiles.append((tile_stacks[('hand', wind)], seat_state["hand"]))
+        laid_out_tiles.append((tile_stacks[('discard', wind)], seat_state["discard"]))
+        for meld_state in seat_state["melds"]:
+            meld = PlayerMeld.create_meld(meld_state["name"], meld_state["type"], meld_state["suit"], hand,
+                                          players[wind], meld_state["is_opened"])
+            laid_out_tiles.append((meld, meld_state["tiles"]))
+
+        player = players[wind]
+        player.can_play = seat_state["can_play"]
+        player.possible_calls = seat_state["possible_calls"]
+        player.call_sent = seat_state["call_sent"]
+        player.shanten = seat_state["shanten"]
+        player.in_tenpai = seat_state["in_tenpai"]
+
+    # the tiles of the dealt tile stacks are replaced in a single statement, and written in another one
+    Tile.objects.filter(tile_stack__in=[tile_stack for tile_stack, _ in laid_out_tiles]).delete()
+    tiles = []
+    for tile_stack, physical_ids in laid_out_tiles:
+        if tile_stack.is_packed:
+            tile_stack.packed_tiles = bytes(physical_ids)
+        else:
+            for position_in_tile_stack, physical_id in enumerate(physical_ids):
+                kind = get_tile_kind(physical_id)
+                suit, name = VALID_TILES[kind]
+                tiles.append(Tile(suit=suit, name=name, kind=kind, physical_id=physical_id, tile_stack=tile_stack,
+                                  position_in_tile_stack=position_in_tile_stack))
+        tile_stack.length = len(physical_ids)
+        tile_stack.tile_counts = get_tile_counts(physical_ids)
+    Tile.objects.bulk_create(tiles)
+    TileStack.objects.bulk_update([tile_stack for tile_stack, _ in laid_out_tiles],
+                                  ['length', 'tile_counts', 'packed_tiles'])
+    Player.objects.bulk_update(players.values(), ['can_play', 'possible_calls', 'call_sent', 'shanten', 'in_tenpai'])
+
+    hand.kan_counter = state["kan_counter"]
+    hand.next_wind_to_play = state["next_wind_to_play"]
+    hand.last_discarded_tile = dict(state["last_discarded_tile"])
+    if "physical_id" in hand.last_discarded_tile:  # the calls find the discarded tile by the id of its row
+        hand.last_discarded_tile["id"] = Tile.objects.get(tile_stack__holder__game_hand=hand,
+                                                          physical_id=hand.last_discarded_tile["physical_id"]).id
+    hand.in_call_phase = state["in_call_phase"]
+    hand.call_interests = dict(state["call_interests"])
+    hand.save()
+
+
+def apply_action(hand: Hand, action: GameAction) -> None:
+    """
+    Plays an action of the log again on a scratch hand, the same way as the views
+
+    :param hand: instance of Hand in the state preceding the action
+    :param action: instance of GameAction to play again
+    :return: None
+    """
+
+    player = hand.round.game.player_set.get(wind=action.wind) if action.wind else None
+
+    if action.type == 'discard':
+        tile = Tile.objects.get(tile_stack__holder__playerhand__player=player, tile_stack__holder__game_hand=hand,
+                                physical_id=action.data["physical_id"])
+        hand.player_discard(player, tile)
+        hand.start_call_phase()
+    elif action.type == 'call':
+        # the call phase may already be over if this call was the last answer of the phase
+        if hand.in_call_phase:
+            player.send_call(action.data["call"], hand)
+            hand.end_call_phase_if_all_players_responded()
+    elif action.type == 'turn_call':
+        player.send_call(action.data["call"], hand)
+        hand.player_call(player)
+    elif action.type == 'end_call_phase':
+        hand.end_call_phase()  # does nothing if the phase was already ended by the last call
+
+
+def rebuild_hand(hand: Hand, sequence: int = None) -> Table:
+    """
+    Rebuilds the state of a hand after one of its actions, replaying the actions from the closest snapshot,
+    and stores a snapshot every SNAPSHOT_INTERVAL actions replayed
+
+    :param hand: instance of Hand to rebuild
+    :param sequence: sequence of the last action to replay, all the actions of the hand if not given
+    :return: created instance of Table in the state of the hand after the action
+    """
+
+    if sequence is None:
+        sequence = hand.action_count
+
+    snapshot = HandSnapshot.objects.filter(hand=hand, sequence__lte=sequence).order_by('-sequence').first()
+    if snapshot is not None and snapshot.sequence == sequence:
+        return Table.from_dict(hand.round.game_id, hand, snapshot.state)
+
+    snapshots = []
+    with transaction.atomic():
+        scratch_hand = deal_hand(hand)
+        first_sequence = 0
+        if snapshot is not None:
+            restore_hand(scratch_hand, snapshot.state)
+            first_sequence = snapshot.sequence
+
+        for action in GameAction.objects.filter(hand=hand, sequence__gt=first_sequence, sequence__lte=sequence):
+            # each action reads the hand again, like the request of a view
+            apply_action(Hand.objects.get(id=scratch_hand.id), action)
+            if action.sequence % SNAPSHOT_INTERVAL == 0:
+                state = Table.load(Hand.objects.get(id=scratch_hand.id)).to_dict()
+                snapshots.append(HandSnapshot(hand=hand, sequence=action.sequence, state=state))
+
+        table = Table.load(Hand.objects.get(id=scratch_hand.id))
+        table.hand_id = hand.id
+        # nothing of the replay is kept, its events are not pushed and its call phases are not scheduled
+        transaction.set_rollback(True)
+
+    # concurrent rebuilds of the same hand store the same snapshots
+    HandSnapshot.objects.bulk_create(snapshots, ignore_conflicts=True)
+    return table
@@ -0,0 +1,87 @@
+"""
+In process deadline scheduler.
+
+A single asyncio event loop runs in a daemon thread and waits for the deadlines, so no request worker is held
+while a call phase is open. When a deadline is reached, its job runs in a thread pool as it uses the database.
+Jobs must be idempotent : the deadline is persisted and checked by the job itself, so a job running late,
+twice, or after the phase was already resolved does nothing.
+The deadlines are lost when the process stops, games.signals.recover_call_phases takes them back on start.
+"""
+import asyncio
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from django.db import close_old_connections
+from django.utils import timezone
+from logs.models import Log
+
+_loop = None
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Gets the event loop of the scheduler, starting its thread on the first call
+
+    :return: running event loop
+    """
+
+    global _loop, _executor
+
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _executor = ThreadPoolExecutor(thread_name_prefix='scheduler')
+            threading.Thread(target=_loop.run_forever, name='scheduler', daemon=True).start()
+
+    return _loop
+
+
+def _run_job(job, *args) -> None:
+    """
+    Runs a job with fresh database connections, as the threads of the pool live longer than a request.
+    Nobody waits for the job, so its errors are stored as logs.
+
+    :param job: callable to run
+    :param args: arguments of the job
+    :return: None
+    """
+
+    close_old_connections()
+    try:
+        job(*args)
+    except Exception:
+        Log.create('scheduled job failed', traceback.format_exc(), 'games.scheduler', getattr(job, '__name__', None))
+    finally:
+        close_old_connections()
+
+
+async def _wait_and_run(deadline: datetime, job, *args) -> None:
+    """
+    Waits for the deadline and then runs the job in the thread pool
+
+    :param deadline: aware datetime at which the job should run
+    :param job: callable to run
+    :param args: arguments of the job
+    :return: None
+    """
+
+    delay = (deadline - timezone.now()).total_seconds()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    await asyncio.get_running_loop().run_in_executor(_executor, _run_job, job, *args)
+
+
+def schedule(deadline: datetime, job, *args) -> None:
+    """
+    Schedules a job to run at a deadline without blocking the caller
+
+    :param deadline: aware datetime at which the job should run
+    :param job: callable to run, it must be idempotent
+    :param args: arguments of the job
+    :return: None
+    """
+
+    asyncio.run_coroutine_threadsafe(_wait_and_run(deadline, job, *args), _get_loop())
@@ -1,7 +1,98 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from games.models import Game, Player, Round, Hand
+from games.models import Game, Player, Round, Hand, GameEvent, TileStackHolder
+from games.tenpai import get_shanten, get_ukeire
+from tiles.models import Tile
 from tiles.serializers import TileStackSerializer, MeldSerializer
+from tiles.utils import VALID_TILES, DORA_KINDS, get_tile_kind
+from games.utils import UNIQUE_TILES, TILES_PER_HAND
+
+
+class PreloadedHand:
+    """
+    Loads the state of the current hand of a game in a fixed number of queries, whatever the number of tiles and melds.
+    Given as the 'hand_state' of the context of the game serializers, they read it instead of querying
+    each player, tile stack and tile, and fall back on the models when it is not given.
+    """
+
+    def __init__(self, game: Game):
+        # the latest hand of the game is the current hand of its current round
+        self.hand = Hand.objects.select_related('round').filter(round__game=game).latest('id')
+        self.round = self.hand.round
+        self.players = list(game.player_set.select_related('user').order_by('id'))
+
+        self.player_hands = {}  # player id -> TileStack
+        self.player_discards = {}  # player id -> TileStack
+        self.player_melds = {}  # player id -> list of Meld
+        dora_indicators = None
+        holders = TileStackHolder.objects.filter(game_hand=self.hand).select_related(
+            'tile_stack', 'tile_stack__meld', 'playerhand', 'playerdiscard', 'playermeld')
+        for holder in holders.order_by('id'):
+            if hasattr(holder, 'playerhand'):
+                self.player_hands[holder.playerhand.player_id] = holder.tile_stack
+            elif hasattr(holder, 'playerdiscard'):
+                self.player_discards[holder.playerdiscard.player_id] = holder.tile_stack
+            elif hasattr(holder, 'playermeld'):
+                self.player_melds.setdefault(holder.playermeld.player_id, []).append(holder.tile_stack.meld)
+            elif holder.name == 'dora_indicators':
+                dora_indicators = holder.tile_stack
+
+        # tiles of every stack except the walls, ordered by position
+        self.tiles = {}  # tile stack id -> list of Tile
+        tiles = Tile.objects.filter(tile_stack__holder__game_hand=self.hand)
+        tiles = tiles.exclude(tile_stack__holder__name__in=('wall', 'dead_wall'))
+        for tile in tiles.order_by('tile_stack_id', 'position_in_tile_stack'):
+            self.tiles.setdefault(tile.tile_stack_id, []).append(tile)
+
+        if dora_indicators is not None and dora_indicators.is_packed:
+            dora_indicator_kinds = [get_tile_kind(physical_id)
+                                    for physical_id in dora_indicators.get_packed_tiles()[:1+self.hand.kan_counter]]
+        elif dora_indicators is not None:
+            dora_indicator_kinds = [tile.kind for tile in self.tiles.get(dora_indicators.id, [])
+                                    if tile.position_in_tile_stack <= self.hand.kan_counter]
+        else:
+            dora_indicator_kinds = []
+        self.dora_indicator_kinds = dora_indicator_kinds
+
+    @property
+    def doras(self) -> list[dict]:
+        doras = []
+        for dora_indicator_kind in self.dora_indicator_kinds:
+            suit, name = VALID_TILES[DORA_KINDS[dora_indicator_kind]]
+            doras.append({"suit": suit, "name": name})
+        return doras
+
+    def get_player_waits(self, player: Player) -> list[dict]:
+        """
+        Same as Hand.get_player_waits, counting the visible tiles from the loaded tile stacks
+
+        :param player: instance of Player whose waits are calculated
+        :return: list of dict, example : [{"suit": "dot", "name": "3", "live": 2}], empty if not in tenpai
+        """
+
+        player_hand_vector = list(self.player_hands[player.id].tile_counts)
+        number_of_locked_melds = len(self.player_melds.get(player.id, []))
+
+        if sum(player_hand_vector) != TILES_PER_HAND - 3 * number_of_locked_melds:
+            return []
+        if get_shanten(player_hand_vector, number_of_locked_melds) != 0:
+            return []
+
+        visible_tiles_vector = list(player_hand_vector)
+        visible_tile_stacks = list(self.player_discards.values())
+        visible_tile_stacks += [meld for melds in self.player_melds.values() for meld in melds]
+        for tile_stack in visible_tile_stacks:
+            for kind in range(UNIQUE_TILES):
+                visible_tiles_vector[kind] += tile_stack.tile_counts[kind]
+        for kind in self.dora_indicator_kinds:
+            visible_tiles_vector[kind] += 1
+
+        waits = []
+        for index, live in get_ukeire(player_hand_vector, visible_tiles_vector, number_of_locked_melds):
+            suit, name = VALID_TILES[index]
+            waits.append({"suit": suit, "name": name, "live": live})
+
+        return waits
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -15,6 +106,13 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class HandSerializer(serializers.ModelSerializer):
+    doras = serializers.SerializerMethodField()
+
+    def get_doras(self, instance):
+        hand_state = self.context.get('hand_state')
+        if hand_state is None:
+            return instance.doras
+        return hand_state.doras
 
     class Meta:
         model = Hand
@@ -29,7 +127,12 @@ class HandSerializer(serializers.ModelSerializer):
 
 
 class RoundSerializer(serializers.ModelSerializer):
-    current_hand = HandSerializer()
+    current_hand = serializers.SerializerMethodField()
+
+    def get_current_hand(self, instance):
+        hand_state = self.context.get('hand_state')
+        hand = instance.current_hand if hand_state is None else hand_state.hand
+        return HandSerializer(hand, context=self.context).data
 
     class Meta:
         model = Round
@@ -44,11 +147,21 @@ class RoundSerializer(serializers.ModelSerializer):
 
 class PlayerGameSerializer(serializers.ModelSerializer):
     user = UserSerializer()
-    discard = TileStackSerializer(source='current_player_discard.tile_stack')
+    discard = serializers.SerializerMethodField()
     # melds = MeldSerializer(source='current_player_melds', many=True)
     melds = serializers.SerializerMethodField()
 
+    def get_discard(self, instance):
+        hand_state = self.context.get('hand_state')
+        if hand_state is None:
+            return TileStackSerializer(instance.current_player_discard.tile_stack).data
+        return TileStackSerializer(hand_state.player_discards[instance.id], context=self.context).data
+
     def get_melds(self, instance):
+        hand_state = self.context.get('hand_state')
+        if hand_state is not None:
+            return MeldSerializer(hand_state.player_melds.get(instance.id, []), many=True, context=self.context).data
+
         melds_data = []
         for player_meld in instance.current_player_melds.all():
             melds_data.append(MeldSerializer(player_meld.tile_stack.meld).data)
@@ -83,8 +196,18 @@ class PlayerLightSerializer(serializers.ModelSerializer):
 
 
 class GameSerializer(serializers.ModelSerializer):
-    current_round = RoundSerializer()
-    players = PlayerGameSerializer(source='player_set', many=True)
+    current_round = serializers.SerializerMethodField()
+    players = serializers.SerializerMethodField()
+
+    def get_current_round(self, instance):
+        hand_state = self.context.get('hand_state')
+        round = instance.current_round if hand_state is None else hand_state.round
+        return RoundSerializer(round, context=self.context).data
+
+    def get_players(self, instance):
+        hand_state = self.context.get('hand_state')
+        players = instance.player_set.all() if hand_state is None else hand_state.players
+        return PlayerGameSerializer(players, many=True, context=self.context).data
 
     class Meta:
         model = Game
@@ -113,7 +236,20 @@ class GameLightSerializer(serializers.ModelSerializer):
 
 class PlayerSerializer(serializers.ModelSerializer):
     user = UserSerializer()
-    hand = TileStackSerializer(source='current_player_hand.tile_stack')
+    hand = serializers.SerializerMethodField()
+    waits = serializers.SerializerMethodField()
+
+    def get_hand(self, instance):
+        hand_state = self.context.get('hand_state')
+        if hand_state is None:
+            return TileStackSerializer(instance.current_player_hand.tile_stack).data
+        return TileStackSerializer(hand_state.player_hands[instance.id], context=self.context).data
+
+    def get_waits(self, instance):
+        hand_state = self.context.get('hand_state')
+        if hand_state is None:
+            return instance.current_waits
+        return hand_state.get_player_waits(instance)
 
     class Meta:
         model = Player
@@ -129,4 +265,17 @@ class PlayerSerializer(serializers.ModelSerializer):
             'possible_calls',
             'call_sent',
             'in_tenpai',
+            'shanten',
+            'waits',
+        ]
+
+
+class GameEventSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = GameEvent
+        fields = [
+            'sequence',
+            'type',
+            'data',
         ]
@@ -1,11 +1,36 @@
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from games.models import Hand
-import time
+from games.scheduler import schedule
+
+
+def end_call_phase_at_deadline(hand_id: int, deadline) -> None:
+    Hand.objects.get(id=hand_id).end_call_phase(deadline)
+
+
+def recover_call_phases() -> None:
+    """
+    Ends the call phases whose deadline passed while no process was waiting for it, and schedules the others again.
+    The timers only live in the process which handled the discard, so they are lost when the server restarts.
+
+    :return: None
+    """
+
+    now = timezone.now()
+    for hand in Hand.objects.filter(in_call_phase=True).order_by('call_phase_deadline'):
+        deadline = hand.call_phase_deadline
+        # the call phases opened before the deadlines existed have no deadline, they are over too
+        if deadline is None or deadline <= now:
+            hand.end_call_phase(deadline)
+        else:
+            schedule(deadline, end_call_phase_at_deadline, hand.id, deadline)
 
 
 @receiver(post_save, sender=Hand)
 def call_phase_timer(sender, instance: Hand, created, **kwargs):
-    if instance.in_call_phase:
-        time.sleep(10)  # works synchronously
-        instance.end_call_phase()
+    if instance.in_call_phase and instance.call_phase_deadline is not None:
+        # the end of the call phase is scheduled once the hand is committed, without blocking the request
+        hand_id, deadline = instance.id, instance.call_phase_deadline
+        transaction.on_commit(lambda: schedule(deadline, end_call_phase_at_deadline, hand_id, deadline))
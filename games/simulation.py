@@ -0,0 +1,198 @@
+"""
+Headless self-play of complete seeded games, for throughput benchmarking.
+
+The seats are driven by simple policies through the same model methods as the views of games.views, without HTTP.
+The call phases are answered by every player who can call, so they always end early and the timer of games.signals
+is disconnected for the whole simulation.
+"""
+import random
+from abc import ABC, abstractmethod
+import time
+from contextlib import contextmanager
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from games.models import Game, Hand
+from games.signals import call_phase_timer
+from games.tenpai import get_shanten
+from games.utils import *
+from tiles.models import Tile
+from tiles.utils import *
+
+SIMULATION_USERNAME = 'simulator '
+
+
+class Policy(ABC):
+    """
+    Chooses the actions of a seat, with its own random generator so the games stay reproducible
+    """
+
+    def __init__(self, seed: int):
+        self.random = random.Random(seed)
+
+    @abstractmethod
+    def choose_discard(self, tiles: list[Tile], locked_melds: int) -> Tile:
+        pass
+
+    def choose_call(self, possible_calls: list[dict]) -> dict:
+        return {"type": "pass"}
+
+    def choose_turn_call(self, possible_calls: list[dict]) -> dict:
+        """
+        Chooses a call to make on the turn of the seat, before discarding
+
+        :param possible_calls: calls the seat can make on its turn, never empty
+        :return: one of the possible calls, or None to only discard
+        """
+
+        return None
+
+
+class RandomPolicy(Policy):
+    """
+    Discards a random tile, sends a random call, late kan excepted, and makes half of the calls it can on its turn
+    """
+
+    def choose_discard(self, tiles: list[Tile], locked_melds: int) -> Tile:
+        return self.random.choice(tiles)
+
+    def choose_call(self, possible_calls: list[dict]) -> dict:
+        # late kans cannot be executed by Hand.player_call yet
+        calls = [call for call in possible_calls if call.get("type") != 'late kan']
+        return self.random.choice(calls)
+
+    def choose_turn_call(self, possible_calls: list[dict]) -> dict:
+        return self.random.choice(possible_calls) if self.random.random() < 0.5 else None
+
+
+class GreedyPolicy(Policy):
+    """
+    Discards the first tile keeping the lowest shanten number and never calls
+    """
+
+    def choose_discard(self, tiles: list[Tile], locked_melds: int) -> Tile:
+        hand_vector = get_tile_counts(tile.physical_id for tile in tiles)
+        best_tile, best_shanten = None, None
+        for tile in tiles:
+            hand_vector[tile.kind] -= 1
+            shanten = get_shanten(hand_vector, locked_melds)
+            hand_vector[tile.kind] += 1
+            if best_shanten is None or shanten < best_shanten:
+                best_tile, best_shanten = tile, shanten
+        return best_tile
+
+
+POLICIES = {'random': RandomPolicy, 'greedy': GreedyPolicy}
+
+
+@contextmanager
+def call_phase_timer_disconnected():
+    post_save.disconnect(call_phase_timer, sender=Hand)
+    try:
+        yield
+    finally:
+        post_save.connect(call_phase_timer, sender=Hand)
+
+
+def get_simulation_users() -> list[User]:
+    return [User.objects.get_or_create(username=SIMULATION_USERNAME + str(i))[0] for i in range(MAX_PLAYERS_PER_GAME)]
+
+
+def simulate_game(users: list[User], seed: int, policy: str) -> dict:
+    """
+    Plays a complete game, until the wall of its hand is empty, and measures the duration of each action
+
+    :param users: users seated at the game
+    :param seed: seed of the game, the same seed and policy always play the same game
+    :param policy: name of the policy of every seat, see POLICIES
+    :return: dict of the durations of the actions in seconds by type of action, example :
+    {"start": [0.08], "discard": [0.02, 0.03], "call": [0.03], "turn_call": [], "hands": 1}
+    """
+
+    durations = {"start": [], "discard": [], "call": [], "turn_call": []}
+    policies = {}
+
+    game = Game.create(users[0], users[0].username)
+    for user in users[1:]:
+        game.add_player(user, user.username)
+    game.generate_seed(seed)
+    game.fill_up()
+
+    started_at = time.perf_counter()
+    game.start()
+    durations["start"].append(time.perf_counter() - started_at)
+
+    hand = game.current_round.current_hand
+    wall = hand.tilestackholder_set.get(name='wall').tile_stack
+    for i, player in enumerate(game.player_set.order_by('id')):
+        policies[player.wind] = POLICIES[policy](seed * MAX_PLAYERS_PER_GAME + i)
+
+    while True:
+        wall.refresh_from_db(fields=['length'])
+        if wall.length == 0:  # exhaustive draw, the last tile of the wall was picked
+            break
+
+        player = game.player_set.get(can_play=True)
+        if player.possible_calls:
+            call = policies[player.wind].choose_turn_call(player.possible_calls)
+            if call is not None:
+                # same as the CallInTurnPhase view
+                started_at = time.perf_counter()
+                player.send_call(call, hand)
+                hand.player_call(player)
+                durations["turn_call"].append(time.perf_counter() - started_at)
+
+        tiles = list(player.playerhand_set.get(game_hand=hand).tile_stack.tile_set.order_by('position_in_tile_stack'))
+        locked_melds = player.playermeld_set.filter(game_hand=hand).count()
+        tile = policies[player.wind].choose_discard(tiles, locked_melds)
+
+        # same as the DiscardTile view
+        started_at = time.perf_counter()
+        hand.player_discard(player, tile)
+        hand.start_call_phase()
+        durations["discard"].append(time.perf_counter() - started_at)
+
+        if not hand.in_call_phase:  # nobody could call, the next turn already started
+            continue
+
+        for other_player in game.player_set.exclude(possible_calls=[]):
+            call = policies[other_player.wind].choose_call(other_player.possible_calls)
+
+            # same as the CallInCallPhase view
+            started_at = time.perf_counter()
+            other_player.send_call(call, hand)
+            hand.end_call_phase_if_all_players_responded()
+            durations["call"].append(time.perf_counter() - started_at)
+
+    durations["hands"] = 1
+    game.is_over = True
+    game.save()
+
+    return durations
+
+
+def simulate_games(number_of_games: int, seed: int = 0, policy: str = 'random') -> dict:
+    """
+    Plays several complete games one after the other
+
+    :param number_of_games: number of games to play
+    :param seed: seed of the first game, the next games use the following seeds
+    :param policy: name of the policy of every seat, see POLICIES
+    :return: dict with the number of games and hands played, the total duration in seconds
+    and the durations of the actions by type of action, see simulate_game
+    """
+
+    users = get_simulation_users()
+    results = {"games": 0, "hands": 0, "duration": 0,
+               "actions": {"start": [], "discard": [], "call": [], "turn_call": []}}
+
+    with call_phase_timer_disconnected():
+        started_at = time.perf_counter()
+        for game_seed in range(seed, seed + number_of_games):
+            durations = simulate_game(users, game_seed, policy)
+            results["games"] += 1
+            results["hands"] += durations.pop("hands")
+            for action_type, action_durations in durations.items():
+                results["actions"][action_type].extend(action_durations)
+        results["duration"] = time.perf_counter() - started_at
+
+    return results
@@ -0,0 +1,187 @@
+"""
+Compact state of a hand.
+
+A table holds the state of a hand in __slots__ objects, where walls, hands, discards and melds are lists of
+physical tile ids (see tiles.utils). It only reads and stores states : the rules are played by games.models.Hand,
+which stays the only state the actions change. Table.load reads the stored state of a hand in a fixed number
+of queries, and to_dict gives the states compared by the replays of games.replay and stored in their snapshots.
+"""
+from games.calls import get_call_interests
+from games.models import Player, Hand, TileStackHolder
+from tiles.models import Tile
+from tiles.utils import *
+
+
+class MeldState:
+    """
+    Meld of a player, its tiles are physical ids ordered by position
+    """
+    __slots__ = ('type', 'suit', 'name', 'is_opened', 'tiles')
+
+    def __init__(self, type: str, suit: str, name: str, is_opened: bool, tiles: list[int]):
+        self.type = type
+        self.suit = suit
+        self.name = name
+        self.is_opened = is_opened
+        self.tiles = tiles
+
+
+class SeatState:
+    """
+    Player seated at a table, his hand and discard are physical ids ordered by position
+    """
+    __slots__ = ('player_id', 'wind', 'hand', 'hand_counts', 'discard', 'melds', 'can_play', 'possible_calls',
+                 'call_sent', 'shanten', 'in_tenpai')
+
+    def __init__(self, player: Player):
+        self.player_id = player.id
+        self.wind = player.wind
+        self.hand = []
+        self.hand_counts = get_empty_tile_counts()  # number of each tile of VALID_TILES in the hand
+        self.discard = []
+        self.melds = []
+        self.can_play = player.can_play
+        self.possible_calls = player.possible_calls
+        self.call_sent = player.call_sent
+        self.shanten = player.shanten
+        self.in_tenpai = player.in_tenpai
+
+    def add_to_hand(self, physical_id: int) -> None:
+        self.hand.append(physical_id)
+        self.hand_counts[get_tile_kind(physical_id)] += 1
+
+    def get_calls_state(self) -> tuple:
+        """
+        Same as Hand.get_player_calls_state, from memory
+
+        :return: tuple (hand signature, number of locked melds, kinds of the pon melds)
+        """
+        pon_kinds = sorted(get_tile_kind(meld.tiles[0]) for meld in self.melds if meld.type == 'pon')
+        return tuple(self.hand_counts), len(self.melds), tuple(pon_kinds)
+
+
+class Table:
+    """
+    State of a hand of a game
+    """
+    __slots__ = ('game_id', 'hand_id', 'seats', 'wall', 'kan_counter', 'next_wind_to_play', 'last_discarded_tile',
+                 'in_call_phase', 'call_phase_deadline', 'call_interests')
+
+    def __init__(self, game_id: int, hand: Hand):
+        self.game_id = game_id
+        self.hand_id = hand.id
+        self.seats = {}  # wind -> SeatState
+        self.wall = []  # physical ids ordered by position, tiles are picked from the end
+        self.kan_counter = hand.kan_counter
+        self.next_wind_to_play = hand.next_wind_to_play
+        self.last_discarded_tile = dict(hand.last_discarded_tile)
+        self.in_call_phase = hand.in_call_phase
+        self.call_phase_deadline = hand.call_phase_deadline
+        self.call_interests = dict(hand.call_interests)
+
+    @staticmethod
+    def load(hand: Hand) -> 'Table':
+        """
+        Loads the stored state of a hand from the models in a fixed number of queries
+
+        :param hand: instance of Hand to load
+        :return: created instance of Table
+        """
+
+        table = Table(hand.round.game_id, hand)
+        for player in Player.objects.filter(game_id=table.game_id):
+            table.seats[player.wind] = SeatState(player)
+        seats_by_player_id = {seat.player_id: seat for seat in table.seats.values()}
+
+        tiles_by_tile_stack = {}  # tile stack id -> physical ids ordered by position
+        tiles = Tile.objects.filter(tile_stack__holder__game_hand=hand).order_by('tile_stack_id',
+                                                                                 'position_in_tile_stack')
+        for tile_stack_id, physical_id in tiles.values_list('tile_stack_id', 'physical_id'):
+            tiles_by_tile_stack.setdefault(tile_stack_id, []).append(physical_id)
+
+        holders = TileStackHolder.objects.filter(game_hand=hand).select_related(
+            'tile_stack', 'tile_stack__meld', 'playerhand', 'playerdiscard', 'playermeld')
+        for holder in holders.order_by('id'):
+            tile_stack = holder.tile_stack
+            stack_tiles = tiles_by_tile_stack.get(tile_stack.id, [])
+            if hasattr(holder, 'playerhand'):
+                seat = seats_by_player_id[holder.playerhand.player_id]
+                for physical_id in stack_tiles:
+                    seat.add_to_hand(physical_id)
+            elif hasattr(holder, 'playerdiscard'):
+                seats_by_player_id[holder.playerdiscard.player_id].discard = stack_tiles
+            elif hasattr(holder, 'playermeld'):
+                meld = tile_stack.meld
+                seats_by_player_id[holder.playermeld.player_id].melds.append(
+                    MeldState(meld.type, meld.suit, meld.name, meld.is_opened, stack_tiles))
+            elif holder.name == 'wall':
+                table.wall = list(tile_stack.get_packed_tiles()) if tile_stack.is_packed else stack_tiles
+
+        # hands set up before the call interests existed get them now
+        if not table.call_interests:
+            for wind, seat in table.seats.items():
+                table.call_interests[wind] = get_call_interests(*seat.get_calls_state())
+
+        return table
+
+    def to_dict(self) -> dict:
+        """
+        Gets the state of the hand in a JSON serializable dict, without the ids of the models
+
+        :return: dict, see from_dict
+        """
+
+        return {
+            "seats": {wind: {
+                "player_id": seat.player_id,
+                "hand": list(seat.hand),
+                "discard": list(seat.discard),
+                "melds": [{"type": meld.type, "suit": meld.suit, "name": meld.name, "is_opened": meld.is_opened,
+                           "tiles": list(meld.tiles)} for meld in seat.melds],
+                "can_play": seat.can_play,
+                "possible_calls": seat.possible_calls,
+                "call_sent": seat.call_sent,
+                "shanten": seat.shanten,
+                "in_tenpai": seat.in_tenpai,
+            } for wind, seat in self.seats.items()},
+            "wall": list(self.wall),
+            "kan_counter": self.kan_counter,
+            "next_wind_to_play": self.next_wind_to_play,
+            # the id of the Tile row of the discarded tile is left out like the other ids, a replay does not know it
+            "last_discarded_tile": {key: value for key, value in self.last_discarded_tile.items() if key != "id"},
+            "in_call_phase": self.in_call_phase,
+            "call_interests": dict(self.call_interests),
+        }
+
+    @staticmethod
+    def from_dict(game_id: int, hand: Hand, state: dict) -> 'Table':
+        """
+        Creates a table from a state given by to_dict
+
+        :param game_id: id of the game
+        :param hand: instance of the Hand of the state
+        :param state: dict given by to_dict
+        :return: created instance of Table
+        """
+
+        table = Table(game_id, hand)
+        table.wall = list(state["wall"])
+        table.kan_counter = state["kan_counter"]
+        table.next_wind_to_play = state["next_wind_to_play"]
+        table.last_discarded_tile = dict(state["last_discarded_tile"])
+        table.in_call_phase = state["in_call_phase"]
+        table.call_phase_deadline = None  # the deadlines are not part of the state, see to_dict
+        table.call_interests = dict(state["call_interests"])
+
+        for wind, seat_state in state["seats"].items():
+            seat = SeatState(Player(id=seat_state["player_id"], wind=wind, can_play=seat_state["can_play"],
+                                    possible_calls=seat_state["possible_calls"], call_sent=seat_state["call_sent"],
+                                    shanten=seat_state["shanten"], in_tenpai=seat_state["in_tenpai"]))
+            for physical_id in seat_state["hand"]:
+                seat.add_to_hand(physical_id)
+            seat.discard = list(seat_state["discard"])
+            seat.melds = [MeldState(meld["type"], meld["suit"], meld["name"], meld["is_opened"], list(meld["tiles"]))
+                          for meld in seat_state["melds"]]
+            table.seats[wind] = seat
+
+        return table
@@ -0,0 +1,532 @@
+"""
+Table driven tenpai and shanten engine.
+
+A hand is represented by a vector of 34 integers counting each tile of VALID_TILES, in the same order:
+dot 1 -> 9, bamboo 1 -> 9, character 1 -> 9, then east, south, west, north, green, red and white.
+
+Since melds cannot cross suits, every suit is decomposed on its own. The best decompositions of a suit vector
+are computed the first time this vector is met and then kept in a lookup table for the life of the process,
+so checking a hand only costs four table lookups and a small combine step.
+"""
+from functools import lru_cache
+import numpy as np
+
+SUIT_RANGES = ((0, 9), (9, 18), (18, 27), (27, 34))  # dot, bamboo, character and honor slices of a hand vector
+ORPHAN_INDEXES = (0, 8, 9, 17, 18, 26, 27, 28, 29, 30, 31, 32, 33)  # terminals and honors
+MAX_MELDS = 4
+
+# a decomposition table is a tuple of 10 integers, the value at index pair * 5 + melds is the maximum number
+# of meld parts that can be formed alongside this number of melds, with (pair = 1) or without (pair = 0) a pair,
+# and -1 if this number of melds and pair cannot be formed at all
+IMPOSSIBLE = -1
+EMPTY_DECOMPOSITION = (0, IMPOSSIBLE, IMPOSSIBLE, IMPOSSIBLE, IMPOSSIBLE,
+                       IMPOSSIBLE, IMPOSSIBLE, IMPOSSIBLE, IMPOSSIBLE, IMPOSSIBLE)
+
+
+def _remove_tiles(suit_vector: tuple, *indexes: int) -> tuple:
+    """
+    Removes one tile at each of the indexes of the suit vector
+
+    :param suit_vector: tuple counting each tile of a suit
+    :param indexes: indexes of the tiles to remove
+    :return: new tuple without the removed tiles
+    """
+
+    new_suit_vector = list(suit_vector)
+    for index in indexes:
+        new_suit_vector[index] -= 1
+    return tuple(new_suit_vector)
+
+
+@lru_cache(maxsize=None)
+def get_suit_decomposition(suit_vector: tuple) -> tuple:
+    """
+    Gets the best decompositions in melds, pair and meld parts of a suit vector.
+    Results are memoized, so each suit vector is only decomposed once.
+
+    :param suit_vector: tuple counting each tile of a suit, 9 long for number suits and 7 long for honors,
+           example : (0, 3, 1, 1, 1, 0, 0, 0, 0) means the suit contains 3 tile 2, 1 tile 3, 4 and 5
+    :return: decomposition table of the suit vector (see EMPTY_DECOMPOSITION),
+             example : (0, 3, 1, 1, 1, 0, 0, 0, 0) -> (3, 1, 0, -1, -1, 2, 0, -1, -1, -1)
+    """
+
+    # every tile of the lowest index is either isolated or the first tile of a meld or a meld part
+    index = next((index for index, count in enumerate(suit_vector) if count), None)
+    if index is None:
+        return EMPTY_DECOMPOSITION
+
+    count = suit_vector[index]
+    is_number_suit = len(suit_vector) == 9  # honors cannot form sequences
+    has_next = is_number_suit and index <= 7 and suit_vector[index + 1] > 0
+    has_next_next = is_number_suit and index <= 6 and suit_vector[index + 2] > 0
+
+    branches = []  # (leftover suit vector, added melds, added pair, added meld parts)
+    if count >= 3:
+        branches.append((_remove_tiles(suit_vector, index, index, index), 1, 0, 0))
+    if has_next and has_next_next:
+        branches.append((_remove_tiles(suit_vector, index, index + 1, index + 2), 1, 0, 0))
+    if count >= 2:
+        branches.append((_remove_tiles(suit_vector, index, index), 0, 1, 0))
+        branches.append((_remove_tiles(suit_vector, index, index), 0, 0, 1))
+    if has_next:
+        branches.append((_remove_tiles(suit_vector, index, index + 1), 0, 0, 1))
+    if has_next_next:
+        branches.append((_remove_tiles(suit_vector, index, index + 2), 0, 0, 1))
+    branches.append((_remove_tiles(suit_vector, index), 0, 0, 0))  # the tile is left isolated
+
+    decomposition = list(EMPTY_DECOMPOSITION)
+    decomposition[0] = IMPOSSIBLE
+    for leftover, added_melds, added_pair, added_meld_parts in branches:
+        leftover_decomposition = get_suit_decomposition(leftover)
+        for pair in (0, 1):
+            for melds in range(MAX_MELDS + 1):
+                meld_parts = leftover_decomposition[pair * 5 + melds]
+                new_pair = pair + added_pair
+                new_melds = melds + added_melds
+                if meld_parts == IMPOSSIBLE or new_pair > 1 or new_melds > MAX_MELDS:
+                    continue
+                decomposition[new_pair * 5 + new_melds] = max(decomposition[new_pair * 5 + new_melds],
+                                                              meld_parts + added_meld_parts)
+
+    return tuple(decomposition)
+
+
+@lru_cache(maxsize=None)
+def merge_decompositions(first: tuple, second: tuple) -> tuple:
+    """
+    Merges the decomposition tables of two disjoint groups of tiles, a hand can hold only one pair
+
+    :param first: decomposition table of the first group of tiles
+    :param second: decomposition table of the second group of tiles
+    :return: decomposition table of both groups of tiles together
+    """
+
+    merged = [IMPOSSIBLE] * 10
+    for first_index, first_meld_parts in enumerate(first):
+        if first_meld_parts == IMPOSSIBLE:
+            continue
+        first_pair, first_melds = divmod(first_index, 5)
+        for second_index, second_meld_parts in enumerate(second):
+            if second_meld_parts == IMPOSSIBLE:
+                continue
+            second_pair, second_melds = divmod(second_index, 5)
+            pair = first_pair + second_pair
+            melds = first_melds + second_melds
+            if pair > 1 or melds > MAX_MELDS:
+                continue
+            merged[pair * 5 + melds] = max(merged[pair * 5 + melds], first_meld_parts + second_meld_parts)
+
+    return tuple(merged)
+
+
+def get_hand_decomposition(hand_vector) -> tuple:
+    """
+    Gets the decomposition table of a whole hand with one lookup per suit
+
+    :param hand_vector: sequence of 34 integers counting each tile of the hand
+    :return: decomposition table of the hand
+    """
+
+    decomposition = EMPTY_DECOMPOSITION
+    for start, stop in SUIT_RANGES:
+        suit_decomposition = get_suit_decomposition(tuple(hand_vector[start:stop]))
+        decomposition = merge_decompositions(decomposition, suit_decomposition)
+    return decomposition
+
+
+@lru_cache(maxsize=None)
+def get_shanten_from_decomposition(decomposition: tuple, locked_melds: int = 0) -> int:
+    """
+    Gets the standard shanten number of a hand from its decomposition table, results are memoized
+
+    :param decomposition: decomposition table of the hand
+    :param locked_melds: number of melds the player has already called
+    :return: shanten number of the hand for a hand of 4 melds and a pair
+    """
+
+    required_melds = MAX_MELDS - locked_melds
+
+    shanten = 8
+    for index, meld_parts in enumerate(decomposition):
+        if meld_parts == IMPOSSIBLE:
+            continue
+        pair, melds = divmod(index, 5)
+        # only the meld parts that can still become one of the missing melds are useful
+        useful_meld_parts = min(meld_parts, max(required_melds - melds, 0))
+        shanten = min(shanten, 8 - 2 * (melds + locked_melds) - useful_meld_parts - pair)
+    return shanten
+
+
+def get_standard_shanten(hand_vector, locked_melds: int = 0) -> int:
+    """
+    Gets the number of tiles the hand needs to change to be in tenpai for a hand of 4 melds and a pair,
+    0 means tenpai and -1 means the hand is already complete
+
+    :param hand_vector: sequence of 34 integers counting each tile of the hand
+    :param locked_melds: number of melds the player has already called
+    :return: shanten number of the hand
+    """
+
+    return get_shanten_from_decomposition(get_hand_decomposition(hand_vector), locked_melds)
+
+
+def get_13_orphans_shanten(hand_vector) -> int:
+    """
+    Gets the shanten number of the hand for 13 orphans, a hand with one of each terminal and honor plus a pair
+
+    :param hand_vector: sequence of 34 integers counting each tile of the hand
+    :return: 13 orphans shanten number of the hand
+    """
+
+    distinct_orphans = 0
+    has_orphan_pair = 0
+
+    for index in ORPHAN_INDEXES:
+        if hand_vector[index] >= 1:
+            distinct_orphans += 1
+        if hand_vector[index] >= 2:
+            has_orphan_pair = 1
+
+    return 13 - distinct_orphans - has_orphan_pair
+
+
+def get_7_pairs_shanten(hand_vector) -> int:
+    """
+    Gets the shanten number of the hand for 7 pairs, 4 tiles of a same kind only count as one pair
+
+    :param hand_vector: sequence of 34 integers counting each tile of the hand
+    :return: 7 pairs shanten number of the hand
+    """
+
+    pairs = 0
+    kinds = 0
+
+    for count in hand_vector:
+        if count >= 2:
+            pairs += 1
+        if count >= 1:
+            kinds += 1
+
+    # each missing pair costs a tile, and each pair that has no single tile left to be formed from costs another
+    return 6 - pairs + max(7 - kinds, 0)
+
+
+def get_shanten(hand_vector, locked_melds: int = 0) -> int:
+    """
+    Gets the number of tiles the hand needs to change to be in tenpai,
+    0 means tenpai and -1 means the hand is already complete.
+    Whole hands are almost never repeated, so only the suit decompositions are memoized, not the result.
+
+    :param hand_vector: sequence of 34 integers counting each tile of the hand
+    :param locked_melds: number of melds the player has already called
+    :return: shanten number of the hand, the best of standard, 7 pairs and 13 orphans hands
+    """
+
+    hand_vector = tuple(int(count) for count in hand_vector)
+    shanten = get_standard_shanten(hand_vector, locked_melds)
+
+    # there is only two special cases with different winning conditions: 13 orphans and 7 pairs,
+    # and both need a closed hand without any called meld
+    if locked_melds == 0:
+        shanten = min(shanten, get_13_orphans_shanten(hand_vector), get_7_pairs_shanten(hand_vector))
+
+    return shanten
+
+
+def is_hand_in_tenpai(hand_vector, locked_melds: int = 0) -> bool:
+    """
+    Checks if a hand of 13 tiles minus 3 tiles per locked meld is in tenpai, waiting on at least one tile
+    it does not already hold 4 times
+
+    :param hand_vector: sequence of 34 integers counting each tile of the hand
+    :param locked_melds: number of melds the player has already called
+    :return: True if the hand is in tenpai, False otherwise
+    """
+
+    hand_vector = [int(count) for count in hand_vector]
+    suit_decompositions = [get_suit_decomposition(tuple(hand_vector[start:stop])) for start, stop in SUIT_RANGES]
+    shanten = _get_shanten_from_suits(suit_decompositions, hand_vector, locked_melds)
+    if shanten != 0:
+        return shanten < 0
+
+    # a hand whose only waits are the kinds it holds 4 times can never win
+    return bool(_get_useful_tiles(hand_vector, suit_decompositions, locked_melds, shanten))
+
+
+def _get_shanten_from_suits(suit_decompositions: list[tuple], hand_vector: list[int], locked_melds: int) -> int:
+    """
+    Gets the shanten number of a hand whose suits are already decomposed
+
+    :param suit_decompositions: decomposition tables of the 4 suits of the hand
+    :param hand_vector: list of 34 integers counting each tile of the hand
+    :param locked_melds: number of melds the player has already called
+    :return: shanten number of the hand
+    """
+
+    decomposition = EMPTY_DECOMPOSITION
+    for suit_decomposition in suit_decompositions:
+        decomposition = merge_decompositions(decomposition, suit_decomposition)
+
+    shanten = get_shanten_from_decomposition(decomposition, locked_melds)
+    if locked_melds == 0:
+        shanten = min(shanten, get_13_orphans_shanten(hand_vector), get_7_pairs_shanten(hand_vector))
+    return shanten
+
+
+def _get_useful_tiles(hand_vector: list[int],
+                      suit_decompositions: list[tuple],
+                      locked_melds: int,
+                      shanten: int) -> list[int]:
+    """
+    Gets the useful tiles of a hand whose suits are already decomposed
+
+    :param hand_vector: list of 34 integers counting each tile of the hand, restored before returning
+    :param suit_decompositions: decomposition tables of the 4 suits of the hand
+    :param locked_melds: number of melds the player has already called
+    :param shanten: shanten number of the hand
+    :return: list of the indexes in VALID_TILES of the useful tiles
+    """
+
+    useful_tiles = []
+
+    # 13 orphans and 7 pairs shanten of the hand plus a drawn tile are deduced from those counts
+    pairs = sum(1 for count in hand_vector if count >= 2)
+    kinds = sum(1 for count in hand_vector if count >= 1)
+    distinct_orphans = sum(1 for index in ORPHAN_INDEXES if hand_vector[index] >= 1)
+    has_orphan_pair = any(hand_vector[index] >= 2 for index in ORPHAN_INDEXES)
+
+    # a drawn tile only changes the decomposition of its own suit, so the other suits are merged once per suit
+    for suit_index, (start, stop) in enumerate(SUIT_RANGES):
+        other_suits_decomposition = EMPTY_DECOMPOSITION
+        for other_suit_index, suit_decomposition in enumerate(suit_decompositions):
+            if other_suit_index != suit_index:
+                other_suits_decomposition = merge_decompositions(other_suits_decomposition, suit_decomposition)
+
+        for index in range(start, stop):
+            if hand_vector[index] >= 4:  # the player already holds every tile of this kind
+                continue
+
+            count = hand_vector[index]
+            hand_vector[index] += 1
+            decomposition = merge_decompositions(other_suits_decomposition,
+                                                 get_suit_decomposition(tuple(hand_vector[start:stop])))
+            hand_vector[index] -= 1
+            new_shanten = get_shanten_from_decomposition(decomposition, locked_melds)
+
+            if locked_melds == 0:
+                new_pairs = pairs + (count == 1)
+                new_kinds = kinds + (count == 0)
+                new_shanten = min(new_shanten, 6 - new_pairs + max(7 - new_kinds, 0))
+                if index in ORPHAN_INDEXES:
+                    new_shanten = min(new_shanten,
+                                      13 - distinct_orphans - (count == 0) - (has_orphan_pair or count == 1))
+                else:
+                    new_shanten = min(new_shanten, 13 - distinct_orphans - has_orphan_pair)
+
+            if new_shanten < shanten:
+                useful_tiles.append(index)
+
+    return useful_tiles
+
+
+def get_useful_tiles(hand_vector, locked_melds: int = 0) -> list[int]:
+    """
+    Gets the tiles that lower the shanten number of the hand when drawn,
+    for a hand in tenpai those are the tiles that complete the hand
+
+    :param hand_vector: sequence of 34 integers counting each tile of the hand
+    :param locked_melds: number of melds the player has already called
+    :return: list of the indexes in VALID_TILES of the useful tiles
+    """
+
+    hand_vector = [int(count) for count in hand_vector]
+    suit_decompositions = [get_suit_decomposition(tuple(hand_vector[start:stop])) for start, stop in SUIT_RANGES]
+    shanten = get_shanten(hand_vector, locked_melds)
+
+    return _get_useful_tiles(hand_vector, suit_decompositions, locked_melds, shanten)
+
+
+def get_ukeire(hand_vector, visible_vector, locked_melds: int = 0) -> list[tuple[int, int]]:
+    """
+    Gets the useful tiles of the hand with the number of each of them that can still be drawn
+
+    :param hand_vector: sequence of 34 integers counting each tile of the hand
+    :param visible_vector: sequence of 34 integers counting each tile the player can see, his own hand included
+    :param locked_melds: number of melds the player has already called
+    :return: list of (index in VALID_TILES, number of live tiles) for each useful tile
+    """
+
+    return [(index, max(4 - int(visible_vector[index]), 0)) for index in get_useful_tiles(hand_vector, locked_melds)]
+
+
+def get_discard_advice(hand_vector, visible_vector, locked_melds: int = 0) -> list[dict]:
+    """
+    Evaluates every distinct discard of a hand of 14 tiles minus 3 tiles per locked meld.
+    The hand suits are decomposed once and a discard only decomposes again the suit it is taken from,
+    the other suits decompositions are reused from one candidate to the other.
+
+    :param hand_vector: sequence of 34 integers counting each tile of the hand
+    :param visible_vector: sequence of 34 integers counting each tile the player can see, his own hand included
+    :param locked_melds: number of melds the player has already called
+    :return: list of dict sorted from the best discard to the worst one,
+             example : [{'index': 33, 'shanten': 1, 'ukeire': 12, 'useful_tiles': [(2, 4), (5, 4), (8, 4)]}]
+    """
+
+    hand_vector = [int(count) for count in hand_vector]
+    suit_decompositions = [get_suit_decomposition(tuple(hand_vector[start:stop])) for start, stop in SUIT_RANGES]
+    advice = []
+
+    for suit_index, (start, stop) in enumerate(SUIT_RANGES):
+        for index in range(start, stop):
+            if not hand_vector[index]:
+                continue
+
+            hand_vector[index] -= 1
+            discard_suit_decompositions = list(suit_decompositions)
+            discard_suit_decompositions[suit_index] = get_suit_decomposition(tuple(hand_vector[start:stop]))
+            shanten = _get_shanten_from_suits(discard_suit_decompositions, hand_vector, locked_melds)
+            useful_tiles = [(useful_tile, max(4 - int(visible_vector[useful_tile]), 0)) for useful_tile in
+                            _get_useful_tiles(hand_vector, discard_suit_decompositions, locked_melds, shanten)]
+            hand_vector[index] += 1
+
+            advice.append({
+                'index': index,
+                'shanten': shanten,
+                'ukeire': sum(live for useful_tile, live in useful_tiles),
+                'useful_tiles': useful_tiles,
+            })
+
+    advice.sort(key=lambda discard: (discard['shanten'], -discard['ukeire']))
+    return advice
+
+#  ------------  batched evaluation  ------------
+
+# dense versions of the suit lookup tables, indexed by the base 5 key of the suit vector,
+# they are only allocated on the first batch and filled with the decompositions met in batches
+UNFILLED = -2
+_NUMBER_SUIT_KEY_WEIGHTS = 5 ** np.arange(8, -1, -1, dtype=np.int64)
+_HONOR_SUIT_KEY_WEIGHTS = 5 ** np.arange(6, -1, -1, dtype=np.int64)
+_dense_tables = {}
+
+# (first index, second index, merged index) of every valid merge of two decomposition tables
+_MERGE_INDEXES = tuple(
+    (first_pair * 5 + first_melds, second_pair * 5 + second_melds,
+     (first_pair + second_pair) * 5 + first_melds + second_melds)
+    for first_pair in (0, 1) for second_pair in (0, 1) if first_pair + second_pair <= 1
+    for first_melds in range(MAX_MELDS + 1) for second_melds in range(MAX_MELDS + 1 - first_melds)
+)
+
+
+def _get_dense_table(suit_size: int) -> np.ndarray:
+    """
+    Gets the dense lookup table of a suit size, allocating it on first use
+
+    :param suit_size: 9 for number suits and 7 for honors
+    :return: numpy array of shape (5 ** suit_size, 10)
+    """
+
+    if suit_size not in _dense_tables:
+        _dense_tables[suit_size] = np.full((5 ** suit_size, 10), UNFILLED, dtype=np.int8)
+    return _dense_tables[suit_size]
+
+
+def get_suit_decomposition_batch(suit_matrix: np.ndarray) -> np.ndarray:
+    """
+    Gets the decomposition tables of many suit vectors with a single gather in the dense lookup table,
+    only the suit vectors never met before are decomposed one by one
+
+    :param suit_matrix: numpy array of shape (N, 9) or (N, 7) counting each tile of a suit for N hands
+    :return: numpy array of shape (N, 10) containing the decomposition table of each suit vector
+    """
+
+    suit_size = suit_matrix.shape[1]
+    weights = _NUMBER_SUIT_KEY_WEIGHTS if suit_size == 9 else _HONOR_SUIT_KEY_WEIGHTS
+    table = _get_dense_table(suit_size)
+
+    keys = suit_matrix.astype(np.int64) @ weights
+    is_missing = table[keys, 0] == UNFILLED
+    if is_missing.any():
+        missing_keys, missing_rows = np.unique(keys[is_missing], return_index=True)
+        missing_suit_vectors = suit_matrix[is_missing][missing_rows]
+        table[missing_keys] = [get_suit_decomposition(tuple(int(count) for count in suit_vector))
+                               for suit_vector in missing_suit_vectors]
+
+    return table[keys].astype(np.int16)
+
+
+def merge_decompositions_batch(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """
+    Merges the decomposition tables of two disjoint groups of tiles for N hands at once
+
+    :param first: numpy array of shape (N, 10) of decomposition tables of the first group of tiles
+    :param second: numpy array of shape (N, 10) of decomposition tables of the second group of tiles
+    :return: numpy array of shape (N, 10) of decomposition tables of both groups of tiles together
+    """
+
+    merged = np.full(first.shape, IMPOSSIBLE, dtype=np.int16)
+    for first_index, second_index, merged_index in _MERGE_INDEXES:
+        possible = (first[:, first_index] != IMPOSSIBLE) & (second[:, second_index] != IMPOSSIBLE)
+        meld_parts = np.where(possible, first[:, first_index] + second[:, second_index], IMPOSSIBLE)
+        np.maximum(merged[:, merged_index], meld_parts, out=merged[:, merged_index])
+    return merged
+
+
+def get_shanten_batch(hand_matrix: np.ndarray, locked_melds=0) -> np.ndarray:
+    """
+    Gets the shanten number of N hands at once with vectorized operations and lookup table gathers.
+    Once the lookup tables hold the suit vectors of the batch, the target throughput is
+    at least 200 000 hands per second.
+
+    :param hand_matrix: numpy array of shape (N, 34) counting each tile of VALID_TILES for each hand
+    :param locked_melds: number of melds already called, either the same for every hand or an array of shape (N,)
+    :return: numpy array of shape (N,) containing the shanten number of each hand
+    """
+
+    hand_matrix = np.asarray(hand_matrix)
+    locked_melds = np.broadcast_to(np.asarray(locked_melds, dtype=np.int16), (hand_matrix.shape[0],))
+
+    decomposition = None
+    for start, stop in SUIT_RANGES:
+        suit_decomposition = get_suit_decomposition_batch(hand_matrix[:, start:stop])
+        if decomposition is None:
+            decomposition = suit_decomposition
+        else:
+            decomposition = merge_decompositions_batch(decomposition, suit_decomposition)
+
+    required_melds = MAX_MELDS - locked_melds
+    shanten = np.full(hand_matrix.shape[0], 8, dtype=np.int16)
+    for index in range(10):
+        pair, melds = divmod(index, 5)
+        meld_parts = decomposition[:, index]
+        useful_meld_parts = np.minimum(meld_parts, np.maximum(required_melds - melds, 0))
+        index_shanten = 8 - 2 * (melds + locked_melds) - useful_meld_parts - pair
+        np.minimum(shanten, np.where(meld_parts != IMPOSSIBLE, index_shanten, 8), out=shanten)
+
+    # 13 orphans and 7 pairs only apply to closed hands
+    orphans = hand_matrix[:, ORPHAN_INDEXES]
+    orphans_shanten = 13 - (orphans >= 1).sum(axis=1) - (orphans >= 2).any(axis=1)
+    pairs_shanten = 6 - (hand_matrix >= 2).sum(axis=1) + np.maximum(7 - (hand_matrix >= 1).sum(axis=1), 0)
+    special_shanten = np.minimum(orphans_shanten, pairs_shanten)
+    shanten = np.where(locked_melds == 0, np.minimum(shanten, special_shanten), shanten)
+
+    return shanten
+
+
+def are_hands_in_tenpai(hand_matrix: np.ndarray, locked_melds=0) -> np.ndarray:
+    """
+    Checks if N hands of 13 tiles minus 3 tiles per locked meld are in tenpai at once
+
+    :param hand_matrix: numpy array of shape (N, 34) counting each tile of VALID_TILES for each hand
+    :param locked_melds: number of melds already called, either the same for every hand or an array of shape (N,)
+    :return: numpy array of shape (N,) of booleans, True for hands in tenpai
+    """
+
+    hand_matrix = np.asarray(hand_matrix)
+    locked_melds = np.broadcast_to(np.asarray(locked_melds, dtype=np.int16), (hand_matrix.shape[0],))
+    in_tenpai = get_shanten_batch(hand_matrix, locked_melds) <= 0
+
+    # only a hand holding 4 tiles of a kind can have all its waits dead, those few are checked one by one
+    for index in np.flatnonzero(in_tenpai & (hand_matrix >= 4).any(axis=1)):
+        in_tenpai[index] = is_hand_in_tenpai(hand_matrix[index], int(locked_melds[index]))
+
+    return in_tenpai
@@ -1,3 +1,1268 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import random
+import numpy as np
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework.test import APIClient
+from games.calls import format_call, get_turn_phase_calls, get_call_phase_calls, get_call_interests, \
+    get_interested_winds
+from games.state import Table
+from games.prng import CounterRandom
+from games.tenpai import ORPHAN_INDEXES, get_suit_decomposition, get_shanten, is_hand_in_tenpai, get_useful_tiles, \
+    get_ukeire, get_shanten_batch, are_hands_in_tenpai
+from games.replay import rebuild_hand
+from games.benchmarks import ROUNDS, run_benchmark, load_baselines, save_baselines, get_regressions
+from games.models import Game, Player, Hand, ActionConflict, HandSnapshot, GameAction, GameEvent, TileStackHolder
+from games.simulation import Policy, simulate_game, call_phase_timer_disconnected
+from games.signals import recover_call_phases, end_call_phase_at_deadline
+from games.utils import MAX_PLAYERS_PER_GAME, ACTION_ATTEMPTS, UNIQUE_TILES, SNAPSHOT_INTERVAL
+from tiles.models import TileStack, Tile
+from tiles.utils import WIND_NAMES, VALID_TILES, get_tile_kind, get_tile_counts
+from games.websockets import Broadcaster, broadcaster, wait_for_game_change, websocket_application, \
+    CLOSE_CODE_UNAUTHORIZED
 
-# Create your tests here.
+
+def create_users(number_of_users: int = MAX_PLAYERS_PER_GAME, prefix: str = 'player ') -> list[User]:
+    return [User.objects.create_user(prefix + str(i), password='password') for i in range(number_of_users)]
+
+
+def start_game(users: list[User], seed: int = None, random_state: list = None) -> Game:
+    """
+    Creates a game seating the users and starts it, same as the CreateGame and AddUserToGame views
+
+    :param users: users seated at the game, the first one creates it
+    :param seed: seed of the game, a random one is used if not given
+    :param random_state: python random state of the seed, as stored by the games created before random_cursor
+    :return: started instance of Game
+    """
+
+    game = Game.create(users[0], users[0].username)
+    for user in users[1:]:
+        game.add_player(user, user.username)
+    if seed is not None:
+        game.generate_seed(seed)
+    if random_state is not None:
+        game.random_state = random_state
+        game.save()
+    game.fill_up()
+    game.start()
+
+    return game
+
+
+def discard_tile(hand: Hand, player: Player, tile) -> None:
+    # same as the DiscardTile view
+    hand.player_discard(player, tile)
+    hand.start_call_phase()
+
+
+def call_in_call_phase(hand: Hand, player: Player, call: dict) -> None:
+    # same as the CallInCallPhase view
+    player.send_call(call, hand)
+    hand.end_call_phase_if_all_players_responded()
+
+
+def play_turns(game: Game,
+               number_of_turns: int,
+               call_types: tuple = ('pon', 'chi'),
+               discard=discard_tile,
+               call=call_in_call_phase) -> None:
+    """
+    Makes the players discard their first tile and answer every call phase, taking the first call they can
+    of the call types, to create melds, and passing otherwise
+
+    :param game: started instance of Game
+    :param number_of_turns: number of discards to play
+    :param call_types: types of the calls the players take
+    :param discard: callable playing a discard, given the current hand, the player and the tile
+    :param call: callable sending a call in the call phase, given the current hand, the player and the call
+    :return: None
+    """
+
+    for _ in range(number_of_turns):
+        hand = game.current_round.current_hand
+        player = game.player_set.get(can_play=True)
+        tile = player.playerhand_set.get(game_hand=hand).tile_stack.tile_set.order_by('position_in_tile_stack')[0]
+        discard(hand, player, tile)
+
+        for other_player in game.player_set.exclude(possible_calls=[]):
+            if {"type": "pass"} not in other_player.possible_calls:  # calls of the turn of the next player
+                continue
+            calls = [call for call in other_player.possible_calls if call.get("type") in call_types]
+            call(hand, other_player, calls[0] if calls else {"type": "pass"})
+
+
+def set_hand_kinds(player: Player, kinds: list[int]) -> None:
+    """
+    Replaces the tiles of the current hand of a player, keeping their rows
+
+    :param player: instance of Player, holding as many tiles as kinds given
+    :param kinds: kinds of the tiles, the physical ids are taken in order from the first copy of each kind
+    :return: None
+    """
+
+    physical_ids = [kind + UNIQUE_TILES * kinds[:i].count(kind) for i, kind in enumerate(kinds)]
+    player_hand = player.current_player_hand
+    for tile, physical_id in zip(player_hand.tile_stack.tile_set.order_by('position_in_tile_stack'), physical_ids):
+        tile.kind, tile.physical_id = get_tile_kind(physical_id), physical_id
+        tile.suit, tile.name = VALID_TILES[tile.kind]
+        tile.save()
+    player_hand.tile_stack.tile_counts = get_tile_counts(physical_ids)
+    player_hand.tile_stack.save()
+
+
+def get_hand_vector(dots: str = '', bamboos: str = '', characters: str = '', honors: str = '') -> list[int]:
+    """
+    Counts the tiles of a hand written by suit, the honors are numbered east 1 -> white 7 like in VALID_TILES
+
+    :return: list of 34 integers counting each tile of VALID_TILES, example : get_hand_vector(dots='123', honors='11')
+    """
+
+    hand_vector = [0] * 34
+    for offset, numbers in ((0, dots), (9, bamboos), (18, characters), (27, honors)):
+        for number in numbers:
+            hand_vector[offset + int(number) - 1] += 1
+    return hand_vector
+
+
+def is_complete_brute_force(hand_vector: list[int], melds: int, pair: bool = True) -> bool:
+    # tries every meld and pair on the first tile left, restoring the counts before returning
+    kind = next((kind for kind, count in enumerate(hand_vector) if count), None)
+    if kind is None:
+        return melds == 0 and not pair
+
+    shapes = []
+    if pair and hand_vector[kind] >= 2:
+        shapes.append(((kind, kind), melds, False))
+    if melds and hand_vector[kind] >= 3:
+        shapes.append(((kind, kind, kind), melds - 1, pair))
+    if melds and kind < 27 and kind % 9 <= 6 and hand_vector[kind + 1] and hand_vector[kind + 2]:
+        shapes.append(((kind, kind + 1, kind + 2), melds - 1, pair))
+
+    for kinds, melds_left, pair_left in shapes:
+        for shape_kind in kinds:
+            hand_vector[shape_kind] -= 1
+        is_complete = is_complete_brute_force(hand_vector, melds_left, pair_left)
+        for shape_kind in kinds:
+            hand_vector[shape_kind] += 1
+        if is_complete:
+            return True
+    return False
+
+
+def is_winning_hand_brute_force(hand_vector: list[int], locked_melds: int) -> bool:
+    if is_complete_brute_force(list(hand_vector), 4 - locked_melds):
+        return True
+    if locked_melds:
+        return False
+    if sum(1 for count in hand_vector if count == 2) == 7:
+        return True
+    return all(hand_vector[index] for index in ORPHAN_INDEXES) and \
+        sum(hand_vector[index] for index in ORPHAN_INDEXES) == 14
+
+
+def get_waits_brute_force(hand_vector: list[int], locked_melds: int) -> list[int]:
+    # the kinds which complete the hand when drawn, except the ones the player already holds 4 times
+    waits = []
+    for kind in range(34):
+        if hand_vector[kind] < 4:
+            hand_vector[kind] += 1
+            if is_winning_hand_brute_force(hand_vector, locked_melds):
+                waits.append(kind)
+            hand_vector[kind] -= 1
+    return waits
+
+
+def draw_hand_vector(game_random: random.Random, locked_melds: int) -> list[int]:
+    """
+    Draws a hand of 13 tiles minus 3 tiles per locked meld, either from a full wall or from a complete hand
+    missing one tile, with one more tile swapped a third of the time, so that many hands are around tenpai
+
+    :param game_random: random generator of the test
+    :param locked_melds: number of melds the player has already called
+    :return: list of 34 integers counting each tile of the hand
+    """
+
+    if game_random.random() < 0.5:
+        hand_vector = [0] * 34
+        for kind in game_random.sample([kind for kind in range(34) for _ in range(4)], 13 - 3 * locked_melds):
+            hand_vector[kind] += 1
+        return hand_vector
+
+    hand_vector = [5] * 34
+    while max(hand_vector) > 4:
+        hand_vector = [0] * 34
+        for _ in range(4 - locked_melds):
+            kind = game_random.randrange(34)
+            is_chi = kind < 27 and kind % 9 <= 6 and game_random.random() < 0.6
+            for meld_kind in ((kind, kind + 1, kind + 2) if is_chi else (kind, kind, kind)):
+                hand_vector[meld_kind] += 1
+        hand_vector[game_random.randrange(34)] += 2
+
+    for _ in range(1 if game_random.random() < 2 / 3 else 2):
+        hand_vector[game_random.choice([kind for kind in range(34) for _ in range(hand_vector[kind])])] -= 1
+    if sum(hand_vector) < 13 - 3 * locked_melds:
+        hand_vector[game_random.choice([kind for kind in range(34) if hand_vector[kind] < 4])] += 1
+    return hand_vector
+
+
+class ViewGameQueriesTestCase(TestCase):
+    """
+    Checks that viewing a game costs a fixed number of queries, whatever the number of tiles, discards and melds
+    """
+
+    # game, current hand with its round, players, tile stacks and tiles
+    VIEW_GAME_QUERIES = 5
+
+    def setUp(self):
+        self.users = create_users()
+        self.game = start_game(self.users)
+
+    def view_game(self, user: User) -> dict:
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.assertNumQueries(self.VIEW_GAME_QUERIES):
+            response = client.get('/games/' + str(self.game.id))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_view_game_queries_stay_constant(self):
+        for user in self.users:
+            self.assertIn('player', self.view_game(user))
+
+        play_turns(self.game, 24)
+
+        for user in self.users:
+            self.assertIn('player', self.view_game(user))
+        spectator = User.objects.create_user('spectator', password='password')
+        self.assertNotIn('player', self.view_game(spectator))
+
+
+class TransferToQueriesTestCase(TestCase):
+    """
+    Checks that transferring a tile costs a fixed number of queries, whatever the size of the tile stacks
+    """
+
+    # tile, receiving tile stack, positions of the following tiles and sending tile stack, plus the savepoint
+    # of the transaction and its release
+    TRANSFER_TO_QUERIES = 6
+
+    def setUp(self):
+        self.game = start_game(create_users(), 0)
+        self.hand = self.game.current_round.current_hand
+        self.player_discard = self.game.player_set.get(is_dealer=True).current_player_discard.tile_stack
+
+    def transfer_first_tile(self, tile_stack: TileStack) -> None:
+        tile = tile_stack.tile_set.order_by('position_in_tile_stack').first()
+        with self.assertNumQueries(self.TRANSFER_TO_QUERIES):
+            tile_stack.transfer_to(self.player_discard, tile)
+
+        tile_stack.refresh_from_db()
+        self.assertEqual(tile_stack.length, tile_stack.tile_set.count())
+        self.assertEqual(sorted(tile_stack.tile_set.values_list('position_in_tile_stack', flat=True)),
+                         list(range(tile_stack.length)))
+        self.assertEqual(Tile.objects.get(id=tile.id).tile_stack_id, self.player_discard.id)
+
+    def test_transfer_from_a_small_tile_stack(self):
+        self.transfer_first_tile(self.game.player_set.get(is_dealer=True).current_player_hand.tile_stack)
+
+    def test_transfer_from_a_large_tile_stack(self):
+        # every tile of a game as rows, the first one is transferred so all the others are moved
+        tile_stack = TileStackHolder.create_tile_stack('large', self.hand)
+        physical_ids = list(range(4 * UNIQUE_TILES))
+        Tile.objects.bulk_create([Tile(suit=VALID_TILES[get_tile_kind(physical_id)][0],
+                                       name=VALID_TILES[get_tile_kind(physical_id)][1],
+                                       kind=get_tile_kind(physical_id), physical_id=physical_id,
+                                       tile_stack=tile_stack, position_in_tile_stack=physical_id)
+                                  for physical_id in physical_ids])
+        tile_stack.length = len(physical_ids)
+        tile_stack.tile_counts = get_tile_counts(physical_ids)
+        tile_stack.save()
+
+        self.transfer_first_tile(tile_stack)
+
+
+class SetUpQueriesTestCase(TestCase):
+    """
+    Checks that setting up a hand costs a fixed number of queries, see the set_up benchmark
+    """
+
+    # game and its players, 6 inserts per player for his hand and discard, 2 per wall tile stack, the tiles,
+    # the tile stacks lengths, the players shanten, the hand, and the hand_start event in a savepoint
+    SET_UP_QUERIES = 41
+
+    def test_set_up_queries_stay_constant(self):
+        game = start_game(create_users(), 0)
+        for position_in_round in range(2, 4):
+            hand = Hand.create(game.current_round, position_in_round)
+            with self.assertNumQueries(self.SET_UP_QUERIES):
+                hand.set_up()
+
+            self.assertEqual(Tile.objects.filter(tile_stack__holder__game_hand=hand).count(),
+                             MAX_PLAYERS_PER_GAME * 13)
+            for player in game.player_set.all():
+                self.assertEqual(player.playerhand_set.get(game_hand=hand).tile_stack.length, 13)
+
+
+@override_settings(REQUEST_METRICS_HEADERS=True)
+class EndpointQueryBudgetsTestCase(TestCase):
+    """
+    Checks that every endpoint of the games stays within its query budget, see QUERY_BUDGETS in the settings
+    """
+
+    SEED = 0
+    NUMBER_OF_TURNS = 24
+    CLOSED_KAN_SEED = 64  # west can make a closed kan on the second turn, when every call phase is passed
+
+    def setUp(self):
+        self.users = create_users()
+        self.clients = {}
+        for user in self.users:
+            self.clients[user.id] = APIClient()
+            self.clients[user.id].force_authenticate(user)
+        self.queries = {}  # url name -> highest number of queries of its requests
+
+    def request(self, user: User, method: str, path: str, data: dict = None):
+        if method == 'get':
+            response = self.clients[user.id].get(path, data)
+        else:
+            response = self.clients[user.id].post(path, data, format='json')
+        url_name = response.resolver_match.url_name
+        self.queries[url_name] = max(self.queries.get(url_name, 0), int(response['X-Query-Count']))
+        return response
+
+    def create_game(self, seed: int) -> Game:
+        """
+        Creates a game and seats every user through the endpoints, the last one to join starts it
+
+        :param seed: seed of the game
+        :return: started instance of Game
+        """
+
+        response = self.request(self.users[0], 'post', '/games/create')
+        game = Game.objects.get(id=response.json()['game']['id'])
+        game.generate_seed(seed)
+        game_path = '/games/' + str(game.id)
+
+        for user in self.users:
+            self.request(user, 'get', game_path)
+        for user in self.users[1:]:
+            self.request(user, 'post', game_path + '/join')
+
+        return game
+
+    def play_turns(self, game: Game, number_of_turns: int, call_types: tuple = ('pon', 'chi')) -> None:
+        game_path = '/games/' + str(game.id)
+        play_turns(game, number_of_turns, call_types,
+                   discard=lambda hand, player, tile: self.request(player.user, 'post',
+                                                                   game_path + '/discard/' + str(tile.id)),
+                   call=lambda hand, player, call: self.request(player.user, 'post',
+                                                                game_path + '/call_in_call_phase', {'call': call}))
+
+    def test_endpoints_stay_within_query_budgets(self):
+        game = self.create_game(self.SEED)
+        game_path = '/games/' + str(game.id)
+
+        dealer = Player.objects.get(game=game, is_dealer=True)
+        self.request(dealer.user, 'get', game_path + '/advice')
+        self.play_turns(game, self.NUMBER_OF_TURNS)
+        for user in self.users:
+            self.request(user, 'get', game_path)
+        self.request(self.users[0], 'get', game_path + '/events', {'since': 0})
+
+        kan_game = self.create_game(self.CLOSED_KAN_SEED)
+        self.play_turns(kan_game, 2, call_types=())
+        player = Player.objects.get(game=kan_game, can_play=True)
+        call = {"type": "closed kan", "suit": "dragon", "name": "green-green-green-green"}
+        self.assertIn(call, player.possible_calls)
+        response = self.request(player.user, 'post', '/games/' + str(kan_game.id) + '/call_in_turn_phase',
+                                {'call': call})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Player.objects.get(id=player.id).current_player_melds.get().tile_stack.length, 4)
+
+        for url_name, query_budget in settings.QUERY_BUDGETS.items():
+            if url_name == 'user':  # not an endpoint of the games
+                continue
+            self.assertIn(url_name, self.queries)
+            self.assertLessEqual(self.queries[url_name], query_budget, url_name)
+
+
+class HandClaimTestCase(TestCase):
+    """
+    Checks that only one of the actions checked on the same version of a hand can be played
+    """
+
+    def setUp(self):
+        self.users = create_users()
+        self.game = start_game(self.users)
+        self.hand = self.game.current_round.current_hand
+        self.dealer = self.game.player_set.get(is_dealer=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.dealer.user)
+
+    def test_claim_of_an_outdated_hand_conflicts(self):
+        concurrent_hand = Hand.objects.get(id=self.hand.id)
+        self.hand.claim()
+        with self.assertRaises(ActionConflict):
+            concurrent_hand.claim()
+
+        # the timer ending the call phase changes the version too
+        concurrent_hand.refresh_from_db()
+        Hand.objects.filter(id=self.hand.id).update(in_call_phase=True)
+        self.hand.end_call_phase()
+        with self.assertRaises(ActionConflict):
+            concurrent_hand.claim()
+
+    def discard_with_concurrent_actions(self, number_of_concurrent_actions: int):
+        """
+        Posts a discard of the dealer while concurrent actions change the hand between its read and its claim
+
+        :param number_of_concurrent_actions: number of attempts of the discard preceded by a concurrent action
+        :return: response to the discard, mock of Hand.claim and discarded tile
+        """
+
+        tile = self.dealer.current_player_hand.tile_stack.tile_set.first()
+        claim = Hand.claim
+        attempts = []
+
+        def claim_after_concurrent_action(hand: Hand) -> None:
+            attempts.append(hand)
+            if len(attempts) <= number_of_concurrent_actions:
+                Hand.objects.filter(id=hand.id).update(version=F('version') + 1)
+            claim(hand)
+
+        with mock.patch.object(Hand, 'claim', autospec=True, side_effect=claim_after_concurrent_action) as mocked:
+            response = self.client.post('/games/{}/discard/{}'.format(self.game.id, tile.id))
+
+        return response, mocked, tile
+
+    def test_stale_action_is_played_again(self):
+        response, claim, tile = self.discard_with_concurrent_actions(1)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(claim.call_count, 2)
+        self.assertFalse(self.dealer.current_player_hand.tile_stack.tile_set.filter(id=tile.id).exists())
+        self.assertEqual(GameAction.objects.filter(hand=self.hand, type='discard').count(), 1)
+
+    def test_always_stale_action_conflicts(self):
+        response, claim, tile = self.discard_with_concurrent_actions(ACTION_ATTEMPTS)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(claim.call_count, ACTION_ATTEMPTS)
+        # every attempt is rolled back
+        self.assertTrue(self.dealer.current_player_hand.tile_stack.tile_set.filter(id=tile.id).exists())
+        self.assertFalse(GameAction.objects.filter(hand=self.hand, type='discard').exists())
+
+
+class CallPhaseRecoveryTestCase(TestCase):
+    """
+    Checks that the call phases left open by a restart are ended or scheduled again
+    """
+
+    def setUp(self):
+        self.game = start_game(create_users())
+        self.hand = self.game.current_round.current_hand
+        dealer = self.game.player_set.get(is_dealer=True)
+        self.hand.player_discard(dealer, dealer.current_player_hand.tile_stack.tile_set.first())
+
+    def open_call_phase(self, deadline) -> None:
+        # the timer of the process which opened the phase is lost
+        Hand.objects.filter(id=self.hand.id).update(in_call_phase=True, call_phase_deadline=deadline)
+
+    def test_past_deadline_call_phase_is_ended(self):
+        self.open_call_phase(timezone.now() - timedelta(seconds=1))
+
+        with mock.patch('games.signals.schedule') as schedule:
+            recover_call_phases()
+
+        schedule.assert_not_called()
+        self.hand.refresh_from_db()
+        self.assertFalse(self.hand.in_call_phase)
+        self.assertIsNone(self.hand.call_phase_deadline)
+        self.assertEqual(self.game.player_set.get(can_play=True).wind, 'south')
+
+    def test_future_deadline_call_phase_is_scheduled_again(self):
+        deadline = timezone.now() + timedelta(seconds=5)
+        self.open_call_phase(deadline)
+
+        with mock.patch('games.signals.schedule') as schedule:
+            recover_call_phases()
+
+        schedule.assert_called_once_with(deadline, end_call_phase_at_deadline, self.hand.id, deadline)
+        self.hand.refresh_from_db()
+        self.assertTrue(self.hand.in_call_phase)
+
+
+class CallPhaseEventTestCase(TestCase):
+    """
+    Checks that the public event of a call phase does not tell who can call
+    """
+
+    def test_interested_players_are_only_told_privately(self):
+        game = start_game(create_users(), 0)
+        hand = game.current_round.current_hand
+        while not hand.in_call_phase:
+            player = game.player_set.get(can_play=True)
+            discard_tile(hand, player, player.current_player_hand.tile_stack.tile_set.first())
+
+        event = GameEvent.objects.filter(game=game).last()
+        self.assertEqual(event.type, 'call_phase_open')
+        self.assertEqual(list(event.data), ["deadline"])
+
+        interested_players = game.player_set.exclude(possible_calls=[])
+        self.assertTrue(interested_players.exists())
+        for player in interested_players:
+            client = APIClient()
+            client.force_authenticate(player.user)
+            response = client.get('/games/' + str(game.id))
+            self.assertIn({"type": "pass"}, response.data['player']['possible_calls'])
+
+
+class ConditionalGetTestCase(TestCase):
+    """
+    Checks that a client which already has the current version of a game gets a 304 instead of the game
+    """
+
+    def setUp(self):
+        self.game = start_game(create_users(), 0)
+        self.user = self.game.player_set.get(is_dealer=True).user
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.path = '/games/' + str(self.game.id)
+
+    def test_game_is_only_sent_once_it_changes(self):
+        response = self.client.get(self.path)
+        self.game.refresh_from_db()
+        etag = '"{}-{}"'.format(self.game.version, self.user.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get(self.path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(response.content)
+
+        # the ETag of another user does not match
+        response = self.client.get(self.path, HTTP_IF_NONE_MATCH='"{}-{}"'.format(self.game.version, 0))
+        self.assertEqual(response.status_code, 200)
+
+        play_turns(self.game, 1)
+        response = self.client.get(self.path, HTTP_IF_NONE_MATCH=etag)
+        self.game.refresh_from_db()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"{}-{}"'.format(self.game.version, self.user.id))
+        self.assertEqual(response.data['player']['id'], self.game.player_set.get(user=self.user).id)
+        self.assertEqual(len(response.data['player']['hand']['tiles']), 13)
+
+    def test_wait_must_be_a_number(self):
+        self.assertEqual(self.client.get(self.path, {'wait': 'soon'}).status_code, 400)
+
+
+class GameEventsTestCase(TestCase):
+    """
+    Checks that a client following the events of a game gets each of them once and in order
+    """
+
+    def setUp(self):
+        self.game = start_game(create_users(), 0)
+        play_turns(self.game, 8)
+        self.game.refresh_from_db()
+        self.client = APIClient()
+        self.client.force_authenticate(self.game.player_set.first().user)
+        self.path = '/games/' + str(self.game.id) + '/events'
+
+    def get_events(self, since: int) -> dict:
+        response = self.client.get(self.path, {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_events_are_gap_free(self):
+        data = self.get_events(0)
+        self.assertEqual(data['version'], self.game.version)
+        self.assertEqual(data['version'], GameEvent.objects.filter(game=self.game).count())
+        self.assertEqual([event['sequence'] for event in data['events']], list(range(1, self.game.version + 1)))
+
+    def test_events_follow_since(self):
+        since = self.game.version // 2
+        data = self.get_events(since)
+        self.assertEqual(data['version'], self.game.version)
+        self.assertEqual([event['sequence'] for event in data['events']],
+                         list(range(since + 1, self.game.version + 1)))
+        self.assertEqual(self.get_events(self.game.version)['events'], [])
+
+    def test_events_are_fetched_in_pages(self):
+        self.assertGreater(self.game.version, 5)
+        sequences = []
+        with mock.patch('games.views.MAX_EVENTS_PER_FETCH', 5):
+            while True:
+                data = self.get_events(sequences[-1] if sequences else 0)
+                self.assertEqual(data['version'], self.game.version)
+                self.assertLessEqual(len(data['events']), 5)
+                if not data['events']:
+                    break
+                sequences += [event['sequence'] for event in data['events']]
+        self.assertEqual(sequences, list(range(1, self.game.version + 1)))
+
+    def test_since_must_be_a_number(self):
+        self.assertEqual(self.client.get(self.path, {'since': 'start'}).status_code, 400)
+
+
+class LongPollTestCase(SimpleTestCase):
+    """
+    Checks that a request for a game waits for its next version in the event loop, and only when it is asked to
+    """
+
+    GAME_ID = 1
+    USER_ID = 7
+
+    def get_scope(self, etag: str, wait: str = '5') -> dict:
+        return {
+            'type': 'http',
+            'method': 'GET',
+            'path': '/games/' + str(self.GAME_ID),
+            'query_string': ('wait=' + wait).encode(),
+            'headers': [(b'authorization', b'Token key'), (b'if-none-match', etag.encode())],
+        }
+
+    @mock.patch('games.websockets.get_token_user_id', new_callable=mock.AsyncMock, return_value=USER_ID)
+    @mock.patch('games.websockets.get_game_version', new_callable=mock.AsyncMock, side_effect=[3, 4])
+    def test_request_waits_until_the_game_changes(self, get_game_version, get_token_user_id):
+        async def wait_and_publish():
+            asyncio.get_running_loop().call_later(0.05, broadcaster.publish, self.GAME_ID, {})
+            await wait_for_game_change(self.get_scope('"3-7"'))
+
+        started_at = time.monotonic()
+        asyncio.run(wait_and_publish())
+
+        # woken up by the event of the game rather than by the next check of the version
+        self.assertLess(time.monotonic() - started_at, 0.5)
+        self.assertEqual(get_game_version.await_count, 2)
+
+    @mock.patch('games.websockets.get_token_user_id', new_callable=mock.AsyncMock, return_value=USER_ID)
+    @mock.patch('games.websockets.get_game_version', new_callable=mock.AsyncMock, return_value=3)
+    def test_request_does_not_wait_without_etag_wait_or_matching_user(self, get_game_version, get_token_user_id):
+        for scope in (self.get_scope(''), self.get_scope('"3-7"', '0'), self.get_scope('"3-8"')):
+            asyncio.run(wait_for_game_change(scope))
+
+        get_game_version.assert_not_awaited()
+
+
+class WebSocketTestCase(SimpleTestCase):
+    """
+    Checks that the sockets of a game receive its events, from their subscription to their disconnection
+    """
+
+    GAME_ID = 1
+
+    def test_broadcaster_dispatches_to_the_subscribed_queues(self):
+        async def subscribe_and_publish():
+            game_broadcaster = Broadcaster()
+            queue = game_broadcaster.subscribe(self.GAME_ID)
+            other_queue = game_broadcaster.subscribe(self.GAME_ID + 1)
+            game_broadcaster.publish(self.GAME_ID, {"sequence": 1})
+            message = await asyncio.wait_for(queue.get(), 1)
+
+            game_broadcaster.unsubscribe(self.GAME_ID, queue)
+            game_broadcaster.publish(self.GAME_ID, {"sequence": 2})
+            await asyncio.sleep(0)
+            return message, queue.empty(), other_queue.empty(), game_broadcaster._subscribers
+
+        message, is_queue_empty, is_other_queue_empty, subscribers = asyncio.run(subscribe_and_publish())
+        self.assertEqual(message, {"sequence": 1})
+        self.assertTrue(is_queue_empty)
+        self.assertTrue(is_other_queue_empty)
+        self.assertNotIn(self.GAME_ID, subscribers)
+
+    def run_socket(self, messages_to_receive: int, publish=None) -> list[dict]:
+        """
+        Connects a socket to the game, publishes events once it is subscribed, then disconnects it
+
+        :param messages_to_receive: number of messages the socket sends before disconnecting
+        :param publish: callable publishing events once the socket is subscribed
+        :return: messages sent by the application
+        """
+
+        async def connect():
+            received, sent = asyncio.Queue(), asyncio.Queue()
+            await received.put({'type': 'websocket.connect'})
+            scope = {'type': 'websocket', 'path': '/games/{}/ws'.format(self.GAME_ID), 'query_string': b'token=key'}
+            application = asyncio.ensure_future(websocket_application(scope, received.get, sent.put))
+
+            messages = []
+            for _ in range(messages_to_receive):
+                messages.append(await asyncio.wait_for(sent.get(), 1))
+                if len(messages) == 2 and publish is not None:  # accepted then subscribed
+                    self.assertIn(self.GAME_ID, broadcaster._subscribers)
+                    publish()
+            await received.put({'type': 'websocket.disconnect', 'code': 1000})
+            await asyncio.wait_for(application, 1)
+            return messages
+
+        return asyncio.run(connect())
+
+    @mock.patch('games.websockets.get_seat', new_callable=mock.AsyncMock, return_value=(True, 'east', 3))
+    def test_socket_receives_the_events_after_its_subscription(self, get_seat):
+        def publish():
+            # the events up to the version sent on subscription are already known by the client
+            broadcaster.publish(self.GAME_ID, {"type": "draw", "game": self.GAME_ID, "sequence": 3, "data": {}})
+            broadcaster.publish(self.GAME_ID, {"type": "discard", "game": self.GAME_ID, "sequence": 4, "data": {}})
+
+        messages = self.run_socket(3, publish)
+
+        self.assertEqual(messages[0], {'type': 'websocket.accept'})
+        self.assertEqual(json.loads(messages[1]['text']),
+                         {"type": "subscribed", "game": self.GAME_ID, "sequence": 3, "data": {"wind": "east"}})
+        self.assertEqual(json.loads(messages[2]['text'])["sequence"], 4)
+        self.assertNotIn(self.GAME_ID, broadcaster._subscribers)
+
+    @mock.patch('games.websockets.get_seat', new_callable=mock.AsyncMock, return_value=(False, None, None))
+    def test_unauthorized_socket_is_closed(self, get_seat):
+        messages = self.run_socket(1)
+
+        self.assertEqual(messages, [{'type': 'websocket.close', 'code': CLOSE_CODE_UNAUTHORIZED}])
+        self.assertNotIn(self.GAME_ID, broadcaster._subscribers)
+
+
+class TableLoadTestCase(TestCase):
+    """
+    Checks that a table loaded from the models holds the stored state of the hand
+    """
+
+    SEED = 0
+
+    def setUp(self):
+        self.game = start_game(create_users(), self.SEED)
+        self.hand = self.game.current_round.current_hand
+
+    def assertTableMatchesModels(self, table: Table) -> None:
+        self.assertEqual(table.next_wind_to_play, self.hand.next_wind_to_play)
+        self.assertEqual(table.kan_counter, self.hand.kan_counter)
+        self.assertEqual(table.last_discarded_tile, self.hand.last_discarded_tile)
+        self.assertEqual(len(table.wall), self.hand.tilestackholder_set.get(name='wall').tile_stack.length)
+
+        for player in self.game.player_set.all():
+            seat = table.seats[player.wind]
+            hand_tiles = player.current_player_hand.tile_stack.tile_set.order_by('position_in_tile_stack')
+            discard_tiles = player.current_player_discard.tile_stack.tile_set.order_by('position_in_tile_stack')
+            self.assertEqual(seat.hand, list(hand_tiles.values_list('physical_id', flat=True)))
+            self.assertEqual(seat.discard, list(discard_tiles.values_list('physical_id', flat=True)))
+            self.assertEqual(seat.hand_counts, player.current_player_hand.to_vector())
+            self.assertEqual([meld.name for meld in seat.melds],
+                             list(player.current_player_melds.order_by('id').values_list('name', flat=True)))
+            self.assertEqual((seat.can_play, seat.possible_calls, seat.shanten),
+                             (player.can_play, player.possible_calls, player.shanten))
+
+    def test_load_dealt_hand(self):
+        with self.assertNumQueries(3):  # players, tiles and tile stacks, the round of the hand is already loaded
+            table = Table.load(self.hand)
+
+        self.assertTableMatchesModels(table)
+        self.assertEqual(sum(len(seat.hand) for seat in table.seats.values()) + len(table.wall), 14 + 13 * 3 + 69)
+
+    def test_load_again_after_turns(self):
+        play_turns(self.game, 24)
+        self.hand.refresh_from_db()
+        table = Table.load(self.hand)
+        self.assertTrue(any(seat.melds for seat in table.seats.values()))
+        self.assertTableMatchesModels(table)
+
+        play_turns(self.game, 8)
+        self.hand.refresh_from_db()
+        self.assertTableMatchesModels(Table.load(self.hand))
+
+
+class ReplayTestCase(TestCase):
+    """
+    Checks that replaying the action log of a hand from the seed of its game rebuilds the stored hand
+    """
+
+    SEED = 0
+
+    def setUp(self):
+        self.game = start_game(create_users(), self.SEED)
+        self.hand = self.game.current_round.current_hand
+
+    def test_replay_matches_stored_hand(self):
+        for number_of_turns in (1, 24, 8):
+            play_turns(self.game, number_of_turns)
+            self.hand.refresh_from_db()
+            self.assertEqual(rebuild_hand(self.hand).to_dict(), Table.load(self.hand).to_dict())
+
+    def test_replay_leaves_the_game_unchanged(self):
+        play_turns(self.game, 8)
+        self.hand.refresh_from_db()
+        players = list(self.game.player_set.values())
+        game = Game.objects.values().get(id=self.game.id)
+        state = Table.load(self.hand).to_dict()
+
+        rebuild_hand(self.hand)
+
+        self.assertEqual(Hand.objects.filter(round__game=self.game).count(), 1)
+        self.assertEqual(list(self.game.player_set.values()), players)
+        self.assertEqual(Game.objects.values().get(id=self.game.id), game)
+        self.assertEqual(GameEvent.objects.filter(game=self.game).count(), game["version"])
+        self.assertEqual(GameAction.objects.filter(hand=self.hand).count(), self.hand.action_count)
+        self.assertEqual(Table.load(self.hand).to_dict(), state)
+
+    def test_rebuild_from_snapshots_matches_replay(self):
+        play_turns(self.game, 32)
+        self.hand.refresh_from_db()
+        sequences = sorted({1, SNAPSHOT_INTERVAL - 1, SNAPSHOT_INTERVAL, SNAPSHOT_INTERVAL + 1, self.hand.action_count}
+                           | set(range(1, self.hand.action_count + 1, 16)))
+
+        # the first rebuilds replay every action from the deal
+        states = {}
+        for sequence in sequences:
+            HandSnapshot.objects.filter(hand=self.hand).delete()
+            states[sequence] = rebuild_hand(self.hand, sequence).to_dict()
+
+        # the second rebuilds start from the stored snapshots
+        rebuild_hand(self.hand)
+        self.assertTrue(HandSnapshot.objects.filter(hand=self.hand).exists())
+        for sequence, state in states.items():
+            self.assertEqual(rebuild_hand(self.hand, sequence).to_dict(), state, sequence)
+
+
+class TurnCallPolicy(Policy):
+    """
+    Discards the first tile, passes every call phase and makes every call it can on its turn
+    """
+
+    def choose_discard(self, tiles, locked_melds):
+        return tiles[0]
+
+    def choose_turn_call(self, possible_calls):
+        return possible_calls[0]
+
+
+class SimulationTestCase(TestCase):
+    """
+    Checks that the simulated games log the actions they play, so they can be replayed
+    """
+
+    SEED = 64  # west can make a closed kan on the second turn
+
+    @mock.patch.dict('games.simulation.POLICIES', {'turn_call': TurnCallPolicy})
+    def test_simulated_game_replays_with_turn_calls(self):
+        with call_phase_timer_disconnected():
+            durations = simulate_game(create_users(), self.SEED, 'turn_call')
+
+        hand = Hand.objects.latest('id')
+        closed_kans = hand.tilestackholder_set.filter(playermeld__isnull=False, tile_stack__meld__type='closed kan')
+        self.assertGreater(len(durations["turn_call"]), 0)
+        self.assertEqual(GameAction.objects.filter(hand=hand, type='turn_call').count(), closed_kans.count())
+        self.assertEqual(rebuild_hand(hand).to_dict(), Table.load(hand).to_dict())
+
+
+class BenchmarksTestCase(TestCase):
+    """
+    Checks the comparison of the benchmarks to their baselines, and that their runs do not share the caches
+    """
+
+    def test_regressions(self):
+        baseline = {"time": 2.0, "queries": 4}
+        self.assertEqual(get_regressions({"time": 9.0, "queries": 9}, {}), [])
+        self.assertEqual(get_regressions({"time": 2.0, "queries": 4}, baseline), [])
+        self.assertEqual(get_regressions({"time": 2.8, "queries": 3}, baseline, 0.5), [])
+        self.assertEqual(get_regressions({"time": 2.0, "queries": 5}, baseline), ['queries +1'])
+        self.assertEqual(get_regressions({"time": 3.2, "queries": 4}, baseline, 0.5), ['time +60%'])
+        self.assertEqual(get_regressions({"time": 3.2, "queries": 4}, baseline, 0.75), [])
+        self.assertEqual(get_regressions({"time": 4.0, "queries": 6}, baseline), ['queries +2', 'time +100%'])
+
+    def test_baselines_round_trip(self):
+        results = {"set_up": {"time": 24.802, "queries": 41}, "pick_in": {"time": 1.074, "queries": 3}}
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch('games.benchmarks.BASELINES_PATH', os.path.join(directory, 'baselines.json')):
+                self.assertEqual(load_baselines(), {})
+                save_baselines(results)
+                self.assertEqual(load_baselines(), results)
+
+    def test_runs_start_from_cleared_caches(self):
+        cache_sizes = []
+
+        def benchmark_shanten(timer):
+            cache_sizes.append(get_suit_decomposition.cache_info().currsize)
+            with timer.measure():
+                get_shanten(get_hand_vector(dots='123456789', bamboos='1123', honors='1'))
+
+        with mock.patch.dict('games.benchmarks.BENCHMARKS', {'shanten': benchmark_shanten}):
+            result = run_benchmark('shanten')
+        self.assertEqual(cache_sizes, [0] * ROUNDS)
+        self.assertEqual(result["queries"], 0)
+
+
+class TenpaiTestCase(SimpleTestCase):
+    """
+    Checks the tenpai engine on known hands and against a brute force search of the winning tiles
+    """
+
+    def test_known_hands(self):
+        # single wait on east
+        self.assertTrue(is_hand_in_tenpai(get_hand_vector(dots='123456789', bamboos='111', honors='1')))
+        # 7 pairs waiting on red
+        self.assertTrue(is_hand_in_tenpai(get_hand_vector(dots='1155', bamboos='2299', characters='4477', honors='6')))
+        # 13 orphans waiting on any of them
+        self.assertTrue(is_hand_in_tenpai(get_hand_vector(dots='19', bamboos='19', characters='19', honors='1234567')))
+        # one called meld, waiting on 2 or 5 dots
+        self.assertTrue(is_hand_in_tenpai(get_hand_vector(dots='34', bamboos='123', characters='999', honors='55'), 1))
+        # every tile is isolated
+        self.assertFalse(is_hand_in_tenpai(get_hand_vector(dots='147', bamboos='258', characters='369',
+                                                           honors='1234')))
+        # the only wait is 1 dot, and the player already holds the 4 of them
+        hand_vector = get_hand_vector(dots='1111', bamboos='123456789')
+        self.assertEqual(get_shanten(hand_vector), 0)
+        self.assertFalse(is_hand_in_tenpai(hand_vector))
+        self.assertFalse(are_hands_in_tenpai(np.array([hand_vector]))[0])
+        # 6 pairs and a kind held 4 times are not 7 pairs
+        self.assertFalse(is_hand_in_tenpai(get_hand_vector(dots='1111', bamboos='2299', characters='4477', honors='6')))
+
+    def test_tenpai_matches_brute_force(self):
+        game_random = random.Random(0)
+        for _ in range(2000):
+            locked_melds = game_random.choice((0, 0, 1, 2))
+            hand_vector = draw_hand_vector(game_random, locked_melds)
+            self.assertEqual(is_hand_in_tenpai(hand_vector, locked_melds),
+                             bool(get_waits_brute_force(hand_vector, locked_melds)), hand_vector)
+
+
+class ShantenTestCase(TestCase):
+    """
+    Checks the shanten numbers of known hands, and that one tile exchange lowers them by exactly one at best
+    until tenpai, a hand of 13 tiles minus 3 tiles per locked meld being complete only once a tile is drawn
+    """
+
+    def test_known_hands(self):
+        self.assertEqual(get_shanten(get_hand_vector(dots='123456789', bamboos='111', honors='11')), -1)
+        self.assertEqual(get_shanten(get_hand_vector(dots='123456789', bamboos='111', honors='1')), 0)
+        self.assertEqual(get_shanten(get_hand_vector(dots='123456789', bamboos='113', honors='1')), 1)
+        # 7 pairs is closer than any standard hand
+        self.assertEqual(get_shanten(get_hand_vector(dots='1155', bamboos='2299', characters='4478')), 1)
+        # 13 orphans missing white, with a pair of east
+        self.assertEqual(get_shanten(get_hand_vector(dots='19', bamboos='19', characters='19', honors='1123456')), 0)
+        self.assertEqual(get_shanten(get_hand_vector(dots='147', bamboos='258', characters='369', honors='1234')), 6)
+        # 7 pairs needs a closed hand
+        self.assertEqual(get_shanten(get_hand_vector(dots='1155', bamboos='2299', characters='4477', honors='6')), 0)
+        self.assertEqual(get_shanten(get_hand_vector(dots='1155', bamboos='2299', characters='44'), 1), 2)
+
+    def test_best_exchange_lowers_shanten_by_one(self):
+        game_random = random.Random(0)
+        for _ in range(100):
+            locked_melds = game_random.choice((0, 1))
+            hand_vector = draw_hand_vector(game_random, locked_melds)
+            shanten = get_shanten(hand_vector, locked_melds)
+            if shanten <= 0:
+                continue
+
+            exchanged_shantens = set()
+            for discarded_kind in range(34):
+                if not hand_vector[discarded_kind]:
+                    continue
+                hand_vector[discarded_kind] -= 1
+                for drawn_kind in range(34):
+                    if drawn_kind != discarded_kind and hand_vector[drawn_kind] < 4:
+                        hand_vector[drawn_kind] += 1
+                        exchanged_shantens.add(get_shanten(hand_vector, locked_melds))
+                        hand_vector[drawn_kind] -= 1
+                hand_vector[discarded_kind] += 1
+
+            self.assertEqual(min(exchanged_shantens), shanten - 1, hand_vector)
+
+    def test_players_shanten_is_stored(self):
+        game = start_game(create_users(), 0)
+        play_turns(game, 8)
+        hand = game.current_round.current_hand
+        for player in game.player_set.all():
+            self.assertEqual(player.shanten, hand.get_player_shanten(player))
+
+
+class WaitsTestCase(SimpleTestCase):
+    """
+    Checks the waits of tenpai hands against a brute force search and the live counts of their ukeire
+    """
+
+    def test_known_waits(self):
+        # 2345678 dots waits on 2, 5 and 8 dots
+        hand_vector = get_hand_vector(dots='2345678', bamboos='123', characters='999')
+        self.assertEqual(get_useful_tiles(hand_vector), [1, 4, 7])
+        # shanpon on 9 characters and green
+        self.assertEqual(get_useful_tiles(get_hand_vector(dots='345', characters='99', honors='55666'), 1), [26, 31])
+        self.assertEqual(get_useful_tiles(get_hand_vector(dots='19', bamboos='19', characters='19', honors='1234567')),
+                         list(ORPHAN_INDEXES))
+
+    def test_ukeire_counts_visible_tiles(self):
+        hand_vector = get_hand_vector(dots='2345678', bamboos='123', characters='999')
+        visible_vector = list(hand_vector)
+        visible_vector[4] += 2  # two 5 dots discarded
+        self.assertEqual(get_ukeire(hand_vector, visible_vector), [(1, 3), (4, 1), (7, 3)])
+
+        # the single wait on 1 dot cannot be drawn when the player holds the 4 of them, only 4 dots is left
+        hand_vector = get_hand_vector(dots='1111234', bamboos='567', characters='789')
+        self.assertEqual(get_ukeire(hand_vector, hand_vector), [(3, 3)])
+
+    def test_waits_match_brute_force(self):
+        game_random = random.Random(1)
+        for _ in range(2000):
+            locked_melds = game_random.choice((0, 0, 1, 2))
+            hand_vector = draw_hand_vector(game_random, locked_melds)
+            if is_hand_in_tenpai(hand_vector, locked_melds):
+                self.assertEqual(get_useful_tiles(hand_vector, locked_melds),
+                                 get_waits_brute_force(hand_vector, locked_melds), hand_vector)
+
+
+class PlayerWaitsTestCase(TestCase):
+    """
+    Checks that the waits of a player are only given while his hand is waiting, not on his turn
+    """
+
+    def setUp(self):
+        self.game = start_game(create_users(), 0)
+        self.hand = self.game.current_round.current_hand
+        self.dealer = self.game.player_set.get(is_dealer=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.dealer.user)
+
+        # 123456789 dots, 111 bamboos and east, waiting on east, plus the drawn 9 characters
+        set_hand_kinds(self.dealer, [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 9, 9, 27, 26])
+
+    def get_waits(self) -> tuple[list[dict], list[dict]]:
+        # waits given by the hand and by PlayerSerializer
+        response = self.client.get('/games/' + str(self.game.id))
+        return self.hand.get_player_waits(self.dealer), response.data['player']['waits']
+
+    def test_no_waits_on_the_turn_of_the_player(self):
+        self.assertEqual(self.hand.get_player_shanten(self.dealer), 0)
+        self.assertEqual(self.get_waits(), ([], []))
+
+        discard_tile(self.hand, self.dealer, self.dealer.current_player_hand.tile_stack.tile_set.get(kind=26))
+        waits, serialized_waits = self.get_waits()
+        self.assertEqual([(wait["suit"], wait["name"]) for wait in waits], [VALID_TILES[27]])
+        self.assertEqual(serialized_waits, waits)
+
+
+class DiscardAdviceTestCase(TestCase):
+    """
+    Checks the discards advised to a player on a known hand
+    """
+
+    def setUp(self):
+        self.game = start_game(create_users(), 0)
+        self.hand = self.game.current_round.current_hand
+        self.dealer = self.game.player_set.get(is_dealer=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.dealer.user)
+
+        # 123456789 dots, 11 bamboos, 23 bamboos and the drawn east
+        set_hand_kinds(self.dealer, [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 9, 10, 11, 27])
+
+    def test_discard_advice_of_a_known_hand(self):
+        response = self.client.get('/games/' + str(self.game.id) + '/advice')
+        self.assertEqual(response.status_code, 200)
+        advice = response.json()['advice']
+        dora_indicator_kinds = self.hand.get_dora_indicator_kinds()
+
+        # every kind of the hand is evaluated once
+        self.assertCountEqual([(discard["suit"], discard["name"]) for discard in advice],
+                              [VALID_TILES[kind] for kind in (0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 27)])
+
+        # discarding east leaves the hand waiting on 1 bamboo, of which it holds 2, and 4 bamboo
+        useful_tiles = [{"suit": VALID_TILES[kind][0], "name": VALID_TILES[kind][1],
+                         "live": 4 - held - dora_indicator_kinds.count(kind)} for kind, held in ((9, 2), (12, 0))]
+        self.assertEqual(advice[0], {
+            "suit": "wind",
+            "name": "east",
+            "shanten": 0,
+            "ukeire": sum(useful_tile["live"] for useful_tile in useful_tiles),
+            "useful_tiles": useful_tiles,
+        })
+
+        # discarding a 1 bamboo leaves 123 bamboos and a single east, waiting on the 3 other easts
+        useful_tiles = [{"suit": "wind", "name": "east", "live": 3 - dora_indicator_kinds.count(27)}]
+        self.assertEqual(advice[1], {
+            "suit": "bamboo",
+            "name": "1",
+            "shanten": 0,
+            "ukeire": useful_tiles[0]["live"],
+            "useful_tiles": useful_tiles,
+        })
+
+        # any other discard breaks a complete shape
+        self.assertTrue(all(discard["shanten"] == 1 for discard in advice[2:]))
+        for discard in advice:
+            self.assertEqual(discard["ukeire"], sum(useful_tile["live"] for useful_tile in discard["useful_tiles"]))
+        ukeires = [discard["ukeire"] for discard in advice[2:]]
+        self.assertEqual(ukeires, sorted(ukeires, reverse=True))
+
+    def test_advice_is_only_given_on_the_turn_of_the_player(self):
+        client = APIClient()
+        client.force_authenticate(self.game.player_set.get(is_dealer=False, wind='south').user)
+        self.assertEqual(client.get('/games/' + str(self.game.id) + '/advice').status_code, 401)
+
+
+class BatchTenpaiTestCase(SimpleTestCase):
+    """
+    Checks that the batched shanten and tenpai evaluations agree with the scalar ones
+    """
+
+    def test_batch_matches_scalar(self):
+        game_random = random.Random(2)
+        locked_melds = np.array([game_random.choice((0, 0, 1, 2, 3)) for _ in range(1000)])
+        hand_matrix = np.array([draw_hand_vector(game_random, int(melds)) for melds in locked_melds])
+
+        shanten = get_shanten_batch(hand_matrix, locked_melds)
+        self.assertEqual(shanten.tolist(), [get_shanten(hand_vector, int(melds))
+                                            for hand_vector, melds in zip(hand_matrix, locked_melds)])
+        self.assertEqual(are_hands_in_tenpai(hand_matrix, locked_melds).tolist(),
+                         [is_hand_in_tenpai(hand_vector, int(melds))
+                          for hand_vector, melds in zip(hand_matrix, locked_melds)])
+
+    def test_batch_with_same_locked_melds(self):
+        game_random = random.Random(3)
+        hand_matrix = np.array([draw_hand_vector(game_random, 0) for _ in range(200)])
+        self.assertEqual(get_shanten_batch(hand_matrix).tolist(),
+                         [get_shanten(hand_vector) for hand_vector in hand_matrix])
+
+
+class CallsTestCase(SimpleTestCase):
+    """
+    Checks the calls enumerated from the count vector of a hand
+    """
+
+    def test_call_phase_calls(self):
+        hand_signature = tuple(get_hand_vector(dots='1245333', bamboos='99', honors='1155'))
+        self.assertEqual(get_call_phase_calls(hand_signature, 0, (), 2, True), (
+            ('opened kan', (2, 2, 2, 2)),
+            ('pon', (2, 2, 2)),
+            ('chi', (0, 1, 2)),
+            ('chi', (1, 2, 3)),
+            ('chi', (2, 3, 4)),
+        ))
+        # only the next player to play can chi
+        self.assertEqual(get_call_phase_calls(hand_signature, 0, (), 2, False),
+                         (('opened kan', (2, 2, 2, 2)), ('pon', (2, 2, 2))))
+        self.assertEqual(get_call_phase_calls(hand_signature, 1, (27,), 27, True),
+                         (('late kan', (27, 27, 27, 27)), ('pon', (27, 27, 27))))
+
+    def test_no_chi_across_suits_or_on_honors(self):
+        # 8 and 9 dots followed by 1 and 2 bamboos
+        hand_signature = tuple(get_hand_vector(dots='89', bamboos='12', honors='1235567'))
+        self.assertEqual(get_call_phase_calls(hand_signature, 0, (), 9, True), ())
+        self.assertEqual(get_call_phase_calls(hand_signature, 0, (), 7, True), ())
+        self.assertEqual(get_call_phase_calls(hand_signature, 0, (), 30, True), ())
+        self.assertEqual(get_call_phase_calls(hand_signature, 0, (), 31, True), (('pon', (31, 31, 31)),))
+
+    def test_ron_is_not_offered(self):
+        # waiting on east, with a single east in hand
+        hand_signature = tuple(get_hand_vector(dots='123456789', bamboos='111', honors='1'))
+        self.assertEqual(get_call_phase_calls(hand_signature, 0, (), 27, True), ())
+
+    def test_turn_phase_calls(self):
+        hand_signature = tuple(get_hand_vector(dots='1111', bamboos='999', honors='55556'))
+        self.assertEqual(get_turn_phase_calls(hand_signature), (
+            ('closed kan', (0, 0, 0, 0)),
+            ('closed kan', (31, 31, 31, 31)),
+        ))
+        self.assertEqual(format_call('closed kan', (31, 31, 31, 31)),
+                         {"type": "closed kan", "suit": "dragon", "name": "green-green-green-green"})
+        self.assertEqual(format_call('chi', (2, 3, 4)), {"type": "chi", "suit": "dot", "name": "3-4-5"})
+
+    def test_interested_winds(self):
+        call_interests = {
+            'east': get_call_interests(tuple(get_hand_vector(dots='24', bamboos='55')), 0, ()),
+            'south': get_call_interests(tuple(get_hand_vector(dots='33', bamboos='9')), 0, ()),
+            'west': get_call_interests(tuple(get_hand_vector(bamboos='99')), 0, ()),
+        }
+        self.assertEqual(call_interests['east']['2'], ['chi'])
+        self.assertNotIn('2', call_interests['west'])
+
+        # the discarder cannot call, and only the next player can chi
+        self.assertEqual(get_interested_winds(call_interests, 2, 'west', 'north'), ['south'])
+        self.assertEqual(get_interested_winds(call_interests, 2, 'north', 'east'), ['east', 'south'])
+        self.assertEqual(get_interested_winds(call_interests, 17, 'north', 'east'), ['west'])
+        self.assertEqual(get_interested_winds(call_interests, 17, 'west', 'east'), [])
+
+
+class CounterRandomTestCase(SimpleTestCase):
+    """
+    Checks that the random numbers of a game only depend on its seed and on the cursor
+    """
+
+    SEED = '252069731582286493658813394925573626419'
+
+    def test_same_seed_draws_same_numbers(self):
+        first, second = CounterRandom(self.SEED), CounterRandom(self.SEED)
+        self.assertEqual([first.next_uint64() for _ in range(100)], [second.next_uint64() for _ in range(100)])
+        self.assertNotEqual(CounterRandom('1').next_uint64(), CounterRandom('2').next_uint64())
+
+    def test_cursor_resumes_the_draws(self):
+        game_random = CounterRandom(self.SEED)
+        numbers = [game_random.next_uint64() for _ in range(20)]
+        resumed_random = CounterRandom(self.SEED, 12)
+        self.assertEqual([resumed_random.next_uint64() for _ in range(8)], numbers[12:])
+        self.assertEqual(resumed_random.cursor, game_random.cursor)
+
+    def test_shuffle(self):
+        items, same_items = list(range(136)), list(range(136))
+        CounterRandom(self.SEED).shuffle(items)
+        CounterRandom(self.SEED).shuffle(same_items)
+        self.assertEqual(items, same_items)
+        self.assertEqual(sorted(items), list(range(136)))
+        self.assertNotEqual(items, list(range(136)))
+
+        game_random = CounterRandom(self.SEED)
+        self.assertEqual({game_random.randbelow(6) for _ in range(600)}, set(range(6)))
+
+
+class GameRandomTestCase(TestCase):
+    """
+    Checks that the games draw their random events from their seed, and that the games stored with a python
+    random state are still played and replayed as before
+    """
+
+    SEED = 42
+
+    def test_game_draws_from_its_cursor(self):
+        state = random.getstate()
+        game = start_game(create_users(), self.SEED)
+        self.assertEqual(random.getstate(), state)
+        self.assertEqual(game.random_state, {})
+
+        # the hand was shuffled right after the winds
+        hand_random = game.get_hand_random(0)
+        Hand.shuffle_tiles(hand_random)
+        self.assertEqual(hand_random.cursor, game.random_cursor)
+        self.assertGreater(game.random_cursor, 0)
+
+        hand = game.current_round.current_hand
+        play_turns(game, 8)
+        hand.refresh_from_db()
+        self.assertEqual(rebuild_hand(hand).to_dict(), Table.load(hand).to_dict())
+
+    def test_game_with_random_state_plays_as_before(self):
+        random_state = json.loads(json.dumps(random.Random(self.SEED).getstate()))
+        game = start_game(create_users(), self.SEED, random_state)
+
+        # same random events as before : the winds then the tiles, from the global random module
+        expected_random = random.Random(self.SEED)
+        winds = [wind for wind, name in WIND_NAMES]
+        expected_random.shuffle(winds)
+        for player in game.player_set.all():
+            self.assertEqual(player.wind, winds.pop())
+        Hand.shuffle_tiles(expected_random)
+
+        game.refresh_from_db()
+        self.assertEqual(game.random_state, json.loads(json.dumps(expected_random.getstate())))
+        self.assertEqual(game.random_cursor, 0)
+
+        hand = game.current_round.current_hand
+        play_turns(game, 8)
+        hand.refresh_from_db()
+        self.assertEqual(rebuild_hand(hand).to_dict(), Table.load(hand).to_dict())
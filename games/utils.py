@@ -6,15 +6,31 @@ TILES_PER_GAME = 136
 
 UNIQUE_TILES = 34
 
+TILES_PER_HAND = 13  # tiles of a hand waiting for its last tile, minus 3 per called meld
+
 DEFAULT_SCORE = 25000
 
 USING_AKADORA = False
 
+USING_COMPACT_WALL = True  # stores the wall, dead wall and dora indicators as packed tile ids instead of Tile rows
+
 MAX_PLAYERS_PER_GAME = 4
 
+CALL_PHASE_DURATION = 10  # seconds given to the players to send their calls after a discard
+
+MAX_EVENTS_PER_FETCH = 500  # a hand is around 300 events
+
+MAX_LONG_POLL_WAIT = 30  # seconds a request for the game can wait for a change
+
+LONG_POLL_CHECK_INTERVAL = 1  # seconds between two checks of the game version, for changes made by other processes
+
+ACTION_ATTEMPTS = 3  # times an action is tried when the hand changes while it is played, before answering 409
+
+SNAPSHOT_INTERVAL = 32  # actions replayed between two snapshots of a rebuilt hand
+
 CALL_NAMES = (
     ('', ''), ('opened kan', 'opened kan'), ('late kan', 'late kan'), ('closed kan', 'closed kan'),
-    ('pon', 'pon'), ('chi', 'chi'), ('riichi', 'riichi'), ('ron', 'ron'), ('tsumo', 'tsumo')
+    ('pon', 'pon'), ('chi', 'chi'), ('riichi', 'riichi'), ('ron', 'ron'), ('tsumo', 'tsumo'), ('pass', 'pass')
 )
-CALL_PHASE_CALLS = ('chi', 'opened kan', 'late kan', 'pon', 'ron')
+CALL_PHASE_CALLS = ('chi', 'opened kan', 'late kan', 'pon', 'ron', 'pass')
 IN_TURN_CALLS = ('closed kan', 'tsumo', 'riichi')
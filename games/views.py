@@ -1,11 +1,27 @@
+from abc import ABC, abstractmethod
 from rest_framework import generics, status
-from games.models import Game, Player
-from games.serializers import GameSerializer, PlayerSerializer, GameLightSerializer, PlayerLightSerializer
+from django.db import transaction
+from games.models import Game, Player, Hand, ActionConflict
+from games.serializers import GameSerializer, PlayerSerializer, GameLightSerializer, PlayerLightSerializer, \
+    GameEventSerializer, PreloadedHand
 from games.utils import *
 from django.core.exceptions import ObjectDoesNotExist
 from tiles.utils import get_previous_wind
 from rest_framework.response import Response
 from django.contrib.auth.models import User
+from riichiBackend.middleware import measure_serialization
+
+
+def get_game_etag(version: int, user_id: int) -> str:
+    """
+    Gets the ETag of the game seen by a user, which depends on his seat and on the version of the game
+
+    :param version: version of the game
+    :param user_id: id of the user requesting the game
+    :return: quoted ETag, example : '"42-7"'
+    """
+
+    return '"' + str(version) + '-' + str(user_id) + '"'
 
 
 class CreateGame(generics.CreateAPIView):
@@ -14,16 +30,18 @@ class CreateGame(generics.CreateAPIView):
         user = User.objects.get(id=request.user.id)
         game = Game.create(user, user.username)
 
-        serialized_player = PlayerLightSerializer(game.player_set.get(user=user)).data
-        serialized_game = GameLightSerializer(game).data
+        with measure_serialization(request):
+            serialized_player = PlayerLightSerializer(game.player_set.get(user=user)).data
+            serialized_game = GameLightSerializer(game).data
         return Response({'player': serialized_player, 'game': serialized_game}, status.HTTP_200_OK)
 
 
 class AddUserToGame(generics.CreateAPIView):
 
+    @transaction.atomic  # the game row is locked, so two users cannot both join the last seat and start the game
     def post(self, request, *args, **kwargs):
         user = User.objects.get(id=request.user.id)
-        game = Game.objects.get(id=kwargs['game_id'])
+        game = Game.objects.select_for_update().get(id=kwargs['game_id'])
 
         if game.is_full:
             return Response('game is already full', status.HTTP_401_UNAUTHORIZED)
@@ -41,8 +59,9 @@ class AddUserToGame(generics.CreateAPIView):
             game.fill_up()
             game.start()
 
-        serialized_player = PlayerLightSerializer(game.player_set.get(user=user)).data
-        serialized_game = GameLightSerializer(game).data
+        with measure_serialization(request):
+            serialized_player = PlayerLightSerializer(game.player_set.get(user=user)).data
+            serialized_game = GameLightSerializer(game).data
         return Response({'player': serialized_player, 'game': serialized_game}, status.HTTP_200_OK)
 
 
@@ -51,31 +70,117 @@ class ViewGame(generics.RetrieveAPIView):
     def get(self, request, *args, **kwargs):
         game = Game.objects.get(id=kwargs['game_id'])
 
+        # a client which already has the game can wait for its next version, the request is held before reaching
+        # the view by games.websockets.wait_for_game_change, so no request thread is held while it waits
+        try:
+            float(request.query_params.get('wait', 0))
+        except ValueError:
+            return Response('wait must be a number of seconds', status.HTTP_400_BAD_REQUEST)
+
+        # the game seen by a user only changes with the version of the game
+        if request.headers.get('If-None-Match') == get_game_etag(game.version, request.user.id):
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers={'ETag': get_game_etag(game.version, request.user.id)})
+
+        with measure_serialization(request):
+            response = self.get_game_response(request, game)
+        response['ETag'] = get_game_etag(game.version, request.user.id)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @staticmethod
+    def get_game_response(request, game: Game) -> Response:
+        if game.is_full:
+            # the whole hand is loaded at once and the serializers read it instead of querying
+            hand_state = PreloadedHand(game)
+            context = {'hand_state': hand_state}
+            serialized_game = GameSerializer(game, context=context).data
+            for player in hand_state.players:
+                if player.user_id == request.user.id:
+                    serialized_player = PlayerSerializer(player, context=context).data
+                    return Response({'player': serialized_player, 'game': serialized_game}, status.HTTP_200_OK)
+            return Response({'game': serialized_game}, status.HTTP_200_OK)
+
         try:
             player = Player.objects.get(game=game, user_id=request.user.id)
         except ObjectDoesNotExist:
-            if game.is_full:
-                serialized_game = GameSerializer(game).data
-            else:
-                serialized_game = GameLightSerializer(game).data
+            serialized_game = GameLightSerializer(game).data
             return Response({'game': serialized_game}, status.HTTP_200_OK)
 
-        if game.is_full:
-            serialized_player = PlayerSerializer(player).data
-            serialized_game = GameSerializer(game).data
-        else:
-            serialized_player = PlayerLightSerializer(player).data
-            serialized_game = GameLightSerializer(game).data
+        serialized_player = PlayerLightSerializer(player).data
+        serialized_game = GameLightSerializer(game).data
 
         return Response({'player': serialized_player, 'game': serialized_game}, status.HTTP_200_OK)
 
 
-class DiscardTile(generics.CreateAPIView):
+class ViewGameEvents(generics.RetrieveAPIView):
 
-    def post(self, request, *args, **kwargs):
+    def get(self, request, *args, **kwargs):
+        try:
+            game = Game.objects.get(id=kwargs['game_id'])
+        except ObjectDoesNotExist:
+            return Response('this game does not exist', status.HTTP_404_NOT_FOUND)
+
+        try:
+            since = int(request.query_params.get('since', 0))
+        except ValueError:
+            return Response('since must be an event sequence number', status.HTTP_400_BAD_REQUEST)
+
+        # a client gets the events following the last one it knows, and asks again if there are more
+        events = game.gameevent_set.filter(sequence__gt=since)[:MAX_EVENTS_PER_FETCH]
+        with measure_serialization(request):
+            serialized_events = GameEventSerializer(events, many=True).data
+
+        return Response({'version': game.version, 'events': serialized_events}, status.HTTP_200_OK)
+
+
+class ViewDiscardAdvice(generics.RetrieveAPIView):
+
+    def get(self, request, *args, **kwargs):
         game = Game.objects.get(id=kwargs['game_id'])
         current_hand = game.current_round.current_hand
 
+        try:
+            player = Player.objects.get(game=game, user_id=request.user.id, can_play=True)
+        except ObjectDoesNotExist:
+            return Response('this is not your turn', status.HTTP_401_UNAUTHORIZED)
+
+        return Response({'advice': current_hand.get_player_discard_advice(player)}, status.HTTP_200_OK)
+
+
+class GameActionView(generics.CreateAPIView, ABC):
+    """
+    Base of the views playing an action of a player on the current hand of a game.
+    Each attempt checks and plays the action in a transaction, and claims the version of the hand before changing it,
+    so an action checked on a hand changed in the meantime by a concurrent action is checked again on the new hand.
+    """
+
+    def post(self, request, *args, **kwargs):
+        for _ in range(ACTION_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    game = Game.objects.get(id=kwargs['game_id'])
+                    return self.play(request, game, game.current_round.current_hand, *args, **kwargs)
+            except ActionConflict:
+                continue
+
+        return Response('the game changed during your action, send it again', status.HTTP_409_CONFLICT)
+
+    @abstractmethod
+    def play(self, request, game: Game, current_hand: Hand, *args, **kwargs) -> Response:
+        """
+        Checks and plays the action, claiming the current hand before changing it
+
+        :param request: request of the action
+        :param game: instance of Game of the action
+        :param current_hand: current instance of Hand of the game
+        :return: Response to the action
+        """
+
+
+class DiscardTile(GameActionView):
+
+    def play(self, request, game: Game, current_hand: Hand, *args, **kwargs) -> Response:
         try:
             player = Player.objects.get(game=game, user_id=request.user.id, can_play=True)
         except ObjectDoesNotExist:
@@ -87,19 +192,18 @@ class DiscardTile(generics.CreateAPIView):
         except ObjectDoesNotExist:
             return Response('you do not have this tile in your hand', status.HTTP_401_UNAUTHORIZED)
 
+        current_hand.claim()
         current_hand.player_discard(player, tile)
         current_hand.start_call_phase()
 
         return Response('ok', status.HTTP_200_OK)
 
 
-class CallInCallPhase(generics.CreateAPIView):
+class CallInCallPhase(GameActionView):
 
-    def post(self, request, *args, **kwargs):
+    def play(self, request, game: Game, current_hand: Hand, *args, **kwargs) -> Response:
 
         call = request.data['call']
-        game = Game.objects.get(id=kwargs['game_id'])
-        current_hand = game.current_round.current_hand
 
         try:
             player = Player.objects.get(game=game, user_id=request.user.id)
@@ -117,18 +221,18 @@ class CallInCallPhase(generics.CreateAPIView):
         if call not in player.possible_calls:
             return Response('this is not a possible call', status.HTTP_401_UNAUTHORIZED)
 
-        player.send_call(call)
+        current_hand.claim()
+        player.send_call(call, current_hand)
+        current_hand.end_call_phase_if_all_players_responded()
 
         return Response('ok', status.HTTP_200_OK)
 
 
-class CallInTurnPhase(generics.CreateAPIView):
+class CallInTurnPhase(GameActionView):
 
-    def post(self, request, *args, **kwargs):
+    def play(self, request, game: Game, current_hand: Hand, *args, **kwargs) -> Response:
 
         call = request.data['call']
-        game = Game.objects.get(id=kwargs['game_id'])
-        current_hand = game.current_round.current_hand
 
         try:
             player = Player.objects.get(game=game, user_id=request.user.id, can_play=True)
@@ -138,7 +242,8 @@ class CallInTurnPhase(generics.CreateAPIView):
         if call not in player.possible_calls:
             return Response('this is not a possible call', status.HTTP_401_UNAUTHORIZED)
 
-        player.send_call(call)
+        current_hand.claim()
+        player.send_call(call, current_hand)
         current_hand.player_call(player)
 
         return Response('ok', status.HTTP_200_OK)
@@ -0,0 +1,233 @@
+"""
+WebSocket push of game state changes.
+
+Clients connect to /games/<game_id>/ws?token=<auth token>, as seated players or as spectators,
+and receive every change of the game as a small JSON message instead of polling ViewGame.
+The messages are the events of games.models.GameEvent, published once the transaction which made them is committed.
+The same events wake up the conditional requests for a game waiting for its next version, which are held here
+in the event loop, before ViewGame answers them, instead of in a request thread.
+
+The broadcaster lives in the process, so the sockets of a game must be served by the process which plays it,
+as the call phase scheduler of games.scheduler already requires.
+"""
+import asyncio
+import json
+import re
+import threading
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from games.utils import MAX_LONG_POLL_WAIT, LONG_POLL_CHECK_INTERVAL
+
+GAME_SOCKET_PATH = re.compile(r'^/games/(?P<game_id>\d+)/ws/?$')
+GAME_PATH = re.compile(r'^/games/(?P<game_id>\d+)/?$')
+GAME_ETAG = re.compile(r'^"(?P<version>\d+)-(?P<user_id>\d+)"$')  # see games.views.get_game_etag
+CLOSE_CODE_NOT_FOUND = 4004
+CLOSE_CODE_UNAUTHORIZED = 4001
+
+
+class Broadcaster:
+    """
+    Dispatches the messages of each game to the queues of its connected sockets, and wakes up the requests
+    waiting for a change of the game.
+    Messages can be published from any thread, each queue is filled in the event loop of its socket.
+    """
+
+    def __init__(self):
+        self._subscribers = {}  # game id -> {queue: event loop of the socket}
+        self._waiters = {}  # game id -> {asyncio event of a waiting request: event loop of the request}
+        self._lock = threading.Lock()
+
+    def subscribe(self, game_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(game_id, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, game_id: int, queue: asyncio.Queue) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(game_id, {})
+            subscribers.pop(queue, None)
+            if not subscribers:
+                self._subscribers.pop(game_id, None)
+
+    def publish(self, game_id: int, message: dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(game_id, {}).items())
+            waiters = list(self._waiters.get(game_id, {}).items())
+        for queue, loop in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+        for waiter, loop in waiters:
+            loop.call_soon_threadsafe(waiter.set)
+
+    async def wait(self, game_id: int, timeout: float) -> bool:
+        """
+        Waits until a message of the game is published in this process or the timeout expires
+
+        :param game_id: id of the game to wait for
+        :param timeout: maximum number of seconds to wait
+        :return: True if a message was published, False if the timeout expired
+        """
+
+        waiter = asyncio.Event()
+        with self._lock:
+            self._waiters.setdefault(game_id, {})[waiter] = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(waiter.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(game_id, {})
+                waiters.pop(waiter, None)
+                if not waiters:
+                    self._waiters.pop(game_id, None)
+
+
+broadcaster = Broadcaster()
+
+
+def push_game_event(game_id: int, sequence: int, event_type: str, data: dict) -> None:
+    """
+    Pushes a change of a game to its connected sockets once the current transaction is committed.
+    Clients missing a sequence number can catch up with the events endpoint of the game.
+
+    :param game_id: id of the changed game
+    :param sequence: sequence number of the event, see GameEvent
+    :param event_type: type of change, example : 'discard'
+    :param data: public information about the change, it must be JSON serializable
+    :return: None
+    """
+
+    message = {"type": event_type, "game": game_id, "sequence": sequence, "data": data}
+    transaction.on_commit(lambda: broadcaster.publish(game_id, message))
+
+
+@sync_to_async
+def get_seat(game_id: int, query_string: bytes):
+    """
+    Authenticates the socket with the token of its query string and finds the seat of the user in the game
+
+    :param game_id: id of the game the socket is connected to
+    :param query_string: raw query string of the socket
+    :return: tuple (True if the user is authenticated and the game exists, wind of the user or None for spectators,
+    version of the game)
+    """
+
+    from rest_framework.authtoken.models import Token
+    from games.models import Game, Player
+
+    token = parse_qs(query_string.decode()).get('token', [''])[0]
+    user_id = Token.objects.filter(key=token).values_list('user_id', flat=True).first()
+    version = Game.objects.filter(id=game_id).values_list('version', flat=True).first()
+    if user_id is None or version is None:
+        return False, None, None
+
+    wind = Player.objects.filter(game_id=game_id, user_id=user_id).values_list('wind', flat=True).first()
+    return True, wind, version
+
+
+@sync_to_async
+def get_token_user_id(token: str):
+    from rest_framework.authtoken.models import Token
+
+    return Token.objects.filter(key=token).values_list('user_id', flat=True).first()
+
+
+@sync_to_async
+def get_game_version(game_id: int):
+    from games.models import Game
+
+    return Game.objects.filter(id=game_id).values_list('version', flat=True).first()
+
+
+async def wait_for_game_change(scope) -> None:
+    """
+    Holds a request for a game sent with the ETag of its current version and a wait parameter, until the game
+    changes or the wait expires, then returns so ViewGame answers it with the new game or a 304.
+    The version is re-read every LONG_POLL_CHECK_INTERVAL to see the changes made by other processes.
+    Every other request returns immediately, as do the requests not authenticated by the token of the ETag user.
+
+    :param scope: ASGI connection scope of an HTTP request
+    :return: None
+    """
+
+    match = GAME_PATH.match(scope['path'])
+    if scope['method'] != 'GET' or match is None:
+        return
+
+    headers = dict(scope['headers'])
+    etag = GAME_ETAG.match(headers.get(b'if-none-match', b'').decode('latin-1'))
+    try:
+        wait = min(float(parse_qs(scope['query_string'].decode()).get('wait', ['0'])[0]), MAX_LONG_POLL_WAIT)
+    except ValueError:  # ViewGame refuses it
+        return
+    if etag is None or wait <= 0:
+        return
+
+    authorization = headers.get(b'authorization', b'').decode('latin-1').split()
+    if len(authorization) != 2 or authorization[0] != 'Token':
+        return
+    if await get_token_user_id(authorization[1]) != int(etag.group('user_id')):
+        return
+
+    game_id = int(match.group('game_id'))
+    loop = asyncio.get_running_loop()
+    wait_until = loop.time() + wait
+    while await get_game_version(game_id) == int(etag.group('version')) and loop.time() < wait_until:
+        await broadcaster.wait(game_id, min(wait_until - loop.time(), LONG_POLL_CHECK_INTERVAL))
+
+
+async def websocket_application(scope, receive, send) -> None:
+    """
+    ASGI application serving the sockets of the games, the messages sent by the clients are ignored
+
+    :param scope: ASGI connection scope
+    :param receive: ASGI receive callable
+    :param send: ASGI send callable
+    :return: None
+    """
+
+    match = GAME_SOCKET_PATH.match(scope['path'])
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if match is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_CODE_NOT_FOUND})
+        return
+
+    # subscribes before reading the version of the game so no event can be missed in between
+    game_id = int(match.group('game_id'))
+    queue = broadcaster.subscribe(game_id)
+    is_authorized, wind, version = await get_seat(game_id, scope.get('query_string', b''))
+    if not is_authorized:
+        broadcaster.unsubscribe(game_id, queue)
+        await send({'type': 'websocket.close', 'code': CLOSE_CODE_UNAUTHORIZED})
+        return
+
+    await send({'type': 'websocket.accept'})
+    # the events following the version sent here are pushed, older ones can be fetched from the events endpoint
+    await send({'type': 'websocket.send', 'text': json.dumps({"type": "subscribed", "game": game_id,
+                                                               "sequence": version, "data": {"wind": wind}})})
+
+    receive_task = asyncio.ensure_future(receive())
+    queue_task = asyncio.ensure_future(queue.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait({receive_task, queue_task}, return_when=asyncio.FIRST_COMPLETED)
+
+            if queue_task in done:
+                message = queue_task.result()
+                if message["sequence"] > version:  # older events were already included in the version sent
+                    await send({'type': 'websocket.send', 'text': json.dumps(message)})
+                queue_task = asyncio.ensure_future(queue.get())
+
+            if receive_task in done:
+                if receive_task.result()['type'] == 'websocket.disconnect':
+                    break
+                receive_task = asyncio.ensure_future(receive())
+    finally:
+        receive_task.cancel()
+        queue_task.cancel()
+        broadcaster.unsubscribe(game_id, queue)
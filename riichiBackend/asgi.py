@@ -2,6 +2,8 @@
 ASGI config for riichiBackend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests are served by Django, and WebSocket connections by games.websockets.
+The long polling requests for a game wait for its next version in games.websockets before being served by Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -13,4 +15,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'riichiBackend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.utils import timezone  # noqa: E402
+from games.scheduler import schedule  # noqa: E402
+from games.signals import recover_call_phases  # noqa: E402, needs the apps to be loaded
+from games.websockets import websocket_application, wait_for_game_change  # noqa: E402, needs the apps to be loaded
+
+# the timers of the call phases open when the server stopped are lost, the scheduler takes them back
+schedule(timezone.now(), recover_call_phases)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        if scope['type'] == 'http':
+            await wait_for_game_change(scope)  # the long polling requests wait here, without holding a thread
+        await django_application(scope, receive, send)
@@ -0,0 +1,172 @@
+"""
+Instrumentation of the requests.
+
+For each request to a named endpoint, the number of SQL queries, the time spent in the database and the time spent
+serializing the response are recorded. The serialization time covers the blocks of the views measured by
+measure_serialization, where the serializers read their data, and the rendering of the response to JSON.
+With REQUEST_METRICS_HEADERS, they are sent back in the X-Query-Count and Server-Timing headers of the response,
+otherwise they are aggregated by endpoint in request_histogram.
+Each endpoint can declare a maximum number of queries in QUERY_BUDGETS, the requests over budget are counted
+by request_histogram and the budgets are enforced by the tests of the endpoints.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connection
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)  # upper bounds of the histogram buckets of the query counts
+TIME_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)  # upper bounds in milliseconds
+METRICS = (('queries', QUERY_BUCKETS), ('db_time', TIME_BUCKETS), ('serialization_time', TIME_BUCKETS),
+           ('total_time', TIME_BUCKETS))
+
+
+class QueryTimer:
+    """
+    Database execute wrapper counting the queries and summing their duration
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.duration += time.perf_counter() - started_at
+
+
+class RequestHistogram:
+    """
+    Aggregates the metrics of the requests of each endpoint in buckets, the last bucket counts the values
+    above every bound
+    """
+
+    def __init__(self):
+        self._endpoints = {}  # endpoint name -> dict of the aggregated metrics
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, metrics: dict, is_over_budget: bool) -> None:
+        """
+        Adds the metrics of a request to the histogram of its endpoint
+
+        :param endpoint: name of the url of the endpoint, example : 'discard_tile'
+        :param metrics: dict of the metrics of the request, query count and durations in milliseconds
+        :param is_over_budget: True if the request made more queries than the budget of the endpoint
+        :return: None
+        """
+
+        with self._lock:
+            histogram = self._endpoints.get(endpoint)
+            if histogram is None:
+                histogram = {"requests": 0, "over_budget": 0}
+                for name, buckets in METRICS:
+                    histogram[name] = {"sum": 0, "max": 0, "buckets": [0] * (len(buckets) + 1)}
+                self._endpoints[endpoint] = histogram
+
+            histogram["requests"] += 1
+            histogram["over_budget"] += is_over_budget
+            for name, buckets in METRICS:
+                value = metrics[name]
+                histogram[name]["sum"] += value
+                histogram[name]["max"] = max(histogram[name]["max"], value)
+                histogram[name]["buckets"][bisect_left(buckets, value)] += 1
+
+    def snapshot(self) -> dict:
+        """
+        Gets a copy of the histograms of every endpoint
+
+        :return: dict, example : {"discard_tile": {"requests": 12, "over_budget": 0,
+        "queries": {"sum": 540, "max": 61, "buckets": [0, 0, 0, 0, 0, 12, 0, 0, 0, 0]}, "db_time": {...}, ...}}
+        """
+
+        with self._lock:
+            return {endpoint: {key: dict(value, buckets=list(value["buckets"])) if isinstance(value, dict) else value
+                               for key, value in histogram.items()}
+                    for endpoint, histogram in self._endpoints.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints = {}
+
+
+request_histogram = RequestHistogram()
+
+
+def add_serialization_time(request, duration: float) -> None:
+    request = getattr(request, '_request', request)  # the views get the django request wrapped by rest_framework
+    request.serialization_time = getattr(request, 'serialization_time', 0) + duration
+
+
+@contextmanager
+def measure_serialization(request):
+    """
+    Adds the time spent in the block to the serialization time of the request, the views read the data
+    of their serializers in it
+
+    :param request: request being served, from django or rest_framework
+    :return: context manager
+    """
+
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_serialization_time(request, time.perf_counter() - started_at)
+
+
+class RequestMetricsMiddleware:
+    """
+    Measures the queries, the database time and the serialization time of each request,
+    it should be the first middleware so the queries of the other ones are counted
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        query_timer = QueryTimer()
+        started_at = time.perf_counter()
+        with connection.execute_wrapper(query_timer):
+            response = self.get_response(request)
+        total_time = time.perf_counter() - started_at
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is None or resolver_match.url_name is None:
+            return response
+
+        endpoint = resolver_match.url_name
+        metrics = {
+            "queries": query_timer.queries,
+            "db_time": query_timer.duration * 1000,
+            "serialization_time": getattr(request, 'serialization_time', 0) * 1000,
+            "total_time": total_time * 1000,
+        }
+        query_budget = settings.QUERY_BUDGETS.get(endpoint)
+        is_over_budget = query_budget is not None and metrics["queries"] > query_budget
+
+        if settings.REQUEST_METRICS_HEADERS:
+            response['X-Query-Count'] = str(metrics["queries"])
+            if query_budget is not None:
+                response['X-Query-Budget'] = str(query_budget)
+            response['Server-Timing'] = f'db;dur={metrics["db_time"]:.2f}, ' \
+                                        f'serialization;dur={metrics["serialization_time"]:.2f}, ' \
+                                        f'total;dur={metrics["total_time"]:.2f}'
+        else:
+            request_histogram.record(endpoint, metrics, is_over_budget)
+
+        return response
+
+    def process_template_response(self, request, response):
+        # the responses of the API views are rendered once every middleware has seen them
+        rendering_started_at = time.perf_counter()
+
+        def set_serialization_time(rendered_response):
+            add_serialization_time(request, time.perf_counter() - rendering_started_at)
+
+        response.add_post_render_callback(set_serialization_time)
+        return response
@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'riichiBackend.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -152,6 +153,24 @@ REST_FRAMEWORK = {
     ],
 }
 
+# query count, database time and serialization time of the requests, see riichiBackend.middleware
+REQUEST_METRICS_HEADERS = DEBUG  # sent in the response headers, aggregated in an in-process histogram otherwise
+
+# maximum number of queries of a request by url name, enforced by the tests of the endpoints.
+# The budgets are the current query counts of the endpoints as measured by their tests, not design targets:
+# an endpoint making fewer queries should lower its budget, and the writing endpoints still have room to shrink.
+QUERY_BUDGETS = {
+    'create_game': 15,
+    'add_user_to_game': 89,
+    'view_game': 5,
+    'view_game_events': 2,
+    'view_discard_advice': 9,
+    'discard_tile': 81,
+    'call_in_call_phase': 118,
+    'call_in_turn_phase': 66,
+    'user': 1,
+}
+
 GRAPH_MODELS = {
   'all_applications': True,
   'group_models': True,
@@ -169,3 +188,9 @@ CORS_ALLOW_METHODS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+
+CORS_EXPOSE_HEADERS = [
+    'X-Query-Count',
+    'X-Query-Budget',
+    'Server-Timing',
+]
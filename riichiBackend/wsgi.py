@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'riichiBackend.settings')
 
 application = get_wsgi_application()
+
+from django.utils import timezone  # noqa: E402
+from games.scheduler import schedule  # noqa: E402
+from games.signals import recover_call_phases  # noqa: E402, needs the apps to be loaded
+
+# the timers of the call phases open when the server stopped are lost, the scheduler takes them back
+schedule(timezone.now(), recover_call_phases)
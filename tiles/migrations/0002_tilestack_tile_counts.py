@@ -0,0 +1,34 @@
+# Generated by Django 4.1.2 on 2026-10-17 15:50
+
+from django.db import migrations, models
+import tiles.utils
+
+
+def count_tiles_of_existing_tile_stacks(apps, schema_editor):
+    TileStack = apps.get_model('tiles', 'TileStack')
+    Tile = apps.get_model('tiles', 'Tile')
+
+    tile_counts = {}
+    for tile_stack_id, suit, name in Tile.objects.values_list('tile_stack_id', 'suit', 'name'):
+        counts = tile_counts.setdefault(tile_stack_id, tiles.utils.get_empty_tile_counts())
+        counts[tiles.utils.TILE_INDEXES[(suit, name)]] += 1
+
+    for tile_stack in TileStack.objects.filter(id__in=tile_counts.keys()):
+        tile_stack.tile_counts = tile_counts[tile_stack.id]
+        tile_stack.save(update_fields=['tile_counts'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tiles', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tilestack',
+            name='tile_counts',
+            field=models.JSONField(default=tiles.utils.get_empty_tile_counts),
+        ),
+        migrations.RunPython(count_tiles_of_existing_tile_stacks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.1.2 on 2026-10-17 15:52
+
+from django.db import migrations, models
+import tiles.utils
+
+
+def encode_existing_tiles(apps, schema_editor):
+    Tile = apps.get_model('tiles', 'Tile')
+
+    copies = {}  # number of copies of each kind already met in each game hand
+    tiles_to_update = []
+    for tile in Tile.objects.select_related('tile_stack__holder').order_by('id'):
+        tile.kind = tiles.utils.TILE_INDEXES[(tile.suit, tile.name)]
+        hand_copies = copies.setdefault(tile.tile_stack.holder.game_hand_id, [0] * len(tiles.utils.VALID_TILES))
+        tile.physical_id = hand_copies[tile.kind] * len(tiles.utils.VALID_TILES) + tile.kind
+        hand_copies[tile.kind] += 1
+        tiles_to_update.append(tile)
+
+    Tile.objects.bulk_update(tiles_to_update, ['kind', 'physical_id'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tiles', '0002_tilestack_tile_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tile',
+            name='kind',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tile',
+            name='physical_id',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(encode_existing_tiles, migrations.RunPython.noop),
+    ]
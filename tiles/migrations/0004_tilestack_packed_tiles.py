@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-17 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tiles', '0003_tile_kind_physical_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tilestack',
+            name='packed_tiles',
+            field=models.BinaryField(default=None, null=True),
+        ),
+    ]
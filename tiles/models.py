@@ -1,6 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from tiles.utils import *
-import random
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from games.models import TileStackHolder
@@ -12,6 +12,8 @@ class TileStack(models.Model):
     """
     name = models.CharField(max_length=255)
     length = models.IntegerField(default=0)
+    tile_counts = models.JSONField(default=get_empty_tile_counts)  # number of each tile of VALID_TILES in the stack
+    packed_tiles = models.BinaryField(null=True, default=None)  # physical ids by position if the stack is packed
     holder = models.OneToOneField('games.TileStackHolder',  # FK to TileStackHolder
                                   on_delete=models.PROTECT,
                                   primary_key=False,
@@ -37,25 +39,41 @@ class TileStack(models.Model):
 
     def transfer_to(self, receiving_tile_stack: 'TileStack', tile: 'Tile') -> None:
         """
-        Transfers the tile from self tile stack to receiving tile stack
+        Transfers the tile from self tile stack to receiving tile stack in a single transaction
+        costing 4 updates whatever the size of the tile stacks, plus the statements of the transaction itself:
+        6 queries when called in a transaction, where the transaction of the transfer is a savepoint and its release
 
         :param receiving_tile_stack: instance of TileStack that should receive the tile
         :param tile: instance of Tile that should be transferred
         :return: None
         """
-        tile_old_position_in_tile_stack = tile.position_in_tile_stack
-        tile.tile_stack = receiving_tile_stack  # transfer the tile to the receiving_tile_stack
-        tile.position_in_tile_stack = receiving_tile_stack.length
-        tile.save()
-        receiving_tile_stack.length += 1  # add 1 to receiving tile_stack length
-        receiving_tile_stack.save()
-
-        moving_tiles = self.tile_set.filter(position_in_tile_stack__gt=tile_old_position_in_tile_stack)
-        for tile in moving_tiles:  # move the position of other tiles of sending tile_stack
-            tile.position_in_tile_stack -= 1
+        with transaction.atomic():
+            tile_old_position_in_tile_stack = tile.position_in_tile_stack
+            tile.tile_stack = receiving_tile_stack  # transfer the tile to the receiving_tile_stack
+            tile.position_in_tile_stack = receiving_tile_stack.length
             tile.save()
-        self.length -= 1  # remove 1 to sending tile_stack length
-        self.save()
+            receiving_tile_stack.length += 1  # add 1 to receiving tile_stack length
+            receiving_tile_stack.tile_counts[tile.kind] += 1  # count the tile in the same write
+            receiving_tile_stack.save()
+
+            # move the position of other tiles of sending tile_stack with a single update
+            moving_tiles = self.tile_set.filter(position_in_tile_stack__gt=tile_old_position_in_tile_stack)
+            moving_tiles.update(position_in_tile_stack=F('position_in_tile_stack') - 1)
+            self.length -= 1  # remove 1 to sending tile_stack length
+            self.tile_counts[tile.kind] -= 1
+            self.save()
+
+    @property
+    def is_packed(self) -> bool:
+        return self.packed_tiles is not None
+
+    def get_packed_tiles(self) -> bytearray:
+        """
+        Gets the physical ids of the tiles of a packed tile stack, ordered by position
+
+        :return: bytearray of physical ids
+        """
+        return bytearray(self.packed_tiles)  # the database can return a memoryview
 
     def pick_in(self, target: 'TileStack', number_of_tiles: int = 1) -> None:
         """
@@ -65,14 +83,32 @@ class TileStack(models.Model):
         :param number_of_tiles: number of tiles that should be picked in target
         :return: None
         """
+        if target.is_packed:  # tiles of a packed tile stack only become Tile rows when they are picked
+            packed_tiles = target.get_packed_tiles()
+            for _ in range(number_of_tiles):
+                physical_id = packed_tiles.pop()  # get last tile of the target
+                kind = get_tile_kind(physical_id)
+                suit, name = VALID_TILES[kind]
+                Tile.create(suit, name, self, self.length, physical_id)
+                self.length += 1
+                self.tile_counts[kind] += 1
+                target.length -= 1
+                target.tile_counts[kind] -= 1
+            target.packed_tiles = bytes(packed_tiles)
+            self.save()
+            target.save()
+            return
+
         for _ in range(number_of_tiles):
             tile = target.tile_set.get(position_in_tile_stack=target.length-1)  # get last tile of the target
             tile.tile_stack = self  # transfer tile to self tile_stack
             tile.position_in_tile_stack = self.length
             tile.save()
             self.length += 1  # add 1 to self tile_stack length
+            self.tile_counts[tile.kind] += 1
             self.save()
             target.length -= 1  # remove 1 to the target tile_stack length
+            target.tile_counts[tile.kind] -= 1
             target.save()
 
     def shuffle(self) -> None:
@@ -84,9 +120,11 @@ class TileStack(models.Model):
         tiles = self.tile_set.all()  # get all tiles of this tile_stack
         tiles_position = list(tiles.values_list('position_in_tile_stack', flat=True))  # get list of tiles position
 
-        random.setstate(self.holder.game_hand.round.game.get_random_state())  # get random state of the game
-        random.shuffle(tiles_position)  # shuffle tiles position
-        self.holder.game_hand.round.game.random_state = random.getstate()  # store random state of the game
+        game = self.holder.game_hand.round.game
+        game_random = game.get_random()  # get random generator of the game
+        game_random.shuffle(tiles_position)  # shuffle tiles position
+        game.store_random(game_random)  # store random generator of the game
+        game.save()
 
         for tile in tiles:  # set new tiles position in set
             tile.position_in_tile_stack = tiles_position.pop()
@@ -98,7 +136,7 @@ class TileStack(models.Model):
 
         :return: None
         """
-        tiles = self.tile_set.order_by('suit', 'name').all()  # gets all tiles of this tile_stack in logic order
+        tiles = sorted(self.tile_set.all(), key=lambda tile: (SORT_KEYS[tile.kind], tile.physical_id))  # logic order
         count = 0
 
         for tile in tiles:  # sets new tiles position
@@ -115,7 +153,7 @@ class TileStack(models.Model):
         :param number: number of tiles that should be searched for
         :return: True if number of tile with tile_suit / tile_name were found, else otherwise
         """
-        return self.tile_set.filter(suit=tile_suit, name=tile_name).count() >= number
+        return self.tile_counts[TILE_INDEXES[(tile_suit, tile_name)]] >= number
 
 
 class Tile(models.Model):
@@ -127,12 +165,15 @@ class Tile(models.Model):
     tile_stack = models.ForeignKey(TileStack, on_delete=models.PROTECT)  # FK to TileStack
     position_in_tile_stack = models.IntegerField()  # position in TileStack
     is_horizontal = models.BooleanField(default=False)  # needed when a tile is stolen
+    kind = models.IntegerField(default=0)  # 0 -> 33, index of the tile in VALID_TILES
+    physical_id = models.IntegerField(default=0)  # 0 -> 135, tells apart the copies of a kind in a game hand
 
     @staticmethod
     def create(suit: str,
                name: str,
                tile_stack: TileStack,
-               position_in_tile_stack: int) -> 'Tile':
+               position_in_tile_stack: int,
+               physical_id: int = 0) -> 'Tile':
         """
         Simplifies the use of the default django Tile constructor
 
@@ -140,11 +181,14 @@ class Tile(models.Model):
         :param name: '1' to '9' if bamboo/character/dot, east/south/west/north if wind, green/red/white if dragon
         :param tile_stack: instance of TileStack
         :param position_in_tile_stack: integer to order the instance of TileStack
+        :param physical_id: integer from 0 to 135 identifying the tile in the game hand
         :return: created instance of Tile
         """
 
         tile = Tile(suit=suit,
                     name=name,
+                    kind=TILE_INDEXES[(suit, name)],
+                    physical_id=physical_id,
                     tile_stack=tile_stack,
                     position_in_tile_stack=position_in_tile_stack)  # creates Tile instance with set parameters
 
@@ -10,6 +10,7 @@ class TileSerializer(serializers.ModelSerializer):
             'id',
             'suit',
             'name',
+            'kind',
             'is_horizontal',
         ]
 
@@ -18,6 +19,9 @@ class TileStackSerializer(serializers.ModelSerializer):
     tiles = serializers.SerializerMethodField()
 
     def get_tiles(self, instance):
+        hand_state = self.context.get('hand_state')  # tiles preloaded by the game serializers
+        if hand_state is not None:
+            return TileSerializer(hand_state.tiles.get(instance.id, []), many=True).data
         tiles = instance.tile_set.all().order_by('position_in_tile_stack')
         return TileSerializer(tiles, many=True).data
 
@@ -34,6 +38,9 @@ class MeldSerializer(serializers.ModelSerializer):
     tiles = serializers.SerializerMethodField()
 
     def get_tiles(self, instance):
+        hand_state = self.context.get('hand_state')  # tiles preloaded by the game serializers
+        if hand_state is not None:
+            return TileSerializer(hand_state.tiles.get(instance.id, []), many=True).data
         tiles = instance.tile_set.all().order_by('position_in_tile_stack')
         return TileSerializer(tiles, many=True).data
 
@@ -8,6 +8,10 @@ VALID_TILES = (
     ('wind', 'east'), ('wind', 'south'), ('wind', 'west'), ('wind', 'north'),
     ('dragon', 'green'), ('dragon', 'red'), ('dragon', 'white'),
 )
+# tiles are encoded internally as integers, the kind of a tile (0 to 33) is its index in VALID_TILES
+# and its physical id (0 to 135) tells apart the 4 copies of each kind, with kind = physical id % 34
+TILE_INDEXES = {tile: index for index, tile in enumerate(VALID_TILES)}  # kind of each tile, also its hand vector index
+TILES_PER_KIND = 4
 
 VALID_SUITS = (
     ('dot', 'dot'), ('bamboo', 'bamboo'), ('character', 'character'), ('wind', 'wind'), ('dragon', 'dragon')
@@ -29,6 +33,10 @@ VALID_NAMES = (
 MELD_NAMES = (('kan', 'kan'), ('pon', 'pon'), ('chi', 'chi'))
 
 
+def get_empty_tile_counts() -> list[int]:
+    return [0] * len(VALID_TILES)
+
+
 def get_next_wind(current_wind_name: str):
     if current_wind_name == 'east':
         return 'south'
@@ -54,12 +62,7 @@ def get_next_number(current_number_name: str):
 
 
 def get_next_tile_name(current_tile_suit: str, current_tile_name: str):
-    if current_tile_suit == 'wind':
-        return get_next_wind(current_tile_name)
-    elif current_tile_suit == 'dragon':
-        return get_next_dragon(current_tile_name)
-    else:
-        return get_next_number(current_tile_name)
+    return VALID_TILES[DORA_KINDS[TILE_INDEXES[(current_tile_suit, current_tile_name)]]][1]
 
 
 def get_previous_wind(current_wind_name: str):
@@ -90,9 +93,36 @@ def get_previous_number(current_number_name: str):
 
 
 def get_previous_tile_name(current_tile_suit: str, current_tile_name: str):
-    if current_tile_suit == 'wind':
-        return get_previous_wind(current_tile_name)
-    elif current_tile_name == 'dragon':
-        return get_previous_dragon(current_tile_name)
+    return VALID_TILES[DORA_INDICATOR_KINDS[TILE_INDEXES[(current_tile_suit, current_tile_name)]]][1]
+
+
+def get_tile_kind(physical_id: int) -> int:
+    return physical_id % len(VALID_TILES)
+
+
+def get_tile_counts(physical_ids) -> list[int]:
+    tile_counts = get_empty_tile_counts()
+    for physical_id in physical_ids:
+        tile_counts[get_tile_kind(physical_id)] += 1
+    return tile_counts
+
+
+def _get_next_name(suit: str, name: str) -> str:
+    if suit == 'wind':
+        return get_next_wind(name)
+    elif suit == 'dragon':
+        return get_next_dragon(name)
     else:
-        return get_previous_number(current_tile_name)
+        return get_next_number(name)
+
+
+# precomputed tables indexed by tile kind
+KIND_NUMBERS = tuple(int(name) if suit in dict(NUMBER_SUITS) else 0 for suit, name in VALID_TILES)  # 0 for honors
+# next and previous tile in a sequence, -1 if there is none
+NEXT_KINDS = tuple(kind + 1 if 1 <= number <= 8 else -1 for kind, number in enumerate(KIND_NUMBERS))
+PREVIOUS_KINDS = tuple(kind - 1 if 2 <= number <= 9 else -1 for kind, number in enumerate(KIND_NUMBERS))
+# dora indicated by each dora indicator, and the other way around
+DORA_KINDS = tuple(TILE_INDEXES[(suit, _get_next_name(suit, name))] for suit, name in VALID_TILES)
+DORA_INDICATOR_KINDS = tuple(DORA_KINDS.index(kind) for kind in range(len(VALID_TILES)))
+# order of the tiles in a sorted hand: bamboo -> character -> dot -> dragon -> wind, then by name
+SORT_KEYS = tuple(sorted(VALID_TILES).index(tile) for tile in VALID_TILES)